@@ -0,0 +1,228 @@
+# Vectorized batch search for replaying query logs and warming caches.
+#
+#   python batch_search.py QUERY_FILE [--index PATH] [--k 5] [--output results.jsonl]
+#
+# The index is turned once into a sparse TF-IDF term-document matrix W (CSR, one row per
+# term). A chunk of queries becomes a sparse binary query-term matrix Q, and Q @ W scores
+# every document for every query in the chunk at once. The same ranking as search.search
+# is then applied per row: documents with every query term (AND) first, falling back to
+# any term (OR), plus the PageRank prior, with the top k picked by argpartition. A chunk's
+# `prefix*` terms get rows of their own, each the union of the prefix's expansions scored
+# as one term, exactly as ranked_query does. Quoted phrases and the proximity boost need
+# token positions, so they are not applied here (a phrase's words are plain terms).
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from scipy import sparse
+from query_processor import parse_query, is_wildcard, term_postings
+
+DEFAULT_CHUNK_BYTES = 256 * 1024 * 1024  # Dense score arrays per chunk
+
+
+class TermDocumentMatrix:
+    """
+    TF-IDF weights of an index as a CSR matrix (terms x documents), with the vocabulary,
+    each term's max-score bound and the PageRank vector needed to score queries.
+    """
+
+    def __init__(self, terms, weights, max_scores, pagerank_scores, generation=0):
+        self.terms = terms
+        self.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self.weights = weights
+        # Same sparsity pattern with unit weights, to count how many query terms a document has
+        self.presence = sparse.csr_matrix((np.ones(len(weights.data), dtype=np.float32), weights.indices,
+                                           weights.indptr), shape=weights.shape)
+        self.max_scores = max_scores
+        self.pagerank_scores = np.asarray(pagerank_scores, dtype=np.float64)
+        self.generation = generation
+
+    @property
+    def num_docs(self):
+        return self.weights.shape[1]
+
+    @classmethod
+    def from_index(cls, index):
+        """Decode every posting list of an index (Segment, SegmentSet or dict) into the matrix."""
+        return cls.from_postings(((term, index[term]) for term in index), index)
+
+    @classmethod
+    def prefix_rows(cls, index, token_lists):
+        """The matrix of the distinct `prefix*` tokens of a chunk, each as the union of its expansions."""
+        wildcards = dict.fromkeys(token for tokens in token_lists for token in tokens if is_wildcard(token))
+        return cls.from_postings(((token, term_postings(index, token, index.doc_lengths)) for token in wildcards),
+                                 index)
+
+    @classmethod
+    def from_postings(cls, pairs, index):
+        """The matrix of (term, postings) pairs over the documents of `index`; None postings are skipped."""
+        num_docs = len(index.doc_lengths)
+        doc_lengths = np.asarray(index.doc_lengths, dtype=np.float64)
+        terms, max_scores, indptr, indices, data = [], [], [0], [], []
+        for term, postings in pairs:
+            if postings is None:
+                continue
+            documents = np.asarray(postings["documents"], dtype=np.int64)
+            if len(documents) == 0:
+                continue
+            frequencies = np.asarray(postings["frequency"], dtype=np.float64)
+            terms.append(term)
+            max_scores.append(postings["max_score"])
+            indices.append(documents.astype(np.int32))
+            data.append(frequencies / (doc_lengths[documents] + 1) * postings["idf"])
+            indptr.append(indptr[-1] + len(documents))
+
+        weights = sparse.csr_matrix((np.concatenate(data) if data else np.zeros(0),
+                                     np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+                                     np.asarray(indptr, dtype=np.int64)), shape=(len(terms), num_docs))
+        return cls(terms, weights, np.asarray(max_scores, dtype=np.float64), index.pagerank_scores,
+                   getattr(index, "generation", 0))
+
+    def save(self, path):
+        np.savez(path, indptr=self.weights.indptr, indices=self.weights.indices, data=self.weights.data,
+                 shape=np.asarray(self.weights.shape), max_scores=self.max_scores,
+                 pagerank_scores=self.pagerank_scores, generation=self.generation,
+                 terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            terms = data["terms"].tobytes().decode("utf-8")
+            weights = sparse.csr_matrix((data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"]))
+            return cls(terms.split("\n") if terms else [], weights, data["max_scores"], data["pagerank_scores"],
+                       int(data["generation"]))
+
+    def query_matrix(self, token_lists):
+        """Binary queries x terms matrix of the distinct tokens that are in the vocabulary."""
+        rows, columns = [], []
+        for row, tokens in enumerate(token_lists):
+            for term in dict.fromkeys(tokens):
+                term_id = self.term_ids.get(term)
+                if term_id is not None:
+                    rows.append(row)
+                    columns.append(term_id)
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(token_lists), len(self.terms)))
+
+    def top_k(self, token_lists, k=5, extra=None):
+        """
+        (doc_id, score) lists for a chunk of tokenized queries, ranked like search.search:
+        AND results if any document has every term, otherwise OR results. `extra` holds
+        rows for terms not in this matrix, over the same documents (see prefix_rows).
+        """
+        parts = [self] if extra is None else [self, extra]
+        queries = [part.query_matrix(token_lists) for part in parts]
+        found = sum(np.diff(query.indptr) for query in queries)  # Query terms that exist in the index
+        wanted = np.array([len(set(tokens)) for tokens in token_lists])
+
+        scores = sum((query @ part.weights).toarray() for query, part in zip(queries, parts))
+        matched = sum((query @ part.presence).toarray() for query, part in zip(queries, parts))
+        max_pagerank = self.pagerank_scores.max() if self.num_docs else 0.0
+        if max_pagerank > 0:
+            prior_weights = sum(query @ part.max_scores for query, part in zip(queries, parts)) / max_pagerank
+            scores += prior_weights[:, None] * self.pagerank_scores[None, :]
+
+        conjunctive = (matched == found[:, None]) & ((found == wanted) & (found > 0))[:, None]
+        has_conjunctive = conjunctive.any(axis=1)
+        candidates = np.where(has_conjunctive[:, None], conjunctive, matched > 0)
+        scores[~candidates] = -np.inf
+
+        results = []
+        k = min(k, self.num_docs)
+        if k <= 0:
+            return [[] for _ in token_lists]
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row in range(len(token_lists)):
+            threshold = scores[row, best[row]].min()
+            if threshold == -np.inf:
+                chosen = np.flatnonzero(candidates[row])
+            else:
+                chosen = np.flatnonzero(scores[row] >= threshold)  # Every doc tied at the cut-off
+            order = np.lexsort((chosen, -scores[row, chosen]))[:k]  # Score desc, then lower doc id
+            results.append([(int(doc_id), float(scores[row, doc_id])) for doc_id in chosen[order]])
+        return results
+
+
+def default_chunk_size(num_docs, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Queries per chunk so the dense score arrays (about 20 bytes per query and document) fit the budget."""
+    return max(1, chunk_bytes // (20 * max(1, num_docs)))
+
+
+def search_batch(queries, index, k=5, matrix=None, chunk_size=None):
+    """
+    Yield (query, results) for every query, in order, with results formatted like
+    search.search: (doc_id, score, url, summary). Queries are scored a chunk at a time.
+    """
+    matrix = matrix or TermDocumentMatrix.from_index(index)
+    chunk_size = chunk_size or default_chunk_size(matrix.num_docs)
+    chunk = []
+    for query in queries:
+        chunk.append(query)
+        if len(chunk) >= chunk_size:
+            yield from _search_chunk(chunk, index, matrix, k)
+            chunk = []
+    if chunk:
+        yield from _search_chunk(chunk, index, matrix, k)
+
+
+def _search_chunk(chunk, index, matrix, k):
+    token_lists = [parse_query(query)[0] for query in chunk]
+    extra = None
+    if any(is_wildcard(token) for tokens in token_lists for token in tokens):
+        extra = TermDocumentMatrix.prefix_rows(index, token_lists)
+    ranked = matrix.top_k(token_lists, k, extra)
+    for query, top_docs in zip(chunk, ranked):
+        yield query, [(doc_id, score, index.url(doc_id), "Summarization disabled.") for doc_id, score in top_docs]
+
+
+def main(argv=None):
+    from search import load_index
+
+    parser = argparse.ArgumentParser(description="Run a file of queries (one per line) and write JSONL results.")
+    parser.add_argument("queries", help="Query file, one query per line ('-' for stdin)")
+    parser.add_argument("--index", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"),
+                        help="Index directory or segment")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, help="Queries scored per sparse product")
+    parser.add_argument("--matrix", help="Cache file for the term-document matrix (built if missing or stale)")
+    args = parser.parse_args(argv)
+
+    index = load_index(args.index)
+    start = time.perf_counter()
+    matrix = None
+    if args.matrix and os.path.exists(args.matrix):
+        matrix = TermDocumentMatrix.load(args.matrix)
+        if matrix.generation != getattr(index, "generation", 0) or matrix.num_docs != len(index.doc_lengths):
+            matrix = None
+    if matrix is None:
+        matrix = TermDocumentMatrix.from_index(index)
+        if args.matrix:
+            matrix.save(args.matrix)
+    print(f"Term-document matrix: {matrix.weights.shape[0]} terms x {matrix.num_docs} documents, "
+          f"{matrix.weights.nnz} postings ({time.perf_counter() - start:.2f}s)", file=sys.stderr)
+
+    query_file = sys.stdin if args.queries == "-" else open(args.queries, "r", encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    count = 0
+    start = time.perf_counter()
+    try:
+        queries = (line.strip() for line in query_file if line.strip())
+        for query, results in search_batch(queries, index, args.k, matrix, args.chunk_size):
+            output.write(json.dumps({"query": query, "results": [
+                {"doc_id": doc_id, "score": score, "url": url} for doc_id, score, url, _ in results]}) + "\n")
+            count += 1
+    finally:
+        if query_file is not sys.stdin:
+            query_file.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{count} queries in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} queries/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+# Reproducible end-to-end benchmark: generate a synthetic crawl, then time every stage.
+#
+#   python benchmark_suite.py generate OUTPUT_DIR [--pages N] [--seed S]
+#   python benchmark_suite.py run [--pages N] [--seed S] [--data DIR] [--output results.json]
+#   python benchmark_suite.py compare BASELINE.json CURRENT.json [--threshold 0.1]
+#
+# Stages: parse (HTML text extraction), tokenize, build (in-memory inverted index), save
+# (segment write), load (segment open + first query) and query (the test_queries.py list
+# plus generated head and tail queries). Results are JSON so runs can be compared;
+# `compare` exits with status 1 when a metric regressed by more than the threshold. Short
+# stages are noisy on small corpora; compare runs of a few thousand pages on the same machine.
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from itertools import accumulate
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Whether a bigger value of a metric is better; metrics not listed here aren't compared
+METRIC_DIRECTIONS = {
+    "pages_per_second": "higher", "tokens_per_second": "higher", "docs_per_second": "higher",
+    "mb_per_second": "higher", "queries_per_second": "higher",
+    "seconds": "lower", "p50_ms": "lower", "p95_ms": "lower", "p99_ms": "lower",
+    "peak_rss_mb": "lower", "index_mb": "lower",
+}
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "ph", "qu", "st", "an", "el", "or"]
+TOPIC_WORDS = ["computer", "science", "faculty", "graduate", "admissions", "machine", "learning", "software",
+               "engineering", "research", "student", "data", "artificial", "intelligence", "program", "course"]
+
+
+def make_vocabulary(size, rng):
+    """Distinct pronounceable words; the topic words come first so they are the most frequent."""
+    words = list(TOPIC_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def generate_corpus(output_dir, num_pages=2000, seed=0, vocabulary_size=20000, hosts=12):
+    """
+    Write `num_pages` crawled pages in the DEV layout (one folder per host, one JSON file
+    per page with "url", "content" and "encoding"). Words follow a Zipf distribution and
+    pages carry titles, headings, bold text, links, scripts, footers and hidden blocks.
+    The same seed always produces the same corpus. Returns the vocabulary.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    cumulative = list(accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+    host_names = [f"host{number}.ics.uci.edu" for number in range(hosts)]
+
+    def url(page):
+        return f"https://{host_names[page % hosts]}/page/{page}"
+
+    def words(count):
+        return " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=count))
+
+    for page in range(num_pages):
+        paragraphs = "".join(f"<p>{words(rng.randint(20, 120))} <b>{words(2)}</b></p>"
+                             for _ in range(rng.randint(1, 6)))
+        links = "".join(f'<a href="{url(rng.randrange(num_pages))}">{words(2)}</a>' for _ in range(rng.randint(0, 12)))
+        html = (f"<html><head><title>{words(rng.randint(2, 6))}</title><script>var page = {page};</script>"
+                f"<style>p {{ margin: 0 }}</style></head><body><h1>{words(3)}</h1>{paragraphs}"
+                f'<div class="hidden">{words(10)}</div><h2>{words(3)}</h2>{links}'
+                f"<footer>{words(5)}</footer></body></html>")
+        folder = os.path.join(output_dir, host_names[page % hosts])
+        os.makedirs(folder, exist_ok=True)
+        name = hashlib.sha1(url(page).encode("utf-8")).hexdigest()
+        with open(os.path.join(folder, f"{name}.json"), "w", encoding="utf-8") as file:
+            json.dump({"url": url(page), "content": html, "encoding": "utf-8"}, file)
+    return vocabulary
+
+
+def generated_queries(vocabulary, count, seed=0):
+    """Head queries drawn from the most frequent words and tail queries from rare ones."""
+    rng = random.Random(seed + 1)
+    head = vocabulary[:200]
+    tail = vocabulary[len(vocabulary) // 2:]
+    queries = [" ".join(rng.sample(head, rng.randint(1, 3))) for _ in range(count // 2)]
+    queries += [" ".join(rng.sample(tail, rng.randint(1, 3))) for _ in range(count - count // 2)]
+    return queries
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KB elsewhere
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    return {f"p{q}_ms": ordered[min(len(ordered) - 1, len(ordered) * q // 100)] * 1000 for q in (50, 95, 99)}
+
+
+def directory_mb(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def run_suite(data_folder, work_dir, queries, repeat_queries=3):
+    """Time every stage over the pages in `data_folder`; returns {stage: metrics}."""
+    from extract_text import extract_text_from_html
+    from tokenizer import default_tokenizer
+    from link_graph import normalize_links, build_link_graph
+    from read_json_files import discover_files
+    from build_index import build_inverted_index, compute_document_stats, save_index
+    from scoring import compute_pagerank
+    from search import load_index, search
+
+    stages = {}
+    pages = []
+    for path in discover_files(data_folder):
+        with open(path, "r", encoding="utf-8") as file:
+            pages.append(json.load(file))
+
+    start = time.perf_counter()
+    extracted = [extract_text_from_html(page["content"]) for page in pages]
+    elapsed = time.perf_counter() - start
+    stages["parse"] = {"pages": len(pages), "seconds": elapsed, "pages_per_second": len(pages) / elapsed,
+                       "peak_rss_mb": peak_rss_mb()}
+
+    start = time.perf_counter()
+    documents = []
+    num_tokens = 0
+    for page, text in zip(pages, extracted):
+        regular_terms, important_terms = default_tokenizer.tokenize_batch([text["regular"], text["important"]])
+        num_tokens += sum(count for _, count in regular_terms) + sum(count for _, count in important_terms)
+        if regular_terms or important_terms:
+            documents.append({"url": page["url"], "regular_terms": regular_terms, "important_terms": important_terms,
+                              "links": normalize_links(page["url"], text["links"])})
+    elapsed = time.perf_counter() - start
+    stages["tokenize"] = {"tokens": num_tokens, "seconds": elapsed, "tokens_per_second": num_tokens / elapsed,
+                          "peak_rss_mb": peak_rss_mb()}
+    del pages, extracted
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        inverted_index, document_lookup, summaries = build_inverted_index(documents)
+        doc_lengths, _ = compute_document_stats(inverted_index, len(documents))
+        pagerank_scores, _ = compute_pagerank(*build_link_graph(documents))
+        elapsed = time.perf_counter() - start
+    stages["build"] = {"documents": len(documents), "terms": len(inverted_index), "seconds": elapsed,
+                       "docs_per_second": len(documents) / elapsed, "peak_rss_mb": peak_rss_mb()}
+
+    index_path = os.path.join(work_dir, "segment")
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        save_index(inverted_index, document_lookup, summaries, pagerank_scores, len(documents), index_path,
+                   doc_lengths=doc_lengths)
+        elapsed = time.perf_counter() - start
+    index_mb = directory_mb(index_path)
+    stages["save"] = {"seconds": elapsed, "index_mb": index_mb, "mb_per_second": index_mb / elapsed,
+                      "peak_rss_mb": peak_rss_mb()}
+    del inverted_index, document_lookup, summaries, documents
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        index = load_index(index_path)
+        search(queries[0], index, cache=None)
+        elapsed = time.perf_counter() - start
+    stages["load"] = {"seconds": elapsed, "peak_rss_mb": peak_rss_mb()}
+
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat_queries):
+            for query in queries:
+                start = time.perf_counter()
+                search(query, index, cache=None)
+                latencies.append(time.perf_counter() - start)
+    stages["query"] = {"queries": len(latencies), "seconds": sum(latencies),
+                       "queries_per_second": len(latencies) / sum(latencies), **percentiles(latencies),
+                       "peak_rss_mb": peak_rss_mb()}
+    return stages
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    from test_queries import TEST_QUERIES
+
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        data_folder = args.data
+        vocabulary = None
+        if data_folder is None:
+            data_folder = os.path.join(work_dir, "DEV")
+            start = time.perf_counter()
+            vocabulary = generate_corpus(data_folder, args.pages, args.seed)
+            print(f"Generated {args.pages} pages in {time.perf_counter() - start:.1f}s")
+        vocabulary = vocabulary or make_vocabulary(20000, random.Random(args.seed))
+        queries = TEST_QUERIES + generated_queries(vocabulary, args.queries, args.seed)
+
+        stages = run_suite(data_folder, work_dir, queries)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpu_count": os.cpu_count(), "pages": args.pages if args.data is None else None,
+                 "data": args.data, "seed": args.seed, "queries": len(queries)},
+        "stages": stages,
+    }
+    for stage, metrics in stages.items():
+        print(f"{stage:>9}: " + "  ".join(f"{name} {value:.4g}" for name, value in metrics.items()))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+        print(f"Results saved to {args.output}")
+    return results
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compare two result files' stages metric by metric. Returns a list of
+    (stage, metric, baseline value, current value, relative change, regressed) rows, where
+    the relative change is positive when the metric got better.
+    """
+    rows = []
+    for stage, metrics in current["stages"].items():
+        for name, value in metrics.items():
+            direction = METRIC_DIRECTIONS.get(name)
+            old = baseline["stages"].get(stage, {}).get(name)
+            if direction is None or not old:
+                continue
+            change = (value - old) / old if direction == "higher" else (old - value) / old
+            rows.append((stage, name, old, value, change, change < -threshold))
+    return rows
+
+
+def compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, "r", encoding="utf-8") as file:
+        current = json.load(file)
+
+    rows = compare_results(baseline, current, args.threshold)
+    for stage, name, old, value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{stage:>9} {name:<20} {old:12.4g} -> {value:12.4g}  {change:+7.1%}{flag}")
+    regressions = sum(1 for row in rows if row[-1])
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end indexing and query benchmark.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Write a synthetic corpus in the DEV layout")
+    generate.add_argument("output_dir")
+    generate.add_argument("--pages", type=int, default=2000)
+    generate.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="Run every stage and report metrics")
+    run_parser.add_argument("--pages", type=int, default=2000, help="Synthetic pages to generate")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--data", help="Use this DEV-style folder instead of a synthetic corpus")
+    run_parser.add_argument("--queries", type=int, default=200, help="Generated head and tail queries")
+    run_parser.add_argument("--output", help="Write results as JSON")
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change that counts")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        generate_corpus(args.output_dir, args.pages, args.seed)
+        print(f"Wrote {args.pages} pages to {args.output_dir}")
+        return 0
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
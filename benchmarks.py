@@ -0,0 +1,369 @@
+# Micro-benchmarks for individual pipeline stages.
+#
+#   python benchmarks.py extract [--data DIR] [--pages N]
+#   python benchmarks.py tokenize [--data DIR] [--pages N]
+#   python benchmarks.py shards [--index PATH] [--shards 1,2,4,8] [--queries N]
+#   python benchmarks.py reorder [--index PATH] [--queries N]
+#   python benchmarks.py lexicon [--index PATH] [--queries N]
+#   python benchmarks.py champions [--index PATH] [--queries N]
+#   python benchmarks.py codec
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_FOLDER = os.path.join(BASE_DIR, "fixtures", "html")
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark function under `name`."""
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def load_pages(data_folder=None, limit=None):
+    """HTML of the fixture pages, plus crawled pages from a DEV-style data folder if given."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_FOLDER, "*.html"))):
+        with open(path, "r", encoding="utf-8") as file:
+            pages.append(file.read())
+
+    if data_folder:
+        from read_json_files import discover_files
+        for path in discover_files(data_folder):
+            if limit and len(pages) >= limit:
+                break
+            with open(path, "r", encoding="utf-8") as file:
+                try:
+                    pages.append(json.load(file).get("content", ""))
+                except json.JSONDecodeError:
+                    continue
+    return pages
+
+
+def time_per_item(function, items, min_seconds=1.0):
+    """Run function over items repeatedly for at least min_seconds; returns items per second."""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            function(item)
+        count += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return count / elapsed
+
+
+@benchmark("extract")
+def bench_extract(args):
+    """Pages per second for each HTML text extraction mode."""
+    from extract_text import extract_text_from_html, lxml_available
+
+    pages = load_pages(args.data, args.pages)
+    modes = ["soup", "stream"] + (["lxml"] if lxml_available() else [])
+    results = {}
+    for mode in modes:
+        results[mode] = time_per_item(lambda page: extract_text_from_html(page, mode), pages)
+        print(f"{mode:>8}: {results[mode]:8.1f} pages/s")
+    for mode in modes[1:]:
+        print(f"{mode} speedup over soup: {results[mode] / results['soup']:.1f}x")
+    return results
+
+
+def legacy_tokenize(text, stemmer):
+    """The original tokenizer: rebuilds its patterns on every call and stems every word."""
+    import re
+    from tokenizer import HTML_WORDS
+
+    if not text or not isinstance(text, str):
+        return []
+    text = text.lower()
+    text = re.sub(r"\b(?:{})\b".format("|".join(HTML_WORDS)), "", text)
+    text = re.sub(r"[^a-zA-Z0-9\s]", " ", text)
+    return list(dict.fromkeys(stemmer.stem(word) for word in text.split()))
+
+
+@benchmark("tokenize")
+def bench_tokenize(args):
+    """Tokens per second for the original tokenizer and the memoizing batch Tokenizer."""
+    from nltk.stem import PorterStemmer
+    from extract_text import extract_text_from_html
+    from tokenizer import Tokenizer
+
+    texts = [extract_text_from_html(page)["regular"] for page in load_pages(args.data, args.pages)]
+    num_tokens = sum(len(text.split()) for text in texts)
+    tokenizer = Tokenizer()
+    tokenizer.tokenize_batch(texts)  # Warm the stem cache, as a long indexing run would
+
+    stemmer = PorterStemmer()
+    results = {}
+    for name, function in [("legacy", lambda batch: [legacy_tokenize(text, stemmer) for text in batch]),
+                           ("batch", tokenizer.tokenize_batch)]:
+        results[name] = time_per_item(function, [texts]) * num_tokens
+        print(f"{name:>8}: {results[name]:12.0f} tokens/s")
+    print(f"batch speedup over legacy: {results['batch'] / results['legacy']:.1f}x")
+    print(f"stem cache: {tokenizer.cache_info()}")
+    return results
+
+
+def latency_percentiles(latencies):
+    latencies = sorted(latencies)
+    return {f"p{q}": latencies[min(len(latencies) - 1, len(latencies) * q // 100)] * 1000 for q in (50, 95, 99)}
+
+
+@benchmark("shards")
+def bench_shards(args):
+    """Query latency of scatter-gather search against the number of document shards."""
+    import random
+    import tempfile
+    from query_processor import ranked_query
+    from search import load_index
+    from sharding import split_index, open_sharded_index
+
+    index = load_index(args.index)
+    rng = random.Random(0)
+    terms = [term for term in index if len(index[term]) >= 10]
+    queries = [rng.sample(terms, rng.randint(1, 3)) for _ in range(args.queries)]
+
+    def run(function):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            function(query)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    results = {}
+    latencies = run(lambda query: ranked_query(query, index, index.doc_lengths, index.pagerank_scores, 10, False))
+    results["unsharded"] = latency_percentiles(latencies)
+    print(f"{'unsharded':>10}: " + "  ".join(f"{name} {value:7.2f} ms" for name, value in results["unsharded"].items()))
+    with tempfile.TemporaryDirectory() as folder:
+        for num_shards in args.shards:
+            split_index(index, folder, num_shards)
+            sharded = open_sharded_index(folder)
+            try:
+                sharded.ranked_query(queries[0], 10, False)  # Start the workers
+                latencies = run(lambda query: sharded.ranked_query(query, 10, False))
+            finally:
+                sharded.close()
+            results[num_shards] = latency_percentiles(latencies)
+            print(f"{num_shards:>4} shards: " + "  ".join(f"{name} {value:7.2f} ms"
+                                                       for name, value in results[num_shards].items()))
+    print(f"({os.cpu_count()} cores available)")
+    return results
+
+
+@benchmark("reorder")
+def bench_reorder(args):
+    """Postings size and query latency of the index rewritten under each doc id order (reorder.py)."""
+    import random
+    import tempfile
+    import numpy as np
+    from query_processor import ranked_query
+    from reorder import STRATEGIES, document_order, reorder_segment
+    from search import load_index
+    from segment import open_segment
+
+    index = load_index(args.index)
+    num_docs = len(index.doc_lengths)
+    urls = [index.url(doc_id) for doc_id in range(num_docs)]
+    rng = random.Random(0)
+    terms = [term for term in index if len(index[term]) >= 10]
+    head = sorted(terms, key=lambda term: len(index[term]), reverse=True)[:200]
+    queries = [rng.sample(head if number % 2 else terms, rng.randint(1, 3)) for number in range(args.queries)]
+
+    def run(segment, conjunctive, bounds):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            ranked_query(query, segment, segment.doc_lengths, segment.pagerank_scores, 10, conjunctive,
+                         pagerank_bounds=bounds)
+            latencies.append(time.perf_counter() - start)
+        return latency_percentiles(latencies)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for strategy in ("crawl",) + STRATEGIES:
+            start = time.perf_counter()
+            if strategy == "crawl":
+                order = np.arange(num_docs)
+            else:
+                order = document_order(strategy, index, urls, index.pagerank_scores)
+            order_seconds = time.perf_counter() - start
+            path = os.path.join(folder, strategy)
+            reorder_segment(index, path, order, doc_order=strategy)
+            segment = open_segment(path)
+            modes = [(strategy, None)]
+            if segment.pagerank_bounds is not None:
+                modes = [(f"{strategy} (exhaustive)", None), (f"{strategy} (early stop)", segment.pagerank_bounds)]
+            for name, bounds in modes:
+                results[name] = {"order_seconds": order_seconds,
+                                 "postings_mb": segment.header["postings_bytes"] / 1e6,
+                                 "positions_mb": segment.header.get("positions_bytes", 0) / 1e6,
+                                 "and": run(segment, True, bounds), "or": run(segment, False, bounds)}
+                result = results[name]
+                print(f"{name:>22}: postings {result['postings_mb']:6.2f} MB"
+                      f"  positions {result['positions_mb']:6.2f} MB  order {order_seconds:6.2f}s  AND p50 {result['and']['p50']:6.2f} ms"
+                      f"  p95 {result['and']['p95']:6.2f} ms  OR p50 {result['or']['p50']:6.2f} ms"
+                      f"  p95 {result['or']['p95']:6.2f} ms")
+    return results
+
+
+@benchmark("lexicon")
+def bench_lexicon(args):
+    """Memory and lookup latency of the front-coded lexicon (lexicon.py) against a dict of the same terms."""
+    import random
+    import tempfile
+    import tracemalloc
+    import numpy as np
+    from lexicon import LEXICON_FILES, PlainLexicon
+    from search import load_index
+
+    index = load_index(args.index)
+    segment = max(getattr(index, "segments", [index]), key=lambda segment: segment.num_terms)
+    lexicon, frequencies = segment.lexicon, segment.term_meta["df"]
+    terms = list(lexicon)
+
+    tracemalloc.start()
+    table = {term: (int(frequencies[term_id]), term_id) for term_id, term in enumerate(terms)}  # As in a JSON index
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    lexicon_bytes = sum(os.path.getsize(os.path.join(segment.path, name)) for name in LEXICON_FILES)
+    encoded = [term.encode("utf-8") for term in terms]
+    plain_bytes = sum(map(len, encoded)) + 8 * (len(terms) + 1)
+
+    rng = random.Random(0)
+    lookups = rng.sample(terms, min(args.queries, len(terms))) + [f"{term}zq" for term in rng.sample(terms, 50)]
+    sample = rng.sample(terms, min(args.queries, len(terms)))
+    prefixes = sorted({term[:length] for term in sample for length in (1, 2, 3)})
+
+    def dict_complete(prefix):
+        matches = [(term, entry[0]) for term, entry in table.items() if term.startswith(prefix)]
+        return sorted(matches, key=lambda entry: (-entry[1], entry[0]))[:10]
+
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, "terms.dat"), "wb") as file:
+            file.write(b"".join(encoded))
+        np.concatenate([[0], np.cumsum([len(term) for term in encoded])]).astype("<u8").tofile(
+            os.path.join(folder, "terms.idx"))
+        plain = PlainLexicon(folder, len(terms))
+        results = {"terms": len(terms),
+                   "bytes_per_term": {"dict": dict_bytes / len(terms), "plain": plain_bytes / len(terms),
+                                      "front_coded": lexicon_bytes / len(terms)},
+                   "lookup_us": {}, "complete_us": {}}
+        for name, function in [("dict", table.get), ("plain", plain.term_id), ("front_coded", lexicon.term_id)]:
+            results["lookup_us"][name] = 1e6 / time_per_item(function, lookups, 0.5)
+        for name, function in [("dict", dict_complete),
+                               ("front_coded", lambda prefix: lexicon.complete(prefix, frequencies, 10))]:
+            results["complete_us"][name] = 1e6 / time_per_item(function, prefixes, 0.5)
+
+    print(f"{len(terms)} terms from {segment.path}")
+    print("Bytes per term:  " + "  ".join(f"{name} {value:6.1f}" for name, value in results["bytes_per_term"].items()))
+    print("Exact lookup:    " + "  ".join(f"{name} {value:6.2f} us" for name, value in results["lookup_us"].items()))
+    print("Top-10 complete: " + "  ".join(f"{name} {value:8.1f} us" for name, value in results["complete_us"].items()))
+    return results
+
+
+@benchmark("champions")
+def bench_champions(args):
+    """
+    Latency and recall@5 of answering from the tier-1 champion lists (champions.py) against
+    the full posting lists, for head-term (highest df) and random-term queries.
+    """
+    import random
+    import numpy as np
+    from query_processor import ranked_query
+    from search import load_index
+
+    index = load_index(args.index)
+    tier = index.champions
+    if tier is None:
+        print(f"{args.index} has no current tier 1: run main.py index --champions first")
+        return None
+    terms = list(index)
+    frequencies = np.array([len(index.get(term)["documents"]) for term in terms])
+    head = [terms[term_id] for term_id in np.argsort(-frequencies, kind="stable")[:200]]
+    rng = random.Random(0)
+
+    def recall(results, expected):
+        expected = {doc_id for doc_id, _ in expected}
+        return len(expected & {doc_id for doc_id, _ in results}) / len(expected) if expected else 1.0
+
+    results = {"tier_postings": tier.info["tier_postings"], "postings": tier.info["postings"], "queries": {}}
+    print(f"Tier 1: {tier.info['tier_postings']} of {tier.info['postings']} postings "
+          f"({tier.info['tier_postings'] / max(tier.info['postings'], 1):.1%})")
+    for source_name, source in [("head", head), ("random", terms)]:
+        for length in (1, 2, 3):
+            queries = [rng.sample(source, length) for _ in range(args.queries)]
+            for conjunctive in (True, False):
+                full_times, tier_times, answered, tier_only, exact = [], [], 0, [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    expected = ranked_query(query, index, index.doc_lengths, index.pagerank_scores, 5, conjunctive)
+                    middle = time.perf_counter()
+                    answer = tier.ranked_query(query, index, index, 5, conjunctive)
+                    end = time.perf_counter()
+                    full_times.append(middle - start)
+                    tier_times.append(end - middle + (middle - start if answer is None else 0.0))
+                    answered += answer is not None
+                    exact.append(recall(expected if answer is None else answer, expected))
+                    tier_only.append(recall(tier.ranked_query(query, index, index, 5, conjunctive, exact=False),
+                                            expected))
+                name = f"{source_name} x{length} {'AND' if conjunctive else 'OR'}"
+                results["queries"][name] = {"answered": answered / len(queries),
+                                            "full_p50_ms": float(np.median(full_times)) * 1000,
+                                            "tier_p50_ms": float(np.median(tier_times)) * 1000,
+                                            "recall_at_5": float(np.mean(exact)),
+                                            "tier_only_recall_at_5": float(np.mean(tier_only))}
+                entry = results["queries"][name]
+                print(f"{name:14s} answered {entry['answered']:6.1%}  p50 full {entry['full_p50_ms']:6.2f} ms  "
+                      f"tiered {entry['tier_p50_ms']:6.2f} ms  recall@5 {entry['recall_at_5']:.3f}  "
+                      f"tier only {entry['tier_only_recall_at_5']:.3f}")
+    return results
+
+
+@benchmark("codec")
+def bench_codec(args):
+    """Compression ratio and encode/decode throughput of the block posting codec on random postings."""
+    import numpy as np
+    from postings_codec import encode_postings, decode_postings
+
+    rng = np.random.default_rng(3)
+    documents = np.sort(rng.choice(2_000_000, size=200_000, replace=False))
+    frequencies = rng.geometric(0.3, size=len(documents))
+    raw_bytes = documents.astype(np.uint32).nbytes + frequencies.astype(np.uint32).nbytes
+
+    payload, skips = encode_postings(documents, frequencies)
+    encodes = time_per_item(lambda _: encode_postings(documents, frequencies), [None])
+    decodes = time_per_item(lambda _: decode_postings(payload, skips, len(documents)), [None])
+    results = {"ratio": raw_bytes / (len(payload) + skips.nbytes),
+               "encode_postings_per_second": len(documents) * encodes,
+               "decode_postings_per_second": len(documents) * decodes}
+    print(f"Compression: {results['ratio']:.1f}x vs uint32 arrays | "
+          f"encode {results['encode_postings_per_second'] / 1e6:.1f}M postings/s | "
+          f"decode {results['decode_postings_per_second'] / 1e6:.1f}M postings/s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a pipeline micro-benchmark.")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--data", help="DEV-style data folder to draw real pages from")
+    parser.add_argument("--pages", type=int, default=500, help="Maximum pages to load from --data")
+    parser.add_argument("--index", default=os.path.join(BASE_DIR, "index"), help="Index directory or segment")
+    parser.add_argument("--shards", default="1,2,4,8", type=lambda value: [int(part) for part in value.split(",")],
+                        help="Comma-separated shard counts")
+    parser.add_argument("--queries", type=int, default=300, help="Queries per configuration")
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
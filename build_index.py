@@ -1,76 +1,93 @@
 import os
-import json
+import math
+import metrics
+from segment import write_segment
 
 # from summarizer import generate_summary
 
+def document_term_frequencies(document):
+    """
+    Term frequencies of a tokenized document: its (term, count) pairs from the page text,
+    with every occurrence in important text (title, headings, bold) counted twice extra.
+    """
+    term_frequencies = dict(document["regular_terms"])
+    for term, count in document["important_terms"]:
+        term_frequencies[term] = term_frequencies.get(term, 0) + 2 * count  # Boost important words
+    return term_frequencies
+
+
+@metrics.timed("index.build")
 def build_inverted_index(documents):
     """
     Builds an inverted index from the given tokenized documents.
-    Now also generates and stores summaries.
+    Now also generates and stores summaries. Documents with "positions" give every
+    posting a list of positions too (see segment.write_segment).
     """
-    print(f"Debug: Received {len(documents)} documents for indexing.")  # Debugging line
     inverted_index = {}
     document_lookup = {}
     document_summaries = {}  # ✅ Store summaries
 
     for doc_id, document in enumerate(documents):
-        url = document["url"]
-        regular_tokens = document["regular_tokens"]
-        important_tokens = document["important_tokens"]
-
-        document_lookup[doc_id] = url
-
-        term_frequencies = {}
-
-        for token in regular_tokens:
-            term_frequencies[token] = term_frequencies.get(token, 0) + 1
+        document_lookup[doc_id] = document["url"]
 
-        for token in important_tokens:
-            term_frequencies[token] = term_frequencies.get(token, 0) + 2  # Boost important words
-
-        for token, freq in term_frequencies.items():
+        positions = dict(document["positions"]) if "positions" in document else None
+        for token, freq in document_term_frequencies(document).items():
             if token not in inverted_index:
                 inverted_index[token] = {"documents": [], "frequency": []}
+                if positions is not None:
+                    inverted_index[token]["positions"] = []
             inverted_index[token]["documents"].append(doc_id)
             inverted_index[token]["frequency"].append(freq)
+            if positions is not None:
+                inverted_index[token]["positions"].append(positions.get(token, []))
 
-        # ✅ Generate and store summary
-        full_text = " ".join(regular_tokens[:200])  # Use first 200 tokens for summary
-        #summary = generate_summary(full_text)
-        #document_summaries[doc_id] = summary
-
-    print(f"Debug: Indexed {len(document_lookup)} documents.")  # Debugging line
+    metrics.count("documents_indexed", len(document_lookup))
 
     return inverted_index, document_lookup, document_summaries  # ✅ Return summaries
 
 
-def save_index(index, doc_lookup, summaries, pagerank_scores, total_files_read, filename="../index/inverted_index.json"):
+def compute_document_stats(inverted_index, num_docs):
+    """
+    Precomputes the statistics the scorer needs so queries never have to derive them:
+    stores each term's IDF and max-score upper bound in its postings entry and returns per-document lengths
+    (sum of term frequencies) and L2 norms of the documents' TF-IDF vectors.
     """
-    Saves the inverted index, document lookup, summaries, and PageRank scores to a JSON file.
+    doc_lengths = [0] * num_docs
+    for postings in inverted_index.values():
+        for doc_id, freq in zip(postings["documents"], postings["frequency"]):
+            doc_lengths[doc_id] += freq
+
+    norms_squared = [0.0] * num_docs
+    for postings in inverted_index.values():
+        idf = math.log((num_docs + 1) / (len(postings["documents"]) + 1)) + 1
+        max_score = 0.0
+        for doc_id, freq in zip(postings["documents"], postings["frequency"]):
+            weight = freq / (doc_lengths[doc_id] + 1) * idf
+            norms_squared[doc_id] += weight * weight
+            max_score = max(max_score, weight)
+        postings["idf"] = idf
+        postings["max_score"] = max_score  # Upper bound used by dynamic pruning
+
+    doc_norms = [math.sqrt(value) for value in norms_squared]
+    return doc_lengths, doc_norms
+
+
+def save_index(index, doc_lookup, summaries, pagerank_scores, total_files_read, path="../index/segment", doc_lengths=None,
+               aliases=None):
     """
-    index_folder = os.path.dirname(filename)
+    Saves the inverted index, document lookup and PageRank scores (a list indexed by doc id)
+    as a binary index segment directory (see segment.py), with the alias URLs of collapsed
+    duplicates ({doc id: [URLs]}, see dedup.Deduplicator.filter) if given.
+    """
+    index_folder = os.path.dirname(path)
 
-    if not os.path.exists(index_folder):
+    if index_folder and not os.path.exists(index_folder):
         os.makedirs(index_folder)
 
-    full_index = {
-        "total_files_read": total_files_read,
-        "total_documents": len(doc_lookup),
-        "unique_words": len(index),
-        "index_size_kb": os.path.getsize(filename) // 1024 if os.path.exists(filename) else 0,
-        "pagerank_scores": pagerank_scores,  # ✅ Save PageRank scores
-        "index": index,
-        "document_lookup": doc_lookup,
-        #"document_summaries": summaries  # ✅ Save summaries
-    }
-
-    class SingleLineJSONEncoder(json.JSONEncoder):
-        def encode(self, obj):
-            if isinstance(obj, list):
-                return "[" + ", ".join(map(str, obj)) + "]"
-            return super().encode(obj)
-
-    with open(filename, "w", encoding="utf-8") as file:
-        json.dump(full_index, file, indent=4, separators=(",", ": "), cls=SingleLineJSONEncoder)
-
-    print(f"Inverted index saved to {filename}")
+    if doc_lengths is None:
+        doc_lengths, _ = compute_document_stats(index, len(doc_lookup))
+
+    urls = [doc_lookup[doc_id] for doc_id in range(len(doc_lookup))]
+    write_segment(path, index, urls, pagerank_scores, doc_lengths, aliases=aliases, total_files_read=total_files_read)
+
+    print(f"Inverted index saved to {path}")
@@ -0,0 +1,472 @@
+import os
+import json
+import math
+import shutil
+import numpy as np
+import metrics
+from tokenizer import default_tokenizer
+from scoring import pagerank_prior_weight
+from postings_codec import BLOCK_SIZE
+from query_processor import PostingCursor, TopKHeap, PROXIMITY_WEIGHT, proximity_score, is_wildcard
+
+# Tier-1 ("champion list") index: a small first tier of every term's postings, searched
+# before the full posting lists. Each segment has its own tier, in its "champions"
+# directory, built once when the segment is written: a delta from an update only builds
+# the tier of its own documents, and a merge builds the merged segment's tier as part of
+# the merge. A term's tier in a segment holds the postings of documents with the term in
+# their important text (title, headings, bold; up to IMPORTANT_PER_TERM of them) and its
+# top CHAMPIONS_PER_TERM postings by each half of a document's score, the TF-IDF weight
+# and the PageRank. Lists of up to SHORT_LIST postings, one block, aren't copied: the
+# tier reads them whole from the segment, which costs the same single block decode.
+#
+#   champions.json  settings and sizes
+#   champions.meta  per term, by the segment's term id (CHAMPION_DTYPE): where its tier
+#                   starts and how long it is (0 for a short list), its postings in the
+#                   segment, the segment's IDF and max-score bound, and the largest
+#                   tf / (length + 1) of any posting left out of the tier
+#   champions.docs  uint32 local doc ids of the tier postings, ascending within a term
+#   champions.freq  uint32 term frequencies of the tier postings
+#
+# ChampionTier reads the tiers of every segment of an index as one, in global doc ids,
+# with the index's current IDFs and PageRank: IDF only scales a term's weights, and the
+# PageRank of left-out postings is bounded at query time (see ChampionTier.rest_pagerank).
+# Together they bound the score of every document the tier doesn't show, so a query
+# answered from the tier is exact: ChampionTier.ranked_query returns the same top k as
+# query_processor.ranked_query whenever its k-th score beats that bound (documents only
+# partly in the tier are looked up in the full lists first), and None otherwise, for the
+# caller to search the full index. A head term's query reads a few dozen postings.
+# An index with a segment that has no tier (built with --no-champions, or before tiers
+# existed) is searched without one. The important text comes from the docstore (its
+# "important" field, see read_json_files.process_file).
+
+CHAMPIONS_DIR = "champions"
+CHAMPIONS_FILE = "champions.json"
+CHAMPIONS_PER_TERM = 16  # r: postings kept by TF-IDF weight, and again by PageRank
+IMPORTANT_PER_TERM = 16  # Important-text postings kept, highest weight first
+SHORT_LIST = BLOCK_SIZE  # Lists this short are read from the segment, not copied
+CHAMPION_DTYPE = np.dtype([("first", "<u8"), ("count", "<u4"), ("postings", "<u4"), ("idf", "<f8"),
+                           ("max_score", "<f8"), ("rest_weight", "<f8")])
+PAGERANK_PROBE = 64  # Highest-PageRank documents of a segment checked for a term's PageRank bound
+BOUND_SLACK = 1e-9  # Relative margin for float rounding between bounds and exact scores
+RESOLVE_BATCH = 16  # Candidates scored exactly per pass over the full lists
+
+
+def champions_path(segment):
+    return os.path.join(segment.path, CHAMPIONS_DIR)
+
+
+def important_postings(segment):
+    """{term: [doc ids]} of the words of each live document's important text, from the docstore."""
+    if not getattr(segment, "has_docstore", False):
+        return {}
+    deleted = getattr(segment, "deleted", None)
+    postings = {}
+    for doc_id in range(len(segment.doc_lengths)):
+        if deleted is not None and deleted[doc_id]:
+            continue
+        important = segment.document(doc_id).get("important")
+        if important:
+            for term in default_tokenizer.unique_tokens(important):
+                postings.setdefault(term, []).append(doc_id)
+    return postings
+
+
+def _top(values, count):
+    """Indices of the `count` largest values (all of them if there are fewer)."""
+    if len(values) <= count:
+        return np.arange(len(values))
+    return np.argpartition(-values, count - 1)[:count]
+
+
+def champion_mask(weights, pagerank, important, per_term=CHAMPIONS_PER_TERM, important_per_term=IMPORTANT_PER_TERM):
+    """Which of a term's postings go into its tier; `important` flags the important-text ones (or is None)."""
+    keep = np.zeros(len(weights), dtype=bool)
+    keep[_top(weights, per_term)] = True
+    keep[_top(pagerank, per_term)] = True
+    if important is not None:
+        flagged = np.flatnonzero(important)
+        keep[flagged[_top(weights[flagged], important_per_term)]] = True
+    return keep
+
+
+@metrics.timed("index.champions")
+def build_champions(segment, pagerank_scores=None, per_term=CHAMPIONS_PER_TERM):
+    """
+    Write the tier of a segment to its "champions" directory, replacing any older one.
+    Reads every posting list longer than SHORT_LIST once, term by term. The PageRank
+    champions are picked by `pagerank_scores` (the segment's documents in its index's
+    PageRank), by default the segment's own. Returns the tier's sizes.
+    """
+    path = champions_path(segment)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    important = important_postings(segment)
+    doc_lengths = np.asarray(segment.doc_lengths, dtype=np.float64)
+    if pagerank_scores is None:
+        pagerank_scores = segment.pagerank_scores
+    pagerank_scores = np.asarray(pagerank_scores, dtype=np.float64)
+    meta = np.zeros(segment.num_terms, dtype=CHAMPION_DTYPE)
+    tier_postings = total_postings = 0
+    with open(os.path.join(tmp_path, "champions.docs"), "wb") as docs_file, \
+            open(os.path.join(tmp_path, "champions.freq"), "wb") as freq_file:
+        for term_id in range(segment.num_terms):
+            postings = segment.postings_by_id(term_id)
+            total_postings += len(postings)
+            if len(postings) <= SHORT_LIST:
+                meta[term_id] = (tier_postings, 0, len(postings), postings.idf, postings.max_score, 0.0)
+                continue
+            documents = np.asarray(postings["documents"], dtype=np.int64)
+            frequencies = np.asarray(postings["frequency"], dtype=np.int64)
+            weights = frequencies / (doc_lengths[documents] + 1)  # Times the IDF, the posting's TF-IDF weight
+            term = segment.term(term_id)
+            flagged = np.isin(documents, important[term], assume_unique=True) if term in important else None
+            keep = champion_mask(weights, pagerank_scores[documents], flagged, per_term)
+            count = int(keep.sum())
+            meta[term_id] = (tier_postings, count, len(documents), postings.idf, postings.max_score,
+                             float(weights[~keep].max(initial=0.0)))
+            documents[keep].astype("<u4").tofile(docs_file)
+            frequencies[keep].astype("<u4").tofile(freq_file)
+            tier_postings += count
+    meta.tofile(os.path.join(tmp_path, "champions.meta"))
+
+    info = {"num_docs": segment.num_docs, "num_terms": segment.num_terms, "per_term": per_term,
+            "important_per_term": IMPORTANT_PER_TERM, "short_list": SHORT_LIST,
+            "important_postings": sum(len(docs) for docs in important.values()),
+            "postings": total_postings, "tier_postings": tier_postings,
+            "bytes": sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))}
+    with open(os.path.join(tmp_path, CHAMPIONS_FILE), "w", encoding="utf-8") as file:
+        json.dump(info, file, indent=4)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    print(f"Built tier 1 of {os.path.basename(segment.path)}: {tier_postings} of {total_postings} postings "
+          f"({tier_postings / max(total_postings, 1):.1%}, {info['bytes'] / 1e6:.2f} MB)")
+    return info
+
+
+def load_champions_info(path):
+    """Contents of champions.json, or None if `path` holds no tier."""
+    info_path = os.path.join(path, CHAMPIONS_FILE)
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def segment_tier_info(segment):
+    """The sizes of a segment's tier, or None if it has none (or one left from an older segment at its path)."""
+    info = load_champions_info(champions_path(segment))
+    if info is None or info["num_docs"] != segment.num_docs or info["num_terms"] != segment.num_terms:
+        return None
+    return info
+
+
+def tier_info(index):
+    """
+    Sizes of the tiers of an index's segments, summed, and how many segments have none
+    ("missing"); None if no segment has one.
+    """
+    infos = [segment_tier_info(segment) for segment in getattr(index, "segments", [index])]
+    built = [info for info in infos if info is not None]
+    if not built:
+        return None
+    totals = {key: sum(info.get(key, 0) for info in built)
+              for key in ("important_postings", "postings", "tier_postings", "bytes")}
+    return {"segments": len(built), "missing": len(infos) - len(built), "per_term": built[0]["per_term"],
+            "important_per_term": built[0]["important_per_term"], **totals}
+
+
+def build_index_champions(index):
+    """
+    Build the tier of each segment of an open index (Segment or SegmentSet) that has none,
+    such as the delta of the latest update, picking PageRank champions by the index's
+    current PageRank. Returns tier_info(index).
+    """
+    for base, segment in zip(getattr(index, "bases", [0]), getattr(index, "segments", [index])):
+        if segment_tier_info(segment) is None:
+            build_champions(segment, index.pagerank_scores[int(base):int(base) + segment.num_docs])
+    return tier_info(index)
+
+
+def _map(path, dtype):
+    if os.path.getsize(path) == 0:  # numpy can't map empty files
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class SegmentTier:
+    """Read side of one segment's tier, memory-mapped; see the module comment."""
+
+    def __init__(self, segment):
+        self.segment = segment
+        self.path = champions_path(segment)
+        self.info = load_champions_info(self.path)
+        self.meta = _map(os.path.join(self.path, "champions.meta"), CHAMPION_DTYPE)
+        self.documents = _map(os.path.join(self.path, "champions.docs"), "<u4")
+        self.frequencies = _map(os.path.join(self.path, "champions.freq"), "<u4")
+
+    def entry(self, term):
+        """
+        (meta, local doc ids, frequencies, complete) of a term's tier, or None if the segment
+        doesn't have the term. A short list is read from the segment, and complete.
+        """
+        term_id = self.segment.term_id(term)
+        if term_id < 0:
+            return None
+        meta = self.meta[term_id]
+        if meta["postings"] <= self.info["short_list"]:
+            postings = self.segment.postings_by_id(term_id)
+            return (meta, np.asarray(postings["documents"], dtype=np.int64),
+                    np.asarray(postings["frequency"], dtype=np.int64), True)
+        first, count = int(meta["first"]), int(meta["count"])
+        return (meta, np.asarray(self.documents[first:first + count], dtype=np.int64),
+                np.asarray(self.frequencies[first:first + count], dtype=np.int64), count == meta["postings"])
+
+
+class ChampionTier:
+    """
+    Tier 1 of an open index (Segment or SegmentSet): the tiers of all its segments, read as
+    one in global doc ids, with the index's IDFs and PageRank; see the module comment.
+    """
+
+    def __init__(self, index, tiers):
+        self.index = index
+        self.tiers = tiers
+        self.bases = [int(base) for base in getattr(index, "bases", [0])]
+        self.merged = hasattr(index, "segments")  # IDFs are the segment set's, not the segments'
+        self.info = tier_info(index)
+        self._pagerank_orders = {}
+        self._rest_pagerank = {}
+
+    def is_current(self, index):
+        """Whether the tier belongs to this build and generation of `index`."""
+        generation = getattr(index, "generation", 0)
+        return (self.index.path == index.path and getattr(self.index, "generation", 0) == generation
+                and getattr(self.index, "build_id", None) == getattr(index, "build_id", None)
+                and len(self.index.doc_lengths) == len(index.doc_lengths))
+
+    def entry(self, term):
+        """
+        (meta, doc ids, frequencies) of a term's tier in every segment, tombstoned documents
+        left out, or None if the index doesn't have the term. `meta` holds the term's IDF and
+        max-score bound as the index computes them, whether the tier is its whole list
+        ("complete"), the largest TF-IDF weight it leaves out ("rest_weight") and the
+        (segment position, local tier doc ids) of the segments where it leaves any out.
+        """
+        parts = []
+        for position, tier in enumerate(self.tiers):
+            found = tier.entry(term)
+            if found is not None:
+                parts.append((position, *found))
+        if not parts:
+            return None
+        if self.merged:
+            df = sum(int(meta["postings"]) for _, meta, _, _, _ in parts)
+            idf = math.log((self.index.num_docs + 1) / (df + 1)) + 1  # As SegmentSet.get, to the last bit
+            max_weight = 0.0
+            for _, meta, _, _, _ in parts:
+                max_weight = max(max_weight, float(meta["max_score"]) / float(meta["idf"]))
+            max_score = max_weight * idf
+        else:
+            idf, max_score = float(parts[0][1]["idf"]), float(parts[0][1]["max_score"])
+        partial = [(position, documents) for position, _, documents, _, complete in parts if not complete]
+        rest_weight = max((float(meta["rest_weight"]) for _, meta, _, _, complete in parts if not complete),
+                          default=0.0)
+        documents = np.concatenate([documents + self.bases[position] for position, _, documents, _, _ in parts])
+        frequencies = np.concatenate([frequencies for _, _, _, frequencies, _ in parts])
+        deleted = getattr(self.index, "deleted", None)
+        if deleted is not None:
+            live = ~deleted[documents]
+            documents, frequencies = documents[live], frequencies[live]
+        meta = {"term": term, "idf": idf, "max_score": max_score, "complete": not partial,
+                "rest_weight": rest_weight * idf, "partial": partial}
+        return meta, documents, frequencies
+
+    def rest_pagerank(self, meta):
+        """
+        A bound on the PageRank of the documents a term's tier leaves out. PageRank changes
+        with every generation while a segment's tier doesn't, so it is found at query time
+        (and kept for this generation): of a segment's PAGERANK_PROBE highest-ranked
+        documents, the best one with the term outside the tier, or if there is none, the
+        PageRank of the next document down, which no unchecked document exceeds.
+        """
+        return max((self._part_rest_pagerank(position, meta["term"], documents)
+                    for position, documents in meta["partial"]), default=0.0)
+
+    def _part_rest_pagerank(self, position, term, tier_documents):
+        key = (position, term)
+        if key not in self._rest_pagerank:
+            segment, base = self.tiers[position].segment, self.bases[position]
+            pagerank = np.asarray(self.index.pagerank_scores[base:base + segment.num_docs], dtype=np.float64)
+            if position not in self._pagerank_orders:
+                top = _top(pagerank, PAGERANK_PROBE + 1)
+                self._pagerank_orders[position] = top[np.argsort(-pagerank[top], kind="stable")]
+            order = self._pagerank_orders[position]
+            probe = np.sort(order[:PAGERANK_PROBE])
+            postings = segment.get(term)
+            blocks = np.searchsorted(postings.block_last_docs, probe)
+            found = np.zeros(len(probe), dtype=bool)
+            for block in np.unique(blocks[blocks < postings.num_blocks]).tolist():
+                in_block = blocks == block
+                found[in_block] = np.isin(probe[in_block], postings.block(block)[0])
+            found &= ~np.isin(probe, tier_documents)
+            if found.any():
+                bound = float(pagerank[probe[found]].max())
+            else:
+                bound = float(pagerank[order[PAGERANK_PROBE]]) if len(order) > PAGERANK_PROBE else 0.0
+            self._rest_pagerank[key] = bound
+        return self._rest_pagerank[key]
+
+    def ranked_query(self, query_tokens, index, postings=None, k=5, conjunctive=True, exact=True):
+        """
+        The top-k (doc_id, score) pairs query_processor.ranked_query would return for the
+        query over `index`, from the tier, or None when the tier can't guarantee them (and
+        for prefix* queries). Documents the tier has for only some of the query terms are
+        looked up in the full lists of `postings` (the index, or a cached view of it) if
+        they could make the top k. With exact=False the tier's own top k is returned as is,
+        as plain champion lists would: some documents outside the tier may be missing.
+        """
+        terms = list(dict.fromkeys(query_tokens))
+        if k <= 0 or any(is_wildcard(term) for term in terms):
+            return None
+        entries = [self.entry(term) for term in terms]
+        if conjunctive and None in entries:
+            return []
+        terms = [term for term, entry in zip(terms, entries) if entry is not None]
+        entries = [entry for entry in entries if entry is not None]
+        if not entries:
+            return []
+
+        doc_lengths, pagerank_scores = index.doc_lengths, index.pagerank_scores
+        query_bound = sum(meta["max_score"] for meta, _, _ in entries)
+        prior_weight = pagerank_prior_weight(query_bound, pagerank_scores)
+        positional = conjunctive and len(entries) > 1 and bool(getattr(index, "has_positions", False))
+        proximity_weight = PROXIMITY_WEIGHT * query_bound if positional else 0.0
+
+        # Every document in any term's tier, with what the tier knows of its score
+        candidates = np.unique(np.concatenate([documents for _, documents, _ in entries]))
+        known = np.zeros((len(entries), len(candidates)))
+        present = np.zeros((len(entries), len(candidates)), dtype=bool)
+        for row, (meta, documents, frequencies) in enumerate(entries):
+            columns = np.searchsorted(candidates, documents)
+            known[row, columns] = frequencies / (np.asarray(doc_lengths[documents], dtype=np.float64) + 1) * meta["idf"]
+            present[row, columns] = True
+        complete = np.array([meta["complete"] for meta, _, _ in entries])
+        rest_weights = np.array([meta["rest_weight"] for meta, _, _ in entries])
+        prior = np.asarray(pagerank_scores[candidates], dtype=np.float64) * prior_weight
+        lower = known.sum(axis=0) + prior
+        upper = lower + (~present * rest_weights[:, None]).sum(axis=0) + proximity_weight
+
+        # The best score of a document in no tier: it has the term only outside the tiers
+        if conjunctive:
+            viable = (present | ~complete[:, None]).all(axis=0)  # A whole list it's missing from rules it out
+            certain = present.all(axis=0)
+            unseen = (-np.inf if complete.any() else rest_weights.sum() + proximity_weight
+                      + prior_weight * min(self.rest_pagerank(meta) for meta, _, _ in entries))
+        else:
+            viable = certain = np.ones(len(candidates), dtype=bool)
+            partial = [meta for meta, _, _ in entries if not meta["complete"]]
+            unseen = (rest_weights.sum() + prior_weight * max(self.rest_pagerank(meta) for meta in partial)
+                      if partial else -np.inf)
+
+        if not exact:
+            order = np.lexsort((candidates[certain], -lower[certain]))[:k]
+            return [(int(doc_id), float(score)) for doc_id, score in zip(candidates[certain][order],
+                                                                          lower[certain][order])]
+
+        # Score candidates exactly, best upper bound first, a batch at a time, until no other
+        # one could enter the top k, or the k-th score can no longer beat `unseen`
+        order = np.flatnonzero(viable)
+        order = order[np.lexsort((candidates[order], -upper[order]))]
+        heap = TopKHeap(k)
+        full_postings = None  # Read only if a candidate needs them
+        for start in range(0, len(order), RESOLVE_BATCH):
+            if len(heap.entries) >= k and heap.threshold() > _loosened(upper[order[start]]):
+                break
+            best = sorted([score for score, _ in heap.entries] + upper[order[start:start + k]].tolist())[-k:]
+            if unseen != -np.inf and (len(best) < k or best[0] <= unseen):
+                metrics.count("tier1_fallthroughs")
+                return None
+            batch = np.sort(order[start:start + RESOLVE_BATCH])
+            if full_postings is None:
+                full_postings = [_full_postings(postings if postings is not None else index, term) for term in terms]
+            self._score_batch(batch, candidates, known, present, prior, full_postings, index, heap, conjunctive,
+                              proximity_weight)
+
+        if unseen == -np.inf or (len(heap.entries) >= k and _loosened(unseen) < heap.threshold()):
+            metrics.count("tier1_answers")
+            return heap.results()
+        metrics.count("tier1_fallthroughs")
+        return None
+
+    def _score_batch(self, columns, candidates, known, present, prior, full_postings, index, heap, conjunctive,
+                     proximity_weight):
+        """Push the exact scores of the candidates `columns` (ascending doc ids) into `heap`."""
+        cursors = None
+        for column in columns.tolist():
+            doc_id = int(candidates[column])
+            if present[:, column].all() and not proximity_weight:
+                heap.push(doc_id, float(prior[column] + known[:, column].sum()))
+                continue
+            if cursors is None:  # Fresh cursors: they only move forward
+                cursors = [PostingCursor(entry, index.doc_lengths) for entry in full_postings]
+            score = float(prior[column])
+            matched = 0
+            for cursor in cursors:
+                if cursor.next_geq(doc_id) == doc_id:
+                    score += cursor.score()
+                    matched += 1
+            if conjunctive and matched < len(cursors):
+                continue
+            if proximity_weight:
+                score += proximity_weight * proximity_score([cursor.positions() for cursor in cursors])
+            heap.push(doc_id, score)
+
+
+class _MemoizedBlocks:
+    """A term's full postings for PostingCursor, keeping every block it decodes for the next cursor."""
+
+    def __init__(self, postings):
+        self.postings = postings
+        self.block_last_docs = postings.block_last_docs
+        self.num_blocks = postings.num_blocks
+        self.has_positions = getattr(postings, "has_positions", False)
+        self.blocks = {}
+        self.position_blocks = {}
+
+    def __len__(self):
+        return len(self.postings)
+
+    def __getitem__(self, key):
+        return self.postings[key]
+
+    def block(self, block):
+        if block not in self.blocks:
+            self.blocks[block] = self.postings.block(block)
+        return self.blocks[block]
+
+    def position_block(self, block):
+        if block not in self.position_blocks:
+            self.position_blocks[block] = self.postings.position_block(block)
+        return self.position_blocks[block]
+
+
+def _full_postings(source, term):
+    postings = source.get(term)
+    return _MemoizedBlocks(postings) if hasattr(postings, "block_last_docs") else postings
+
+
+def _loosened(bound):
+    """`bound` raised by BOUND_SLACK, so float rounding never makes a bound too tight."""
+    return bound + BOUND_SLACK * abs(bound)
+
+
+def open_champions(index):
+    """Tier 1 of an open index (Segment or SegmentSet) if every segment of it has a tier, else None."""
+    segments = getattr(index, "segments", [index])
+    if not segments or any(segment_tier_info(segment) is None for segment in segments):
+        return None
+    return ChampionTier(index, [SegmentTier(segment) for segment in segments])
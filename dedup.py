@@ -0,0 +1,173 @@
+import hashlib
+from functools import lru_cache
+from itertools import chain
+import numpy as np
+import metrics
+from build_index import document_term_frequencies
+
+# Duplicate and near-duplicate detection, run on the document stream before indexing.
+# Crawls of a university site are full of pages that say the same thing under different
+# URLs: calendar views of the same month, "/people" and "/people/", "?sort=asc" and
+# "?sort=desc", page 1 of a listing reached through three menus. Indexing them all costs
+# postings and fills result lists with copies of one page.
+#
+#   exact   a 64-bit hash of the document's (term, frequency) pairs, plus its token
+#           positions if it has them: two documents with the same hash would produce
+#           exactly the same postings
+#   near    a 64-bit SimHash (Charikar, STOC 2002) of the damped term frequencies; pages
+#           whose fingerprints differ in at most MAX_HAMMING_DISTANCE bits are treated as
+#           copies, as in Manku et al. (WWW 2007)
+#
+# Near-duplicates are found without comparing every pair: the 64 bits are cut into
+# MAX_HAMMING_DISTANCE + 1 bands, and by the pigeonhole principle two fingerprints that
+# differ in at most that many bits agree exactly on at least one band. A hash table per
+# band gives the candidates, and only those are compared bit by bit.
+#
+# The first document of a group (in discovery order) is kept as the canonical one; the
+# URLs of the rest are kept as its aliases, so they still resolve to a result and their
+# in-links still count for PageRank.
+
+FINGERPRINT_BITS = 64
+MAX_HAMMING_DISTANCE = 3
+BANDS = MAX_HAMMING_DISTANCE + 1
+BAND_BITS = FINGERPRINT_BITS // BANDS
+MIN_SIMHASH_TERMS = 10  # Shorter pages only collapse on an exact match; a few words can't tell pages apart
+
+
+@lru_cache(maxsize=200_000)
+def term_hash(term):
+    """64-bit hash of one term (a corpus has few distinct terms, so they are memoized)."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _term_hashes(terms):
+    return np.fromiter(map(term_hash, terms), dtype=np.uint64, count=len(terms))
+
+
+def exact_hash(term_frequencies, positions=None, hashes=None):
+    """
+    64-bit hash of a document's term frequencies, which doesn't depend on their order, and
+    of its token stream rebuilt from `positions` ([(term, [positions])]) if it has them.
+    `hashes` are the term_hash values of term_frequencies' keys, if already computed.
+    """
+    if hashes is None:
+        hashes = _term_hashes(term_frequencies)
+    frequencies = np.fromiter(term_frequencies.values(), dtype=np.uint64, count=len(term_frequencies))
+    digest = hashlib.blake2b(np.sort(hashes ^ (frequencies * np.uint64(0x9E3779B97F4A7C15))).tobytes(),
+                             digest_size=8)
+    if positions:
+        counts = [len(entry) for _, entry in positions]
+        flat = np.fromiter(chain.from_iterable(entry for _, entry in positions), dtype=np.int64, count=sum(counts))
+        stream = np.zeros(int(flat.max()) + 1 if len(flat) else 0, dtype=np.uint64)
+        stream[flat] = np.repeat(_term_hashes([term for term, _ in positions]), counts)
+        digest.update(stream.tobytes())
+    return int.from_bytes(digest.digest(), "little")
+
+
+def simhash(term_frequencies, hashes=None):
+    """
+    64-bit SimHash: every term votes on each bit with weight 1 + log(tf), + if the bit is set
+    in the term's hash and - otherwise; the fingerprint keeps the bits with a positive total.
+    """
+    if not term_frequencies:
+        return 0
+    if hashes is None:
+        hashes = _term_hashes(term_frequencies)
+    weights = 1 + np.log(np.fromiter(term_frequencies.values(), dtype=np.float32, count=len(term_frequencies)))
+    bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    positive = 2 * (weights @ bits.astype(np.float32)) > weights.sum()  # Set-bit votes outweigh the rest
+    return int(np.packbits(positive, bitorder="little").view("<u8")[0])
+
+
+def fingerprint(document):
+    """(exact hash, SimHash, number of distinct terms) of a tokenized document."""
+    term_frequencies = document_term_frequencies(document)
+    hashes = _term_hashes(term_frequencies)
+    return (exact_hash(term_frequencies, document.get("positions"), hashes), simhash(term_frequencies, hashes),
+            len(term_frequencies))
+
+
+def bands(value):
+    """The BANDS slices of a 64-bit fingerprint, each tagged with its band number."""
+    mask = (1 << BAND_BITS) - 1
+    return [(band, (value >> (band * BAND_BITS)) & mask) for band in range(BANDS)]
+
+
+class Deduplicator:
+    """
+    Remembers the fingerprint of every canonical document seen so far, under a caller
+    chosen key (a doc id, or a [segment, local doc id] location), and tells whether a new
+    document copies one of them. check() is the streaming entry point; add() seeds it
+    with documents that are already indexed.
+    """
+
+    def __init__(self, max_distance=MAX_HAMMING_DISTANCE, min_simhash_terms=MIN_SIMHASH_TERMS):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance must be below {BANDS} for the band lookup to find every match")
+        self.max_distance = max_distance
+        self.min_simhash_terms = min_simhash_terms
+        self.exact = {}  # exact hash -> key
+        self.tables = {}  # (band, band value) -> [(simhash, key)]
+        self.aliases = {}  # key -> [alias URLs]
+        self.stats = {"documents": 0, "exact_duplicates": 0, "near_duplicates": 0, "postings_saved": 0,
+                      "comparisons": 0}
+
+    def add(self, key, exact, simhash_value, num_terms):
+        """Register a canonical document's fingerprint."""
+        self.exact.setdefault(exact, key)
+        if num_terms >= self.min_simhash_terms:
+            for band in bands(simhash_value):
+                self.tables.setdefault(band, []).append((simhash_value, key))
+
+    def find(self, exact, simhash_value, num_terms):
+        """Key of the canonical document this fingerprint duplicates, and "exact" or "near"; (None, None) if new."""
+        key = self.exact.get(exact)
+        if key is not None:
+            return key, "exact"
+        if num_terms < self.min_simhash_terms:
+            return None, None
+        for band in bands(simhash_value):
+            for candidate, key in self.tables.get(band, ()):
+                self.stats["comparisons"] += 1
+                if (candidate ^ simhash_value).bit_count() <= self.max_distance:
+                    return key, "near"
+        return None, None
+
+    def check(self, document, key):
+        """
+        Fingerprint a document and look it up. A new document is registered under `key` and
+        None is returned; a copy is counted, its URL recorded as an alias, and the key of the
+        canonical document returned. The fingerprint is left on the document ("fingerprint")
+        so the index builder can store it for later updates.
+        """
+        values = fingerprint(document)
+        document["fingerprint"] = values
+        self.stats["documents"] += 1
+        canonical, kind = self.find(*values)
+        if canonical is None:
+            self.add(key, *values)
+            return None
+        self.stats[f"{kind}_duplicates"] += 1
+        self.stats["postings_saved"] += values[2]
+        self.aliases.setdefault(canonical, []).append(document["url"])
+        metrics.count(f"{kind}_duplicates")
+        return canonical
+
+    def filter(self, documents):
+        """
+        Yield the canonical documents of a stream, dropping copies. Keys are the doc ids the
+        kept documents get from an index builder (their position in the output), so after
+        the stream is consumed `aliases` maps doc ids to alias URLs.
+        """
+        doc_id = 0
+        for document in documents:
+            if self.check(document, doc_id) is None:
+                doc_id += 1
+                yield document
+
+
+def print_dedup_stats(stats):
+    duplicates = stats["exact_duplicates"] + stats["near_duplicates"]
+    print(f"Duplicates collapsed: {duplicates} of {stats['documents']} documents "
+          f"({stats['exact_duplicates']} exact, {stats['near_duplicates']} near), "
+          f"{stats['postings_saved']} postings saved, {stats['comparisons']} fingerprint comparisons")
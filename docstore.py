@@ -0,0 +1,155 @@
+import os
+import json
+import zlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Compressed document store: the cleaned text of every document (and its abstractive
+# summary, once summarizer.py has written one), kept beside a segment for result
+# snippets. Records are packed in doc id order into blocks of about BLOCK_BYTES, and each
+# block is compressed on its own, so reading one document decompresses one small block.
+#
+#   docstore.dat   zlib-compressed blocks, back to back
+#   docstore.idx   per document: its block's byte offset and compressed size, and the
+#                  record's offset and length inside the decompressed block (DOCSTORE_DTYPE)
+#
+# A record is a UTF-8 JSON object {"text": ..., "important": ..., "summary": ...}: the
+# page's important text (title, headings, bold) if it has any, and "summary" once set.
+# Nothing is read until the first lookup, and recently used blocks are kept decompressed.
+
+DOCSTORE_FILES = ("docstore.dat", "docstore.idx")
+DOCSTORE_DTYPE = np.dtype([("block_offset", "<u8"), ("block_length", "<u4"), ("offset", "<u4"),
+                           ("length", "<u4")])
+BLOCK_BYTES = 16 * 1024    # Uncompressed bytes per block: small enough to decompress per lookup
+MAX_TEXT_CHARS = 50_000    # Longer pages are cut; snippets rarely come from that deep anyway
+COMPRESSION_LEVEL = 6
+CACHED_BLOCKS = 64
+
+
+def has_docstore(path):
+    return all(os.path.exists(os.path.join(path, name)) for name in DOCSTORE_FILES)
+
+
+def encode_record(text, summary=None, important=None):
+    record = {"text": (text or "")[:MAX_TEXT_CHARS]}
+    if important:
+        record["important"] = important[:MAX_TEXT_CHARS]
+    if summary:
+        record["summary"] = summary
+    return json.dumps(record, ensure_ascii=False).encode("utf-8")
+
+
+class DocStoreWriter:
+    """Appends records in doc id order into the docstore files of the directory `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        self.data_file = open(os.path.join(path, DOCSTORE_FILES[0]), "wb")
+        self.entries = []
+        self.block = []  # Records of the block being filled
+        self.block_size = 0
+        self.data_size = 0
+
+    def add(self, text, summary=None, important=None):
+        self.add_record(encode_record(text, summary, important))
+
+    def add_record(self, record):
+        """Append an already encoded record (see DocStore.record)."""
+        self.block.append(record)
+        self.block_size += len(record)
+        if self.block_size >= BLOCK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if not self.block:
+            return
+        compressed = zlib.compress(b"".join(self.block), COMPRESSION_LEVEL)
+        offset = 0
+        for record in self.block:
+            self.entries.append((self.data_size, len(compressed), offset, len(record)))
+            offset += len(record)
+        self.data_file.write(compressed)
+        self.data_size += len(compressed)
+        self.block, self.block_size = [], 0
+
+    def finish(self):
+        """Write the last block and the index. Returns the number of records."""
+        self._flush()
+        self.data_file.close()
+        np.array(self.entries, dtype=DOCSTORE_DTYPE).tofile(os.path.join(self.path, DOCSTORE_FILES[1]))
+        return len(self.entries)
+
+
+def _map(path, dtype):
+    if os.path.getsize(path) == 0:  # numpy can't map empty files
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class DocStore:
+    """Read side of a docstore, opened on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.data = None
+        self.blocks = OrderedDict()  # block offset -> decompressed bytes, least recently used first
+        self.lock = threading.Lock()  # Server threads share one store
+
+    def _open(self):
+        self.data = _map(os.path.join(self.path, DOCSTORE_FILES[0]), np.uint8)
+        self.entries = _map(os.path.join(self.path, DOCSTORE_FILES[1]), DOCSTORE_DTYPE)
+
+    def __len__(self):
+        if self.entries is None:
+            self._open()
+        return len(self.entries)
+
+    def _block(self, offset, length):
+        with self.lock:
+            block = self.blocks.get(offset)
+            if block is not None:
+                self.blocks.move_to_end(offset)
+                return block
+        block = zlib.decompress(self.data[offset:offset + length].tobytes())
+        with self.lock:
+            self.blocks[offset] = block
+            if len(self.blocks) > CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+        return block
+
+    def record(self, doc_id):
+        """The encoded record of a document."""
+        if self.entries is None:
+            self._open()
+        entry = self.entries[doc_id]
+        block = self._block(int(entry["block_offset"]), int(entry["block_length"]))
+        start = int(entry["offset"])
+        return block[start:start + int(entry["length"])]
+
+    def get(self, doc_id):
+        """{"text", and "important" and "summary" if they were stored} of a document."""
+        return json.loads(self.record(doc_id))
+
+
+def rewrite_docstore(path, summaries):
+    """
+    Rewrite the docstore in the directory `path` with the given {doc id: summary} added,
+    keeping every other record as it is. The new files replace the old ones atomically,
+    so readers that already mapped them keep reading the old version.
+    """
+    store = DocStore(path)
+    tmp_dir = os.path.join(path, "docstore.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    writer = DocStoreWriter(tmp_dir)
+    for doc_id in range(len(store)):
+        if doc_id in summaries:
+            record = store.get(doc_id)
+            writer.add(record["text"], summaries[doc_id], record.get("important"))
+        else:
+            writer.add_record(store.record(doc_id))
+    writer.finish()
+    for name in DOCSTORE_FILES:
+        os.replace(os.path.join(tmp_dir, name), os.path.join(path, name))
+    os.rmdir(tmp_dir)
@@ -1,9 +1,41 @@
-from bs4 import BeautifulSoup
+import os
+from html.parser import HTMLParser
 
-def extract_text_from_html(html_content):
+# "stream" makes one pass with the standard library's HTMLParser, "lxml" makes the same pass
+# with lxml's C parser (falls back to "stream" when lxml isn't installed), and "soup" is the
+# original BeautifulSoup implementation, kept as the reference.
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "stream")
 
+HIDDEN_TAGS = {"script", "style", "noscript", "footer"}
+HIDDEN_STYLES = ("display:none", "visibility:hidden", "opacity:0")
+HIDDEN_CLASSES = {"hidden", "invisible", "offscreen", "screen-reader"}
+IMPORTANT_TAGS = {"title", "h1", "h2", "h3", "b", "strong"}
+
+# Elements html.parser-based BeautifulSoup closes as soon as they open
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+             "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex",
+             "nextid", "spacer"}
+
+
+def extract_text_from_html(html_content, mode=None):
+    """
+    Extract regular text, important text (title/h1-h3/b/strong) and raw outlinks from a
+    page, ignoring scripts, styles, footers and hidden elements.
+    """
     if not html_content or not isinstance(html_content, str):
-        return {"regular": "", "important": ""}
+        return {"regular": "", "important": "", "links": []}
+
+    mode = mode or EXTRACTION_MODE
+    if mode == "soup":
+        return extract_text_with_soup(html_content)
+    if mode == "lxml" and lxml_available():
+        return extract_text_with_lxml(html_content)
+    return extract_text_streaming(html_content)
+
+
+def extract_text_with_soup(html_content):
+    """Reference implementation: builds a BeautifulSoup tree and walks it once per rule."""
+    from bs4 import BeautifulSoup
 
     soup = BeautifulSoup(html_content, "html.parser")
 
@@ -29,11 +61,183 @@ def extract_text_from_html(html_content):
         if tag.get_text(strip=True):
             important_text.append(tag.get_text(strip=True))
 
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+
     clean_text = soup.get_text(separator=" ", strip=True)
 
     clean_text = " ".join(clean_text.split())
 
     return {
         "regular": clean_text,
-        "important": " ".join(important_text)
-    }
\ No newline at end of file
+        "important": " ".join(important_text),
+        "links": links
+    }
+
+
+def is_hidden(tag, attributes):
+    """Whether an element and everything inside it should be left out of the text."""
+    if tag in HIDDEN_TAGS:
+        return True
+    style = attributes.get("style")
+    if style is not None and any(rule in style.lower() for rule in HIDDEN_STYLES):
+        return True
+    classes = attributes.get("class")
+    if classes and not HIDDEN_CLASSES.isdisjoint(classes.split()):
+        return True
+    return attributes.get("aria-hidden") == "true"
+
+
+class TextCollector:
+    """
+    Single-pass extraction state, fed start/end/data events by a parser. Open elements are
+    kept on a stack; hidden elements bump a skip depth so nothing inside them is collected,
+    and every open important element gets each text chunk appended to its own buffer.
+    """
+
+    def __init__(self):
+        self.stack = []  # (tag, hides, important buffer or None)
+        self.skip_depth = 0
+        self.text = []
+        self.important = []
+        self.open_important = []
+        self.links = []
+
+    def start(self, tag, attributes):
+        hides = is_hidden(tag, attributes)
+        buffer = None
+        if self.skip_depth == 0 and not hides:
+            if tag == "a" and "href" in attributes:
+                self.links.append(attributes["href"])
+            if tag in IMPORTANT_TAGS:
+                buffer = []
+                self.important.append(buffer)
+                self.open_important.append(buffer)
+
+        if tag in VOID_TAGS:
+            if buffer is not None:
+                self.open_important.pop()
+            return
+        self.stack.append((tag, hides, buffer))
+        if hides:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        # Like BeautifulSoup: close the most recent open element with this name and
+        # everything opened inside it; stray end tags are ignored
+        for position in range(len(self.stack) - 1, -1, -1):
+            if self.stack[position][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > position:
+            _, hides, buffer = self.stack.pop()
+            if hides:
+                self.skip_depth -= 1
+            if buffer is not None:
+                self.open_important.pop()
+
+    def data(self, text):
+        if self.skip_depth:
+            return
+        text = text.strip()
+        if not text:
+            return
+        self.text.append(text)
+        for buffer in self.open_important:
+            buffer.append(text)
+
+    def result(self):
+        important_text = ["".join(buffer) for buffer in self.important if buffer]
+        return {
+            "regular": " ".join(" ".join(self.text).split()),
+            "important": " ".join(important_text),
+            "links": self.links
+        }
+
+
+class _StreamingParser(HTMLParser):
+    """Forwards html.parser events to a TextCollector."""
+
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def unknown_decl(self, data):
+        if data.startswith("CDATA["):  # BeautifulSoup keeps CDATA sections as text
+            self.collector.data(data[len("CDATA["):])
+
+
+def extract_text_streaming(html_content):
+    """One pass over the markup with html.parser; output matches extract_text_with_soup."""
+    collector = TextCollector()
+    parser = _StreamingParser(collector)
+    parser.feed(html_content)
+    parser.close()
+    return collector.result()
+
+
+def lxml_available():
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _LxmlTarget:
+    """
+    lxml parser target forwarding events to a TextCollector. lxml splits text around
+    entities, so text is buffered until the next tag to keep it one chunk, as html.parser does.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        self.pending = []
+
+    def _flush(self):
+        if self.pending:
+            self.collector.data("".join(self.pending))
+            self.pending = []
+
+    def start(self, tag, attributes):
+        self._flush()
+        if isinstance(tag, str):
+            self.collector.start(tag.lower(), dict(attributes))
+
+    def end(self, tag):
+        self._flush()
+        if isinstance(tag, str):
+            self.collector.end(tag.lower())
+
+    def data(self, text):
+        self.pending.append(text)
+
+    def close(self):
+        self._flush()
+        return self.collector.result()
+
+
+def extract_text_with_lxml(html_content):
+    """
+    Same single pass driven by lxml's C HTML parser. libxml2 repairs malformed markup
+    differently from html.parser, so output can differ slightly on broken pages.
+    """
+    from lxml import etree
+
+    collector = TextCollector()
+    parser = etree.HTMLParser(target=_LxmlTarget(collector), remove_comments=True, remove_pis=True)
+    parser.feed(html_content)
+    return parser.close()
@@ -0,0 +1,133 @@
+import tkinter as tk
+from tkinter import scrolledtext
+from search import complete
+from search_worker import SearchWorker
+
+# Tkinter search window. Searches run on a SearchWorker thread (search_worker.py) and the
+# window polls its progress messages with after(), so slow queries never freeze it. With
+# "Search as you type" on, a query is sent DEBOUNCE_MS after the last keystroke; every new
+# query supersedes the one in flight. Ranked URLs show as soon as ranking finishes and the
+# snippets fill in after, with the time of each stage above the results. Completions of
+# the word being typed come straight from the lexicon on every keystroke (search.complete).
+
+DEBOUNCE_MS = 250
+POLL_MS = 30
+MIN_TYPED_CHARS = 2  # Don't search as you type on a single letter
+SUGGESTIONS = 5
+
+
+def format_results(results):
+    if not results:
+        return "No relevant results found."
+    return "\n".join(f"DocID: {doc_id}\nScore: {score:.4f}\nURL: {url}\n"
+                     f"Summary: {'(loading...)' if summary is None else summary}\n"
+                     for doc_id, score, url, summary in results)
+
+
+def format_suggestions(completions):
+    if not completions:
+        return ""
+    return "Suggestions: " + ", ".join(f"{term}* ({df})" for term, df in completions)
+
+
+def format_timings(stages):
+    """(stage, seconds) pairs as "tokenize 0.05 ms, rank 3.10 ms, ... (total 3.95 ms)"."""
+    parts = ", ".join(f"{stage} {seconds * 1000:.2f} ms" for stage, seconds in stages)
+    return f"{parts} (total {sum(seconds for _, seconds in stages) * 1000:.2f} ms)"
+
+
+class SearchWindow:
+    def __init__(self, root, index, k=5):
+        self.root = root
+        self.index = index
+        self.worker = SearchWorker(index, k)
+        self.shown = 0  # Sequence number of the query on screen
+        self.stages = []  # (stage, seconds) of that query so far
+        self.pending = None  # after() id of the debounced search
+
+        root.title("Search Engine")
+        root.geometry("600x400")
+
+        tk.Label(root, text="Enter your query:", font=("Arial", 12)).pack(pady=5)
+        self.query = tk.StringVar()
+        query_entry = tk.Entry(root, width=50, font=("Arial", 12), textvariable=self.query)
+        query_entry.pack(pady=5)
+        query_entry.bind("<Return>", lambda event: self.search_now())
+        query_entry.focus_set()
+        self.query.trace_add("write", lambda *args: self.typed())
+
+        self.suggestions = tk.Label(root, text="", font=("Arial", 9), fg="gray30")
+        self.suggestions.pack()
+
+        controls = tk.Frame(root)
+        controls.pack(pady=5)
+        tk.Button(controls, text="Search", command=self.search_now, font=("Arial", 12),
+                  bg="lightblue").pack(side=tk.LEFT, padx=5)
+        self.as_you_type = tk.BooleanVar(value=True)
+        tk.Checkbutton(controls, text="Search as you type", variable=self.as_you_type).pack(side=tk.LEFT, padx=5)
+
+        self.status = tk.Label(root, text="", font=("Arial", 9), fg="gray30")
+        self.status.pack()
+        self.result_text = scrolledtext.ScrolledText(root, width=70, height=15, font=("Arial", 10))
+        self.result_text.pack(pady=5, fill=tk.BOTH, expand=True)
+
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        root.after(POLL_MS, self.poll)
+
+    def typed(self):
+        """Suggest completions and restart the debounce timer on every keystroke."""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        try:
+            self.suggestions.config(text=format_suggestions(complete(self.query.get(), self.index, SUGGESTIONS)))
+        except Exception:  # A suggestion is never worth an error dialog
+            self.suggestions.config(text="")
+        if self.as_you_type.get() and len(self.query.get().strip()) >= MIN_TYPED_CHARS:
+            self.pending = self.root.after(DEBOUNCE_MS, self.search_now)
+
+    def search_now(self):
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        query = self.query.get().strip()
+        if not query:
+            self.worker.cancel()
+            self.show("", "Please enter a search query.")
+            return
+        self.worker.submit(query)
+        self.status.config(text=f"Searching for {query!r}...")
+
+    def show(self, status, text):
+        self.status.config(text=status)
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, text)
+
+    def poll(self):
+        """Show the worker's progress on the newest query; messages about older ones are dropped."""
+        for message in self.worker.poll():
+            sequence = message["sequence"]
+            if not self.worker.is_current(sequence) or sequence < self.shown:
+                continue
+            if sequence != self.shown:
+                self.shown, self.stages = sequence, []
+            if message["stage"] == "error":
+                self.show("", f"Search failed: {message['error']}")
+                continue
+            self.stages.append((message["stage"], message["seconds"]))
+            if message["stage"] == "tokenize":
+                continue  # Nothing to show yet
+            state = "" if message["done"] else " (loading snippets...)"
+            self.show(f"{message['query']!r}: {format_timings(self.stages)}{state}",
+                      format_results(message["results"]))
+        self.root.after(POLL_MS, self.poll)
+
+    def close(self):
+        self.worker.running = False  # Daemon thread: don't wait for a search in flight
+        self.root.destroy()
+
+
+def run_gui(index, k=5):
+    root = tk.Tk()
+    SearchWindow(root, index, k)
+    root.mainloop()
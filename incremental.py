@@ -0,0 +1,556 @@
+import os
+import time
+import json
+import heapq
+import shutil
+import hashlib
+import threading
+import contextlib
+from itertools import repeat
+import numpy as np
+from segment import LINKS_FILE, FINGERPRINTS_FILE, FINGERPRINT_DTYPE, SegmentWriter, open_segment
+from segment_set import SegmentSet, load_manifest, save_manifest, manifest_aliases
+import read_json_files
+from read_json_files import discover_files, process_file, process_file_with_positions, print_read_stats
+from ingest import ordered_parallel_map
+from link_graph import build_link_graph
+from scoring import compute_pagerank
+from spimi import DEFAULT_MEMORY_BUDGET_MB, build_index_spimi
+from reorder import document_order, inverse_order, reorder_segment
+from dedup import Deduplicator, print_dedup_stats
+from champions import build_champions, segment_tier_info
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+# Incremental indexing. The manifest (segment_set.py) records every source file with its
+# mtime, size and content hash, and where its document lives (segment, local doc id).
+# An update rescans the data folder, re-parses only new and changed files into a small
+# delta segment, and tombstones the old versions of changed and deleted files. A
+# size-tiered merge policy later compacts small segments into larger ones, dropping
+# tombstoned documents for good: at the end of `main.py index` (unless --no-merge), and
+# in the background of the search server (start_background_merge).
+#
+# New pages are checked against the fingerprints of every live document (dedup.py); a
+# copy is not indexed, and its file entry points at the canonical document instead. When
+# that document goes away, its copies are parsed again and one of them takes its place.
+#
+# One writer at a time: every read-modify-write of the manifest holds the index's writer
+# lock, an exclusive flock on manifest.lock (plus a thread lock for this process), so
+# overlapping `main.py index` runs wait for each other instead of losing updates. A merge
+# builds its segment outside the lock, under a .tmp name that garbage collection leaves
+# alone, and only renames it into place when it commits.
+
+MERGE_FACTOR = 10           # Merge once this many segments share a size tier
+MIN_SEGMENT_DOCS = 1000     # Segments smaller than this all share the lowest tier
+DELETED_MERGE_RATIO = 0.5   # Rewrite a segment on its own once this share of it is tombstoned
+
+LOCK_NAME = "manifest.lock"
+
+_thread_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _manifest_lock(index_dir):
+    """Hold the writer lock of `index_dir` (see the module comment)."""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(index_dir, LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            yield
+
+
+def content_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def scan_changes(files, data_folder=None):
+    """
+    Compare the data folder with the manifest's `files` entries. Files whose mtime and size
+    match are assumed unchanged without reading them; otherwise the content hash decides,
+    so touching a file doesn't re-index it.
+
+    Returns (added, changed, deleted, fingerprints): lists of relative paths and the new
+    {"mtime_ns", "size", "sha1"} of every file that was hashed.
+    """
+    data_folder = data_folder or _default_data_folder()
+    added, changed, fingerprints = [], [], {}
+    seen = set()
+    for path in discover_files(data_folder):
+        name = os.path.relpath(path, data_folder)
+        seen.add(name)
+        status = os.stat(path)
+        known = files.get(name)
+        if known and known["mtime_ns"] == status.st_mtime_ns and known["size"] == status.st_size:
+            continue
+        fingerprints[name] = {"mtime_ns": status.st_mtime_ns, "size": status.st_size, "sha1": content_hash(path)}
+        if known is None:
+            added.append(name)
+        elif known["sha1"] != fingerprints[name]["sha1"]:
+            changed.append(name)
+    deleted = sorted(name for name in files if name not in seen)
+    return added, changed, deleted, fingerprints
+
+
+def _default_data_folder():
+    return read_json_files.DATA_FOLDER
+
+
+def _segment_names(manifest):
+    return [entry["name"] for entry in manifest["segments"]]
+
+
+def _tombstone(manifest, location):
+    """Mark the document at a manifest location ([segment name, local doc id]) deleted."""
+    if location is None:
+        return
+    name, doc_id = location
+    for entry in manifest["segments"]:
+        if entry["name"] == name:
+            entry["deleted"].append(doc_id)
+            return
+
+
+def _iter_links(index_dir, manifest):
+    """{"url", "links"} of every live document, in global doc id order, with its global id."""
+    base = 0
+    for entry in manifest["segments"]:
+        deleted = set(entry["deleted"])
+        with open(os.path.join(index_dir, entry["name"], LINKS_FILE), "r", encoding="utf-8") as file:
+            for doc_id, line in enumerate(file):
+                if doc_id not in deleted:
+                    yield base + doc_id, json.loads(line)
+        base += entry["num_docs"]
+
+
+class _LiveLinks:
+    """Re-iterable live-document link records, for build_link_graph."""
+
+    def __init__(self, index_dir, manifest):
+        self.index_dir = index_dir
+        self.manifest = manifest
+
+    def __iter__(self):
+        for _, record in _iter_links(self.index_dir, self.manifest):
+            yield record
+
+
+def _write_pagerank(index_dir, manifest):
+    """
+    Recompute PageRank over the live documents of every segment and store it in global doc
+    id order (tombstoned documents get 0). Reads only the stored outlinks, never the pages.
+    """
+    total = sum(entry["num_docs"] for entry in manifest["segments"])
+    live_ids = np.fromiter((doc_id for doc_id, _ in _iter_links(index_dir, manifest)), dtype=np.int64)
+    # Link graph nodes are the live documents in order, so alias doc ids are translated into node ids
+    aliases = {int(np.searchsorted(live_ids, doc_id)): urls for doc_id, urls in manifest_aliases(manifest).items()}
+    indptr, indices = build_link_graph(_LiveLinks(index_dir, manifest), aliases)
+    scores, _ = compute_pagerank(indptr, indices)
+
+    pagerank = np.zeros(total)
+    pagerank[live_ids] = scores
+    name = f"pagerank-{manifest['generation']:06d}.npy"
+    np.save(os.path.join(index_dir, name), pagerank)
+    manifest["pagerank"] = name
+
+
+def _collect_garbage(index_dir, manifest, previous):
+    """
+    Remove segments and PageRank files referenced by neither the new nor the previous
+    manifest. Files of the previous generation are kept so readers that opened it just
+    before the commit can still map them.
+    """
+    keep = set(_segment_names(manifest)) | set(_segment_names(previous))
+    keep.update(name for name in (manifest.get("pagerank"), previous.get("pagerank")) if name)
+    for name in os.listdir(index_dir):
+        if name.startswith("seg-") and not name.endswith(".tmp") and name not in keep:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+        elif name.startswith("pagerank-") and name not in keep:
+            os.remove(os.path.join(index_dir, name))
+
+
+def _commit(index_dir, manifest, previous):
+    manifest["generation"] += 1
+    _write_pagerank(index_dir, manifest)
+    save_manifest(index_dir, manifest)
+    _collect_garbage(index_dir, manifest, previous)
+
+
+def update_index(index_dir, data_folder=None, workers=1, chunk_size=32, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                 positions=False, dedup=True, docstore=True):
+    """
+    Bring the index in `index_dir` up to date with the data folder, creating it if needed.
+    New and changed files are parsed into one delta segment; the documents of changed and
+    deleted files are tombstoned. Cost is proportional to the number of changed files, plus
+    a PageRank pass over the stored link graph. `positions` makes a new index store token
+    positions and `docstore` their text for snippets (see docstore.py); an existing index
+    keeps the settings it was created with. With `dedup`, pages that copy an indexed or new
+    page are collapsed into it as aliases (see dedup.py).
+
+    Returns a stats dict: added/changed/deleted/unchanged file counts, documents indexed,
+    duplicates collapsed and the postings that saved, the new generation and seconds taken.
+    """
+    start = time.perf_counter()
+    data_folder = data_folder or _default_data_folder()
+    os.makedirs(index_dir, exist_ok=True)
+
+    with _manifest_lock(index_dir):
+        manifest = load_manifest(index_dir)
+        if not manifest["segments"] and not manifest["files"]:
+            manifest["positions"] = bool(positions)
+            manifest["docstore"] = bool(docstore)
+        positions = manifest.get("positions", False)
+        docstore = manifest.get("docstore", False)
+        previous = json.loads(json.dumps(manifest))
+        files = manifest["files"]
+        added, changed, deleted, fingerprints = scan_changes(files, data_folder)
+        stats = {"added": len(added), "changed": len(changed), "deleted": len(deleted),
+                 "unchanged": len(files) - len(changed) - len(deleted), "documents": 0, "duplicates": 0,
+                 "postings_saved": 0}
+
+        # Files that were only touched get their new mtime recorded, nothing else
+        for name, fingerprint in fingerprints.items():
+            if name in files and name not in changed:
+                files[name].update(fingerprint)
+
+        removed, reparsed = set(), set(changed + deleted)
+        for name in reparsed:
+            if "alias" not in files[name] and files[name]["doc"]:  # An alias's document belongs to another file
+                _tombstone(manifest, files[name]["doc"])
+                removed.add(tuple(files[name]["doc"]))
+        # Copies of the removed documents lost what they pointed at, so they are indexed again
+        orphaned = sorted(name for name, entry in files.items() if "alias" in entry and entry["doc"]
+                          and tuple(entry["doc"]) in removed and name not in reparsed)
+        for name in orphaned:
+            fingerprints[name] = {key: files[name][key] for key in ("mtime_ns", "size", "sha1")}
+        for name in deleted:
+            del files[name]
+
+        to_index = sorted(added + changed + orphaned)
+        if to_index:
+            segment_name = f"seg-{manifest['next_segment']:05d}"
+            manifest["next_segment"] += 1
+            locations = {}
+            read_stats = {"total_files_read": 0, "skipped": 0, "failed": 0, "documents": 0}
+            deduplicator = _live_deduplicator(index_dir, manifest) if dedup else None
+            documents = _iter_new_documents(data_folder, to_index, locations, read_stats, workers, chunk_size,
+                                            positions, segment_name, deduplicator)
+            num_docs = build_index_spimi(documents, os.path.join(index_dir, segment_name), memory_budget_mb,
+                                         read_stats=read_stats, temp_dir=index_dir, keep_links=True,
+                                         positions=positions, docstore=docstore)
+            print_read_stats(read_stats)
+            if deduplicator is not None:
+                print_dedup_stats(deduplicator.stats)
+                stats["duplicates"] = deduplicator.stats["exact_duplicates"] + deduplicator.stats["near_duplicates"]
+                stats["postings_saved"] = deduplicator.stats["postings_saved"]
+            for name in to_index:
+                files[name] = dict(fingerprints[name], **locations.get(name, {"doc": None}))
+            if num_docs:
+                manifest["segments"].append({"name": segment_name, "num_docs": num_docs, "deleted": []})
+            stats["documents"] = num_docs
+
+        if to_index or deleted:
+            _commit(index_dir, manifest, previous)
+        elif fingerprints:
+            save_manifest(index_dir, manifest)
+
+    stats["generation"] = manifest["generation"]
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def _live_deduplicator(index_dir, manifest):
+    """A Deduplicator holding the fingerprint of every live document, keyed by (segment name, local doc id)."""
+    deduplicator = Deduplicator()
+    for entry in manifest["segments"]:
+        path = os.path.join(index_dir, entry["name"], FINGERPRINTS_FILE)
+        if not os.path.exists(path):  # Written before deduplication, or without it
+            continue
+        deleted = set(entry["deleted"])
+        for doc_id, values in enumerate(np.fromfile(path, dtype=FINGERPRINT_DTYPE).tolist()):
+            if doc_id not in deleted:
+                deduplicator.add((entry["name"], doc_id), *values)
+    return deduplicator
+
+
+def _iter_new_documents(data_folder, names, locations, stats, workers, chunk_size, positions=False,
+                        segment_name=None, deduplicator=None):
+    """
+    Parse the given files in order, recording the manifest entry fields of each one in
+    `locations`: {"doc": [segment_name, local doc id]} for an indexed page, or the
+    canonical document's location and {"alias": url} for a copy that the deduplicator drops.
+    """
+    paths = [os.path.join(data_folder, name) for name in names]
+    function = process_file_with_positions if positions else process_file
+    for name, (status, payload) in zip(names, ordered_parallel_map(function, paths, workers, chunk_size)):
+        stats["total_files_read"] += 1
+        if status == "failed":
+            print(payload)
+            stats["failed"] += 1
+            continue
+        if status == "skipped":
+            print(f"Skipping empty document: {payload}")
+            stats["skipped"] += 1
+            continue
+        key = (segment_name, stats["documents"])
+        canonical = deduplicator.check(payload, key) if deduplicator is not None else None
+        if canonical is not None:
+            locations[name] = {"doc": list(canonical), "alias": payload["url"]}
+            continue
+        locations[name] = {"doc": list(key)}
+        stats["documents"] += 1
+        yield payload
+
+
+def size_tier(num_docs, merge_factor=MERGE_FACTOR, min_segment_docs=MIN_SEGMENT_DOCS):
+    """Tier 0 holds segments under min_segment_docs; each tier above is merge_factor times larger."""
+    tier = 0
+    limit = min_segment_docs
+    while num_docs >= limit:
+        tier += 1
+        limit *= merge_factor
+    return tier
+
+
+def find_merge(segments, merge_factor=MERGE_FACTOR, min_segment_docs=MIN_SEGMENT_DOCS):
+    """
+    Size-tiered merge policy. Given manifest segment entries (oldest first), return the
+    positions of the next segments to merge, or [] if none need it: the newest run of at
+    least `merge_factor` adjacent segments in the same size tier, or else a single segment
+    that is mostly tombstones. Only adjacent segments are merged so doc ids stay in order.
+    """
+    tiers = [size_tier(entry["num_docs"] - len(entry["deleted"]), merge_factor, min_segment_docs)
+             for entry in segments]
+    end = len(tiers)
+    while end > 0:
+        begin = end - 1
+        while begin > 0 and tiers[begin - 1] == tiers[end - 1]:
+            begin -= 1
+        if end - begin >= merge_factor:
+            return list(range(begin, end))
+        end = begin
+
+    for position, entry in enumerate(segments):
+        if entry["deleted"] and len(entry["deleted"]) >= DELETED_MERGE_RATIO * entry["num_docs"]:
+            return [position]
+    return []
+
+
+def merge_segments(index_dir, positions, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    Merge the adjacent segments at `positions` of the current manifest into one, dropping
+    their tombstoned documents. The slow part runs without the lock, into a .tmp directory;
+    documents tombstoned by an update meanwhile are carried over into the merged segment
+    when committing. If another process merged any of the same segments first, the work is
+    thrown away. When every merged segment has a tier 1, so does the result.
+
+    Returns the merged segment's name, or None if every document was deleted or the merge
+    lost that race.
+    """
+    with _manifest_lock(index_dir):
+        manifest = load_manifest(index_dir)
+        if max(positions) >= len(manifest["segments"]):
+            return None  # Chosen from a manifest another process has since merged
+        sources = [manifest["segments"][position] for position in positions]
+        merged_name = f"seg-{manifest['next_segment']:05d}"
+        manifest["next_segment"] += 1
+        save_manifest(index_dir, manifest)  # Reserve the name
+
+    snapshot = SegmentSet(index_dir, manifest)
+    segments = [snapshot.segments[position] for position in positions]
+    remaps, live_lengths, urls, pagerank, fingerprints = [], [], [], [], []
+    for position, segment, entry in zip(positions, segments, sources):
+        live = np.ones(segment.num_docs, dtype=bool)
+        live[np.asarray(entry["deleted"], dtype=np.int64)] = False
+        remap = np.cumsum(live) - 1 + sum(len(lengths) for lengths in live_lengths)
+        remap[~live] = -1
+        remaps.append(remap)
+        live_lengths.append(np.asarray(segment.doc_lengths)[live])
+        urls.extend(segment.url(doc_id) for doc_id in np.flatnonzero(live).tolist())
+        base = int(snapshot.bases[position])
+        pagerank.append(np.asarray(snapshot.pagerank_scores[base:base + segment.num_docs])[live])
+        if segment.fingerprints is not None:
+            fingerprints.append(np.asarray(segment.fingerprints)[live])
+
+    merged_path = os.path.join(index_dir, merged_name)
+    staging_path = merged_path + ".merge.tmp"  # Not garbage collected, unlike an uncommitted seg-N
+    num_docs = len(urls)
+    positional = all(segment.has_positions for segment in segments)
+    writer = SegmentWriter(staging_path, np.concatenate(live_lengths), positions=positional)
+    term_streams = [zip(segment, repeat(part)) for part, segment in enumerate(segments)]
+    current, pieces = None, []
+    for term, part in heapq.merge(*term_streams):
+        if term != current:
+            _add_merged_term(writer, current, pieces)
+            current, pieces = term, []
+        postings = segments[part][term]
+        documents, frequencies = postings.decode()
+        new_ids = remaps[part][documents]
+        live = new_ids >= 0
+        term_positions = None
+        if positional:
+            counts, term_positions = postings.decode_positions()
+            term_positions = (counts[live], term_positions[np.repeat(live, counts)])
+        pieces.append((new_ids[live], frequencies[live], term_positions))
+    _add_merged_term(writer, current, pieces)
+    records = None
+    if all(segment.has_docstore for segment in segments):
+        records = (segment.document_record(doc_id) for segment, remap in zip(segments, remaps)
+                   for doc_id in np.flatnonzero(remap >= 0).tolist())
+    writer.finish(urls, np.concatenate(pagerank),
+                  fingerprints=np.concatenate(fingerprints) if len(fingerprints) == len(segments) else None,
+                  records=records, merged_from=[entry["name"] for entry in sources])
+
+    with open(os.path.join(staging_path, LINKS_FILE), "w", encoding="utf-8") as links_file:
+        for entry, remap in zip(sources, remaps):
+            with open(os.path.join(index_dir, entry["name"], LINKS_FILE), "r", encoding="utf-8") as file:
+                for doc_id, line in enumerate(file):
+                    if remap[doc_id] >= 0:
+                        links_file.write(line)
+    if num_docs and all(segment_tier_info(segment) is not None for segment in segments):
+        build_champions(open_segment(staging_path))  # Tier 1 stays complete (see champions.py)
+
+    with _manifest_lock(index_dir):
+        manifest = load_manifest(index_dir)
+        previous = json.loads(json.dumps(manifest))
+        names = [entry["name"] for entry in sources]
+        current_entries = {entry["name"]: entry for entry in manifest["segments"]}
+        if any(name not in current_entries for name in names):
+            print(f"Dropping merge into {merged_name}: its segments were merged by another process meanwhile")
+            shutil.rmtree(staging_path, ignore_errors=True)
+            return None
+        os.rename(staging_path, merged_path)
+        position = _segment_names(manifest).index(names[0])
+
+        # Tombstones added since the snapshot, translated into merged doc ids
+        new_deleted = []
+        for entry, remap in zip(sources, remaps):
+            for doc_id in set(current_entries[entry["name"]]["deleted"]) - set(entry["deleted"]):
+                new_deleted.append(int(remap[doc_id]))
+        merged_entry = {"name": merged_name, "num_docs": num_docs, "deleted": sorted(new_deleted)}
+        manifest["segments"][position:position + len(names)] = [merged_entry] if num_docs else []
+
+        remap_by_name = dict(zip(names, remaps))
+        for file_entry in manifest["files"].values():
+            location = file_entry["doc"]
+            if location and location[0] in remap_by_name:
+                file_entry["doc"] = [merged_name, int(remap_by_name[location[0]][location[1]])]
+        _commit(index_dir, manifest, previous)  # An empty merged segment is garbage collected
+
+    return merged_name if num_docs else None
+
+
+def _add_merged_term(writer, term, pieces):
+    if term is None:
+        return
+    documents = np.concatenate([piece[0] for piece in pieces])
+    if len(documents):
+        positions = None
+        if pieces[0][2] is not None:
+            positions = (np.concatenate([piece[2][0] for piece in pieces]),
+                         np.concatenate([piece[2][1] for piece in pieces]))
+        writer.add_term(term, documents, np.concatenate([piece[1] for piece in pieces]), positions=positions)
+
+
+def run_merges(index_dir, merge_factor=MERGE_FACTOR, min_segment_docs=MIN_SEGMENT_DOCS):
+    """Apply the merge policy until it finds nothing to merge. Returns the number of merges."""
+    merges = 0
+    while True:
+        positions = find_merge(load_manifest(index_dir)["segments"], merge_factor, min_segment_docs)
+        if not positions:
+            return merges
+        merge_segments(index_dir, positions)
+        merges += 1
+
+
+def start_background_merge(index_dir, merge_factor=MERGE_FACTOR, min_segment_docs=MIN_SEGMENT_DOCS, interval=None,
+                           stop=None):
+    """
+    Run the merge policy on a background thread; readers keep using their open generation.
+    With `interval`, the thread is a daemon that applies the policy again every `interval`
+    seconds, compacting the deltas of later updates, until `stop` (a threading.Event) is
+    set or the process exits (the search server runs one this way).
+    """
+    stop = stop or threading.Event()
+
+    def merge():
+        while True:
+            try:
+                merges = run_merges(index_dir, merge_factor, min_segment_docs)
+                if merges:
+                    print(f"Background merge finished: {merges} merge(s), "
+                          f"generation {load_manifest(index_dir)['generation']}")
+            except Exception as e:
+                if interval is None:
+                    raise
+                print(f"Background merge failed: {e}")
+            if interval is None or stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=merge, name="index-merge", daemon=interval is not None)
+    thread.start()
+    return thread
+
+
+def force_merge(index_dir):
+    """Merge every segment into one (e.g. before shipping an index)."""
+    segments = load_manifest(index_dir)["segments"]
+    if len(segments) > 1 or (segments and segments[0]["deleted"]):
+        merge_segments(index_dir, list(range(len(segments))))
+
+
+def reorder_index(index_dir, strategy):
+    """
+    Renumber the documents of the index by one of reorder.STRATEGIES ("url", "pagerank" or
+    "bisection"). Every segment is merged into one first, which is then rewritten in the
+    new order; the file locations in the manifest, the stored outlinks and PageRank follow.
+    Documents added by later updates get ids after it, as usual.
+
+    Returns a stats dict: documents, postings and positions bytes before and after, seconds.
+    """
+    start = time.perf_counter()
+    force_merge(index_dir)
+    with _manifest_lock(index_dir):
+        manifest = load_manifest(index_dir)
+        if not manifest["segments"]:
+            return {"documents": 0, "seconds": time.perf_counter() - start}
+        if len(manifest["segments"]) > 1 or manifest["segments"][0]["deleted"]:
+            raise RuntimeError(f"{index_dir} was updated while being reordered; run the reorder again")
+        previous = json.loads(json.dumps(manifest))
+        source = manifest["segments"][0]
+        index = SegmentSet(index_dir, manifest)
+        old_header = index.segments[0].header
+
+        urls = [index.url(doc_id) for doc_id in range(index.num_docs)]
+        order = document_order(strategy, index, urls, index.pagerank_scores)
+        new_id = inverse_order(order)
+        name = f"seg-{manifest['next_segment']:05d}"
+        manifest["next_segment"] += 1
+        path = os.path.join(index_dir, name)
+        reorder_segment(index, path, order, doc_order=strategy, reordered_from=source["name"],
+                        total_files_read=old_header.get("total_files_read", index.num_docs))
+
+        with open(os.path.join(index_dir, source["name"], LINKS_FILE), "r", encoding="utf-8") as file:
+            links = file.readlines()
+        with open(os.path.join(path, LINKS_FILE), "w", encoding="utf-8") as file:
+            file.writelines(links[doc_id] for doc_id in order.tolist())
+        with open(os.path.join(path, "header.json"), "r", encoding="utf-8") as file:
+            new_header = json.load(file)
+
+        manifest["segments"] = [{"name": name, "num_docs": index.num_docs, "deleted": []}]
+        manifest["doc_order"] = strategy
+        for file_entry in manifest["files"].values():
+            location = file_entry["doc"]
+            if location:
+                file_entry["doc"] = [name, int(new_id[location[1]])]
+        _commit(index_dir, manifest, previous)
+
+    return {"documents": index.num_docs, "strategy": strategy,
+            "postings_bytes": (old_header["postings_bytes"], new_header["postings_bytes"]),
+            "positions_bytes": (old_header.get("positions_bytes", 0), new_header.get("positions_bytes", 0)),
+            "seconds": time.perf_counter() - start}
@@ -0,0 +1,58 @@
+import os
+import itertools
+import multiprocessing
+from collections import deque
+
+# Ordered, bounded parallel map used by the ingest stage: items are cut into chunks,
+# each chunk is one task for a worker process, and at most `max_pending` chunks are
+# in flight at once so results never pile up faster than the consumer (the index
+# builder) takes them. Results come back in input order, which keeps doc ids stable.
+
+
+def default_workers():
+    """Worker processes to use when none is configured: one per core."""
+    return os.cpu_count() or 1
+
+
+def _run_chunk(function, chunk):
+    """Apply `function` to every item of a chunk, isolating failures per item."""
+    results = []
+    for item in chunk:
+        try:
+            results.append(function(item))
+        except Exception as e:
+            results.append(("failed", f"{item}: {e}"))
+    return results
+
+
+def _chunks(items, chunk_size):
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered_parallel_map(function, items, workers=None, chunk_size=32, max_pending=None):
+    """
+    Yield function(item) for every item, in order, computed by a pool of worker processes.
+    `function` must be a module-level function. Exceptions raised by `function` are caught
+    in the worker and yielded as ("failed", message) so one bad item can't stop the run.
+    With workers <= 1 everything runs in this process.
+    """
+    workers = workers or default_workers()
+    if workers <= 1:
+        for chunk in _chunks(items, chunk_size):
+            yield from _run_chunk(function, chunk)
+        return
+
+    max_pending = max_pending or workers * 4
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in _chunks(items, chunk_size):
+            pending.append(pool.apply_async(_run_chunk, (function, chunk)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
@@ -0,0 +1,278 @@
+import os
+import sys
+import mmap
+import numpy as np
+
+# Front-coded term dictionary (lexicon) of a segment. Terms are sorted by their UTF-8
+# bytes and stored in blocks of LEXICON_BLOCK: the first term of a block whole, every
+# other one as the length of the prefix it shares with the term before it plus the rest.
+#
+#   lexicon.dat   per block: varint length and bytes of the first term, then for each
+#                 further term varint shared-prefix length, varint suffix length, suffix
+#   lexicon.idx   uint64 byte offset of each block in lexicon.dat (num_blocks + 1)
+#
+# A term's id is its position in sorted order, so it indexes the per-term arrays next to
+# the lexicon (terms.meta: df and postings offset) directly. Exact lookups binary search
+# the blocks' first terms and scan one block. All terms sharing a prefix form one range
+# of ids, found with two such searches, so prefix enumeration and top-N-by-df completion
+# only ever decode the blocks they return terms from.
+#
+# Segments from before the lexicon (terms.dat and terms.idx: plain concatenated terms and
+# their offsets) are read through PlainLexicon, which has the same interface.
+
+LEXICON_FILES = ("lexicon.dat", "lexicon.idx")
+PLAIN_TERM_FILES = ("terms.dat", "terms.idx")
+LEXICON_BLOCK = 16  # Terms per block: a lookup decodes at most this many
+
+
+def _write_varint(output, value):
+    while value >= 0x80:
+        output.append(value & 0x7F | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _shared_prefix(previous, term):
+    length = min(len(previous), len(term))
+    for index in range(length):
+        if previous[index] != term[index]:
+            return index
+    return length
+
+
+def prefix_successor(prefix):
+    """The smallest byte string greater than every string starting with `prefix` (None if there is none)."""
+    prefix = prefix.rstrip(b"\xff")
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
+
+
+class LexiconWriter:
+    """Writes the lexicon files of the directory `path`; terms must be added in sorted order."""
+
+    def __init__(self, path):
+        self.path = path
+        self.data_file = open(os.path.join(path, LEXICON_FILES[0]), "wb")
+        self.block_offsets = [0]
+        self.block = bytearray()
+        self.block_terms = 0
+        self.previous = b""
+        self.num_terms = 0
+
+    def add(self, term):
+        encoded = term.encode("utf-8")
+        if self.block_terms == 0:
+            _write_varint(self.block, len(encoded))
+            self.block += encoded
+        else:
+            shared = _shared_prefix(self.previous, encoded)
+            _write_varint(self.block, shared)
+            _write_varint(self.block, len(encoded) - shared)
+            self.block += encoded[shared:]
+        self.previous = encoded
+        self.num_terms += 1
+        self.block_terms += 1
+        if self.block_terms == LEXICON_BLOCK:
+            self._flush()
+
+    def _flush(self):
+        if self.block_terms:
+            self.data_file.write(self.block)
+            self.block_offsets.append(self.block_offsets[-1] + len(self.block))
+            self.block, self.block_terms = bytearray(), 0
+
+    def finish(self):
+        """Write the last block and the block offsets. Returns the number of terms."""
+        self._flush()
+        self.data_file.close()
+        np.array(self.block_offsets, dtype="<u8").tofile(os.path.join(self.path, LEXICON_FILES[1]))
+        return self.num_terms
+
+
+def _map_bytes(path):
+    """
+    A read-only mapping of the file. Lookups slice it a few dozen times each, and slicing
+    an mmap (or a memoryview of one) is several times cheaper than slicing a numpy.memmap.
+    """
+    with open(path, "rb") as file:
+        if os.path.getsize(path) == 0:  # Empty files can't be mapped
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_offsets(path):
+    """The uint64 offsets of an .idx file, indexable as Python ints."""
+    data = _map_bytes(path)
+    if sys.byteorder != "little":
+        return np.frombuffer(data, dtype="<u8").astype(np.uint64).tolist()
+    return memoryview(data).cast("Q") if len(data) else []
+
+
+class BaseLexicon:
+    """
+    Lookups shared by both layouts, on top of first_term(block), which returns the encoded
+    first term of a block, and block_terms(block), which decodes all of a block's terms.
+    """
+
+    block_size = 1
+    num_terms = 0
+    num_blocks = 0
+
+    def __len__(self):
+        return self.num_terms
+
+    def __iter__(self):
+        for block in range(self.num_blocks):
+            for term in self.block_terms(block):
+                yield term.decode("utf-8")
+
+    def term(self, term_id):
+        block, index = divmod(term_id, self.block_size)
+        return self.block_terms(block)[index].decode("utf-8")
+
+    def _block_of(self, target):
+        """The last block whose first term is <= target (-1 if target sorts before every term)."""
+        low, high = 0, self.num_blocks
+        while low < high:
+            middle = (low + high) // 2
+            if self.first_term(middle) <= target:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def lower_bound(self, target):
+        """Id of the first term >= target (bytes); num_terms if there is none."""
+        block = self._block_of(target)
+        if block < 0:
+            return 0
+        for index, term in enumerate(self.block_terms(block)):
+            if term >= target:
+                return block * self.block_size + index
+        return min((block + 1) * self.block_size, self.num_terms)
+
+    def term_id(self, term):
+        """Id of `term`, or -1 if the lexicon doesn't have it."""
+        target = term.encode("utf-8")
+        block = self._block_of(target)
+        if block < 0:
+            return -1
+        terms = self.block_terms(block)
+        for index, candidate in enumerate(terms):
+            if candidate == target:
+                return block * self.block_size + index
+            if candidate > target:
+                break
+        return -1
+
+    def prefix_range(self, prefix):
+        """(first, end) ids of the terms that start with `prefix`."""
+        encoded = prefix.encode("utf-8")
+        first = self.lower_bound(encoded)
+        successor = prefix_successor(encoded)
+        end = self.num_terms if successor is None else self.lower_bound(successor)
+        return first, max(first, end)
+
+    def terms_between(self, first, end):
+        """(term id, term) for the ids first..end-1, decoding each block once."""
+        term_id = first
+        while term_id < end:
+            block, index = divmod(term_id, self.block_size)
+            for term in self.block_terms(block)[index:index + end - term_id]:
+                yield term_id, term.decode("utf-8")
+                term_id += 1
+
+    def prefix_terms(self, prefix):
+        """(term id, term) of every term starting with `prefix`, in sorted order."""
+        return self.terms_between(*self.prefix_range(prefix))
+
+    def complete(self, prefix, document_frequencies, limit=10):
+        """
+        The `limit` terms starting with `prefix` with the highest document frequency, as
+        (term, df) pairs, most frequent first (ties in term order). `document_frequencies`
+        is the per-term-id df array (terms.meta "df"); only the winners are decoded.
+        """
+        first, end = self.prefix_range(prefix)
+        if first == end or limit <= 0:
+            return []
+        frequencies = np.asarray(document_frequencies[first:end])
+        if len(frequencies) > limit:
+            cutoff = frequencies[np.argpartition(-frequencies, limit - 1)[limit - 1]]
+            above = np.flatnonzero(frequencies > cutoff)
+            top = np.concatenate([above, np.flatnonzero(frequencies == cutoff)[:limit - len(above)]])  # First ties
+        else:
+            top = np.arange(len(frequencies))
+        top = sorted(top.tolist(), key=lambda index: (-int(frequencies[index]), index))
+        return [(self.term(first + index), int(frequencies[index])) for index in top]
+
+
+class Lexicon(BaseLexicon):
+    """Read side of a front-coded lexicon, memory-mapped."""
+
+    block_size = LEXICON_BLOCK
+
+    def __init__(self, path, num_terms):
+        self.path = path
+        self.num_terms = num_terms
+        self.data = _map_bytes(os.path.join(path, LEXICON_FILES[0]))
+        self.block_offsets = _map_offsets(os.path.join(path, LEXICON_FILES[1]))
+        self.num_blocks = max(0, len(self.block_offsets) - 1)
+
+    def _block_bytes(self, block):
+        return self.data[self.block_offsets[block]:self.block_offsets[block + 1]]
+
+    def first_term(self, block):
+        data = self._block_bytes(block)
+        length, position = _read_varint(data, 0)
+        return data[position:position + length]
+
+    def block_terms(self, block):
+        data = self._block_bytes(block)
+        length, position = _read_varint(data, 0)
+        term = data[position:position + length]
+        position += length
+        terms = [term]
+        while position < len(data):
+            shared, position = _read_varint(data, position)
+            length, position = _read_varint(data, position)
+            term = term[:shared] + data[position:position + length]
+            position += length
+            terms.append(term)
+        return terms
+
+
+class PlainLexicon(BaseLexicon):
+    """The concatenated terms and offsets of older segments, behind the Lexicon interface."""
+
+    block_size = 1
+
+    def __init__(self, path, num_terms):
+        self.path = path
+        self.num_terms = self.num_blocks = num_terms
+        self.term_bytes = _map_bytes(os.path.join(path, PLAIN_TERM_FILES[0]))
+        self.term_offsets = _map_offsets(os.path.join(path, PLAIN_TERM_FILES[1]))
+
+    def first_term(self, block):
+        return self.term_bytes[self.term_offsets[block]:self.term_offsets[block + 1]]
+
+    def block_terms(self, block):
+        return [self.first_term(block)]
+
+
+def open_lexicon(path, num_terms):
+    """The lexicon of the segment directory `path`, in whichever layout it was written."""
+    if os.path.exists(os.path.join(path, LEXICON_FILES[0])):
+        return Lexicon(path, num_terms)
+    return PlainLexicon(path, num_terms)
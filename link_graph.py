@@ -0,0 +1,97 @@
+import os
+from array import array
+from urllib.parse import urljoin, urldefrag, urlsplit, urlunsplit
+import numpy as np
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(href, base_url=None):
+    """
+    Resolve an href against the page it appeared on and normalize it so the same
+    page always maps to the same string. Returns None for non-http(s) links
+    (mailto:, javascript:, tel:, ...) and anything that can't be parsed.
+    """
+    if not href or not isinstance(href, str):
+        return None
+
+    href = href.strip()
+    try:
+        if base_url:
+            href = urljoin(base_url, href)
+        href, _ = urldefrag(href)
+        parts = urlsplit(href)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    path = parts.path or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
+
+def normalize_links(page_url, hrefs):
+    """Normalize a page's raw hrefs, dropping invalid links, self-links and duplicates."""
+    page_url = normalize_url(page_url)
+    links = []
+    seen = set()
+    for href in hrefs:
+        link = normalize_url(href, page_url)
+        if link is None or link == page_url or link in seen:
+            continue
+        seen.add(link)
+        links.append(link)
+    return links
+
+
+def build_link_graph(documents, aliases=None):
+    """
+    Build the document link graph in CSR form. Node i is the document with doc_id i
+    (the position in `documents`, same as build_inverted_index). Links pointing
+    outside the crawl are dropped. `documents` is iterated twice, so it may be any
+    re-iterable source of {"url", "links"} dicts rather than a list. `aliases` maps
+    doc ids to the URLs of duplicates collapsed into them (see dedup.py); links to
+    those URLs count for the canonical document.
+
+    Returns (indptr, indices): the outlinks of doc i are indices[indptr[i]:indptr[i + 1]].
+    """
+    url_to_id = {}
+    num_docs = 0
+    for doc_id, document in enumerate(documents):
+        url_to_id.setdefault(normalize_url(document["url"]) or document["url"], doc_id)
+        num_docs += 1
+    for doc_id, urls in (aliases or {}).items():
+        for url in urls:
+            url_to_id.setdefault(normalize_url(url) or url, doc_id)
+
+    indptr = np.zeros(num_docs + 1, dtype=np.int64)
+    indices = array("i")
+
+    for doc_id, document in enumerate(documents):
+        targets = {url_to_id[link] for link in document.get("links", ()) if link in url_to_id}
+        targets.discard(doc_id)
+        indices.extend(sorted(targets))
+        indptr[doc_id + 1] = len(indices)
+
+    return indptr, np.frombuffer(indices, dtype=np.int32).copy()
+
+
+def save_link_graph(indptr, indices, filename):
+    """Saves the CSR link graph next to the index."""
+    folder = os.path.dirname(filename)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    np.savez(filename, indptr=indptr, indices=indices)
+
+
+def load_link_graph(filename):
+    """Loads a CSR link graph written by save_link_graph."""
+    with np.load(filename) as data:
+        return data["indptr"], data["indices"]
@@ -0,0 +1,90 @@
+# Load test for server.py: keeps N keep-alive connections busy and reports QPS and latency.
+#
+#   python load_test.py [--url http://127.0.0.1:8080] [--connections 16] [--requests 2000] [--queries FILE]
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit, quote_plus
+
+DEFAULT_QUERIES = ["computer science faculty", "graduate admissions", "machine learning", "software engineering",
+                   "research", "informatics", "undergraduate courses", "artificial intelligence", "data science",
+                   "student affairs"]
+
+
+async def request(reader, writer, host, path):
+    """Send one GET on an open connection; returns (status, body)."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length)
+    return status, body
+
+
+async def connection_worker(url, paths, latencies, statuses):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        while paths:
+            path = paths.pop()
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, parts.netloc, path)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(url, queries, connections, total_requests, k=5, seed=0):
+    rng = random.Random(seed)
+    paths = [f"/search?q={quote_plus(rng.choice(queries))}&k={k}" for _ in range(total_requests)]
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(connection_worker(url, paths, latencies, statuses) for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, len(latencies) * q // 100)] * 1000 if latencies else 0.0
+
+    return {"requests": len(latencies), "seconds": elapsed, "qps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(50), "p99_ms": percentile(99), "statuses": statuses}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the search server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", help="File with one query per line (default: a built-in list)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+
+    report = asyncio.run(run_load(args.url, queries, args.connections, args.requests, args.k))
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print(f"{report['requests']} requests in {report['seconds']:.2f}s over {args.connections} connections")
+        print(f"QPS: {report['qps']:.1f}   p50: {report['p50_ms']:.2f} ms   p99: {report['p99_ms']:.2f} ms")
+        print(f"Status codes: {report['statuses']}")
+    return 0 if set(report["statuses"]) <= {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,66 +1,220 @@
-import sys
 import os
+import sys
 import time
 import json
-import tkinter as tk
-from tkinter import scrolledtext
-from search import load_inverted_index, search
-from read_json_files import read_json_files
-from build_index import build_inverted_index, save_index
-from scoring import compute_pagerank
+import argparse
+import contextlib
+
+# Command line entry point. Nothing prompts, so every subcommand runs as well from cron,
+# containers and pipelines as from a terminal.
+#
+#   python main.py index [--data DEV] [--index PATH] [--workers N] [--no-merge] [--json]
+#   python main.py query "machine learning" [-k 5] [--index PATH] [--json]
+#   python main.py complete "machine lea" [-n 10] [--index PATH] [--json]
+#   python main.py serve [--port 8080] [--workers N] ...     (options of server.py)
+#   python main.py stats [--index PATH] [--json]
+#   python main.py gui [--index PATH]
+#
+# `query` without a query reads one per line from stdin (prompting when that's a terminal).
+# `complete` lists the indexed terms the last word starts, most documents first; `comput*`
+# in a query matches all of them (see lexicon.py).
+# Modules are imported by the subcommands that need them: NumPy and the index for query
+# and stats, the parser and indexer for index, Tkinter for gui only. The stemmer loads on
+# the first query word (see tokenizer.load_porter_stemmer). --timings prints how long each
+# stage took to stderr; `python -X importtime main.py ...` breaks the imports down further.
+#
+# Exit codes: 0 success, 1 no results (query), 2 bad usage, 3 no index or no documents.
+
+STARTED = time.perf_counter()
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-INVERTED_INDEX_PATH = os.path.join(BASE_DIR, "index", "inverted_index.json")
-
-def run_indexing():
-    """Builds the inverted index only if it's missing."""
-    if os.path.exists(INVERTED_INDEX_PATH):
-        print("Inverted index found. Skipping indexing.")
-        return
-
-    choice = input("No index found. Do you want to build it now? (y/n): ").strip().lower()
-    if choice != 'y':
-        print("Cannot proceed without an index. Exiting.")
-        sys.exit(0)
+INDEX_DIR = os.path.join(BASE_DIR, "index")  # Incremental index: manifest plus base and delta segments
+INDEX_PATH = os.path.join(BASE_DIR, "index", "segment")  # Single segment from older versions
+LEGACY_INDEX_PATH = os.path.join(BASE_DIR, "index", "inverted_index.json")
+MEMORY_BUDGET_MB = int(os.environ.get("INDEX_MEMORY_BUDGET_MB", 256))  # Postings held in memory before a flush
+INDEX_WORKERS = int(os.environ.get("INDEX_WORKERS", os.cpu_count() or 1))  # Parse/tokenize processes
+INDEX_CHUNK_SIZE = int(os.environ.get("INDEX_CHUNK_SIZE", 32))  # Files per worker task
+INDEX_POSITIONS = os.environ.get("INDEX_POSITIONS", "1") != "0"  # Store token positions for "phrase" queries
+INDEX_DOCSTORE = os.environ.get("INDEX_DOCSTORE", "1") != "0"  # Keep page text for result snippets
+INDEX_DEDUP = os.environ.get("INDEX_DEDUP", "1") != "0"  # Collapse duplicate and near-duplicate pages
+INDEX_DOC_ORDER = os.environ.get("INDEX_DOC_ORDER", "")  # Renumber docs after a full build: url, pagerank or bisection
+INDEX_CHAMPIONS = os.environ.get("INDEX_CHAMPIONS", "1") != "0"  # Build tier 1 (champion lists) after indexing
+SHARDS_DIR = os.path.join(BASE_DIR, "index", "shards")
+SEARCH_SHARDS = int(os.environ.get("SEARCH_SHARDS", 1))  # >1 searches document shards in parallel processes
+
+EXIT_OK = 0
+EXIT_NO_RESULTS = 1
+EXIT_USAGE = 2  # Also what argparse exits with
+EXIT_NO_INDEX = 3
+
+
+class Timings:
+    """Wall time of each stage of a command, reported on stderr with --timings."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = time.perf_counter()
+        self.stages = [("startup", self.last - STARTED)]
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self):
+        if self.enabled:
+            stages = ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in self.stages)
+            print(f"Timings: {stages}, total {(time.perf_counter() - STARTED) * 1000:.1f} ms", file=sys.stderr)
+
+
+def index_location(path=INDEX_DIR):
+    """
+    The index at `path` (an incremental index directory or a segment), falling back to the
+    single-segment index of older versions for the default location. None if there is none.
+    """
+    from segment_set import is_index_dir
+
+    if is_index_dir(path) or os.path.exists(os.path.join(path, "header.json")):
+        return path
+    if path == INDEX_DIR and os.path.exists(os.path.join(INDEX_PATH, "header.json")):
+        return INDEX_PATH
+    return None
+
+def open_search_index(path, shards=SEARCH_SHARDS, shards_dir=SHARDS_DIR):
+    """
+    Open the index for searching; segments are memory-mapped, not read. With shards > 1 the
+    index is split into that many document shards (again only if it changed since the last
+    split) and searched in parallel.
+    """
+    from search import load_index
+
+    index = load_index(path)
+    if shards <= 1:
+        return index
+
+    from sharding import load_shard_info, open_sharded_index, split_index
+
+    info = load_shard_info(shards_dir)
+    if (info is None or info["num_shards"] != min(shards, len(index.doc_lengths))
+            or info["source"] != index.path or info["generation"] != getattr(index, "generation", 0)):
+        split_index(index, shards_dir, shards)
+    return open_sharded_index(shards_dir)
+
+def print_update_stats(stats):
+    print(f"\nFiles added: {stats['added']}, changed: {stats['changed']}, deleted: {stats['deleted']}, "
+          f"unchanged: {stats['unchanged']}")
+    print(f"Documents indexed: {stats['documents']} (generation {stats['generation']}, {stats['seconds']:.1f}s)")
+    print(f"Duplicates collapsed: {stats['duplicates']} ({stats['postings_saved']} postings saved)\n")
+
+def print_reorder_stats(stats):
+    postings_before, postings_after = stats["postings_bytes"]
+    positions_before, positions_after = stats["positions_bytes"]
+    print(f"Postings: {postings_before / 1e6:.2f} MB -> {postings_after / 1e6:.2f} MB, "
+          f"positions: {positions_before / 1e6:.2f} MB -> {positions_after / 1e6:.2f} MB ({stats['seconds']:.1f}s)\n")
+
+def build_tier(index_dir):
+    """Builds tier 1 of the segments that have none yet, e.g. a new delta (see champions.py), and reports its size."""
+    from segment_set import open_index
+    from champions import build_index_champions
+
+    info = build_index_champions(open_index(index_dir))
+    if info is not None:
+        print(f"Tier 1: {info['tier_postings']} of {info['postings']} postings "
+              f"({info['tier_postings'] / max(info['postings'], 1):.1%}), {info['bytes'] / 1e6:.2f} MB")
+    return info
+
+def run_indexing(args, timings):
+    """Builds the index if it's missing, otherwise re-indexes only the pages that changed."""
+    from segment_set import MANIFEST_NAME, is_index_dir
+    from incremental import update_index, run_merges, reorder_index
+    timings.mark("import")
+
+    index_dir = args.index
+    result = {"index": index_dir}
+    if is_index_dir(index_dir):
+        print("Index found. Checking the dataset for new, changed and deleted pages...")
+        stats = update_index(index_dir, args.data, workers=args.workers, chunk_size=args.chunk_size,
+                             memory_budget_mb=args.memory_budget_mb, dedup=args.dedup)
+        print_update_stats(stats)
+        timings.mark("index")
+        if args.champions:
+            result["champions"] = build_tier(index_dir)  # Only the new delta's tier is built
+            timings.mark("champions")
+        # Small delta segments are compacted before exiting (a merged segment gets its tier
+        # with the merge), unless a running server compacts them in the background instead
+        if args.merge:
+            result["merges"] = run_merges(index_dir)
+            timings.mark("merge")
+        return EXIT_OK, {**result, **stats}
+
+    if index_dir == INDEX_DIR and os.path.exists(INDEX_PATH):
+        print("Single-segment index found. Skipping indexing (delete it to switch to incremental updates).")
+        return EXIT_OK, {**result, "index": INDEX_PATH, "skipped": True}
+
+    if index_dir == INDEX_DIR and os.path.exists(LEGACY_INDEX_PATH):
+        from segment import convert_json_index
+
+        print("Found a JSON index from an older version. Converting it to the binary format...")
+        convert_json_index(LEGACY_INDEX_PATH, INDEX_PATH)
+        timings.mark("convert")
+        return EXIT_OK, {**result, "index": INDEX_PATH, "converted": LEGACY_INDEX_PATH}
 
     print("Starting search engine indexing...")
 
-    documents, total_files_read = read_json_files()
-    if len(documents) == 0:
-        print("Error: No documents were found. Check your dataset path!")
-        sys.exit(1)
-
-    print(f"Processed {len(documents)} documents.")
-
-    # Fix: Unpack 3 values instead of 2
-    inverted_index, document_lookup, document_contents = build_inverted_index(documents)
-
-    # Extract document graph for PageRank
-    document_graph = {doc["url"]: [] for doc in documents}
-    for doc in documents:
-        if "links" in doc:
-            document_graph[doc["url"]] = doc["links"]
-
-    # Compute PageRank
-    pagerank_scores = compute_pagerank(document_graph)
-    # Save everything, including document_contents
-    save_index(inverted_index, document_lookup, document_contents, pagerank_scores, total_files_read, INVERTED_INDEX_PATH)
+    # Pages are parsed and tokenized by a pool of worker processes and streamed, in order,
+    # into the SPIMI builder, which flushes sorted runs to disk whenever the memory budget
+    # is reached and merges them into the base segment. Later runs only index what changed.
+    stats = update_index(index_dir, args.data, workers=args.workers, chunk_size=args.chunk_size,
+                         memory_budget_mb=args.memory_budget_mb, positions=args.positions, dedup=args.dedup,
+                         docstore=args.docstore)
+    print_update_stats(stats)
+    timings.mark("index")
+    if stats["documents"] == 0:
+        print("Error: No documents were found. Check your dataset path!", file=sys.stderr)
+        manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):  # Nothing is committed when there was nothing to index
+            os.remove(manifest_path)
+        return EXIT_NO_INDEX, {**result, **stats}
+
+    if args.doc_order:
+        print(f"Reordering document IDs by {args.doc_order}...")
+        result["reorder"] = reorder_index(index_dir, args.doc_order)
+        print_reorder_stats(result["reorder"])
+        timings.mark("reorder")
+    if args.champions:
+        result["champions"] = build_tier(index_dir)
+        timings.mark("champions")
 
     print("Indexing complete. Inverted index saved.")
+    return EXIT_OK, {**result, **stats}
 
 
+def result_records(index, results):
+    """Search results as JSON-ready dicts (the shape server.py answers with)."""
+    return [{"doc_id": int(doc_id), "score": score, "url": url, "aliases": index.aliases(doc_id), "summary": summary}
+            for doc_id, score, url, summary in results]
 
+def print_results(index, top_results, k=5):
+    print(f"\nTop {k} Results:")
+    if not top_results:
+        print("No relevant results found.")
+    else:
+        for doc_id, score, url, summary in top_results:
+            print(f"\nDocID: {doc_id}, Score: {score:.4f}")
+            print(f"URL: {url}")
+            if index.aliases(doc_id):
+                print(f"Also at: {', '.join(index.aliases(doc_id))}")
+            print(f"Summary: {summary}")  #Display pre-generated summary
 
-def run_search():
-    """Loads the inverted index and runs the search process."""
-    inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs = load_inverted_index(INVERTED_INDEX_PATH)
-
-    if inverted_index is None:
-        print("Failed to load the index. Exiting.")
-        sys.exit(1)
+def run_search(index):
+    """Prompts for queries until 'exit' (or end of input) and prints the results."""
+    from search import search
 
     while True:
-        query = input("Enter your query (or type 'exit' to quit): ").strip()
+        try:
+            query = input("Enter your query (or type 'exit' to quit): ").strip()
+        except EOFError:
+            query = "exit"
         if query.lower() == 'exit':
             print("Exiting search.")
             break
@@ -69,81 +223,225 @@ def run_search():
             print("Error: Empty query provided.")
             continue
 
-        # Run search
-        top_results = search(query, inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs)
-
-        print("\nTop 5 Results:")
-        if not top_results:
-            print("No relevant results found.")
-        else:
-            for doc_id, score, url, summary in top_results:
-                print(f"\nDocID: {doc_id}, Score: {score:.4f}")
-                print(f"URL: {url}")
-                print(f"Summary: {summary}")  #Display pre-generated summary
-
-
-def run_gui_search():
-    """Launches a GUI-based search interface using Tkinter."""
-    inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs = load_inverted_index(
-        INVERTED_INDEX_PATH)
-
-    if inverted_index is None:
-        print("Failed to load the index. Exiting.")
-        sys.exit(1)
-
-    def perform_search():
-        """Runs when the user clicks the Search button. Fetches results and displays them with timing."""
-        query = query_entry.get().strip()
+        print_results(index, search(query, index))
+
+def run_query(args, timings):
+    """Answers the query given on the command line, or one query per line of stdin."""
+    location = index_location(args.index)
+    if location is None:
+        print(f"No index at {args.index}; build it with `python main.py index`.", file=sys.stderr)
+        return EXIT_NO_INDEX
+    from search import search
+    timings.mark("import")
+    index = open_search_index(location, args.shards)
+    timings.mark("open")
+
+    if not args.query and sys.stdin.isatty() and not args.json:
+        run_search(index)
+        return EXIT_OK
+
+    queries = [" ".join(args.query)] if args.query else (line.strip() for line in sys.stdin)
+    found = False
+    for query in queries:
         if not query:
-            result_text.delete(1.0, tk.END)
-            result_text.insert(tk.END, "Please enter a search query.")
-            return
-
-        # Measure search execution time
-        start_time = time.time()
-        results = search(query, inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs)
-        end_time = time.time()
-
-        execution_time = (end_time - start_time) * 1000  # Convert seconds to milliseconds
-
-        formatted_results = [
-            f"DocID: {doc_id}\nScore: {score:.4f}\nURL: {url}\nSummary: {summary}\n\n"
-            for doc_id, score, url, summary in results
-        ]
-
-        result_text.delete(1.0, tk.END)
-        result_text.insert(tk.END, f"Search completed in {execution_time:.2f} ms\n\n")
-        result_text.insert(tk.END, "\n".join(formatted_results) if formatted_results else "No relevant results found.")
-
-    root = tk.Tk()
-    root.title("Search Engine")
-    root.geometry("600x400")
-
-    tk.Label(root, text="Enter your query:", font=("Arial", 12)).pack(pady=5)
-    query_entry = tk.Entry(root, width=50, font=("Arial", 12))
-    query_entry.pack(pady=5)
-
-    search_button = tk.Button(root, text="Search", command=perform_search, font=("Arial", 12), bg="lightblue")
-    search_button.pack(pady=5)
-
-    result_text = scrolledtext.ScrolledText(root, width=70, height=15, font=("Arial", 10))
-    result_text.pack(pady=5)
+            continue
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+            results = search(query, index, k=args.k)  # Keeps search's messages out of the JSON
+        took_ms = (time.perf_counter() - start) * 1000
+        found = found or bool(results)
+        if args.json:
+            print(json.dumps({"query": query, "k": args.k, "took_ms": round(took_ms, 3),
+                              "results": result_records(index, results)}), flush=True)
+        else:
+            print_results(index, results, args.k)
+    timings.mark("search")
+    return EXIT_OK if found or not args.query else EXIT_NO_RESULTS
+
+
+def run_complete(args, timings):
+    """Prints the completions of the last word of the query (see search.complete)."""
+    location = index_location(args.index)
+    if location is None:
+        print(f"No index at {args.index}; build it with `python main.py index`.", file=sys.stderr)
+        return EXIT_NO_INDEX
+    from search import complete
+    timings.mark("import")
+    index = open_search_index(location, shards=1)  # Shards hold the same terms
+    timings.mark("open")
+    query = " ".join(args.query)
+    completions = complete(query, index, args.n)
+    timings.mark("complete")
+    if args.json:
+        print(json.dumps({"query": query, "completions": [{"term": term, "df": df} for term, df in completions]}))
+    else:
+        for term, df in completions:
+            print(f"{term}\t{df}")
+    return EXIT_OK if completions else EXIT_NO_RESULTS
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(path) for name in names)
+
+def index_stats(index):
+    """Sizes and settings of an open index (a segment set or a single segment)."""
+    from champions import tier_info
+
+    segments = getattr(index, "segments", [index])
+    deleted = getattr(index, "num_deleted", 0)
+    tier = tier_info(index)
+    return {
+        "path": index.path,
+        "generation": getattr(index, "generation", 0),
+        "documents": int(index.num_docs) - deleted,
+        "deleted_documents": deleted,
+        "positions": bool(index.has_positions),
+        "docstore": bool(index.has_docstore),
+        "doc_order": index.doc_order,
+        "bytes": directory_bytes(index.path),
+        "champions": None if tier is None else {
+            "postings": tier["tier_postings"], "of_postings": tier["postings"], "bytes": tier["bytes"],
+            "missing_segments": tier["missing"]},
+        "segments": [{"path": segment.path, "documents": segment.num_docs, "terms": segment.num_terms,
+                      "postings": segment.header.get("num_postings"), "bytes": directory_bytes(segment.path)}
+                     for segment in segments],
+    }
+
+def run_stats(args, timings):
+    """Prints the index's document, term and size counts without loading any postings."""
+    location = index_location(args.index)
+    if location is None:
+        print(f"No index at {args.index}; build it with `python main.py index`.", file=sys.stderr)
+        return EXIT_NO_INDEX
+    from segment import open_segment
+    from segment_set import is_index_dir, open_index
+    timings.mark("import")
+    stats = index_stats(open_index(location) if is_index_dir(location) else open_segment(location))
+    timings.mark("open")
+
+    if args.json:
+        print(json.dumps(stats))
+        return EXIT_OK
+    print(f"Index: {stats['path']} (generation {stats['generation']})")
+    print(f"Documents: {stats['documents']} ({stats['deleted_documents']} deleted, not yet merged away)")
+    print(f"Positions: {'yes' if stats['positions'] else 'no'}, docstore: {'yes' if stats['docstore'] else 'no'}, "
+          f"doc order: {stats['doc_order'] or 'crawl'}")
+    print(f"Size: {stats['bytes'] / 1e6:.2f} MB in {len(stats['segments'])} segment(s)")
+    if stats["champions"]:
+        tier = stats["champions"]
+        missing = tier["missing_segments"]
+        print(f"Tier 1: {tier['postings']} of {tier['of_postings']} postings "
+              f"({tier['postings'] / max(tier['of_postings'], 1):.1%}), {tier['bytes'] / 1e6:.2f} MB"
+              f"{f' ({missing} segment(s) without one: unused until the next `index` run)' if missing else ''}")
+    for segment in stats["segments"]:
+        print(f"  {os.path.basename(segment['path'])}: {segment['documents']} documents, {segment['terms']} terms, "
+              f"{segment['postings']} postings, {segment['bytes'] / 1e6:.2f} MB")
+    return EXIT_OK
+
+
+def run_gui_search(args, timings):
+    """Launches the Tkinter search window (see gui.py)."""
+    location = index_location(args.index)
+    if location is None:
+        print(f"No index at {args.index}; build it with `python main.py index`.", file=sys.stderr)
+        return EXIT_NO_INDEX
+    from gui import run_gui
+    timings.mark("import")
+    index = open_search_index(location, args.shards)
+    timings.mark("open")
+    timings.report()
+    run_gui(index)
+    return EXIT_OK
+
+
+def run_server(args, timings):
+    """Hands the remaining arguments to server.py."""
+    import server
+
+    server_args = server.parse_args(args.server_args)
+    timings.mark("import")
+    timings.report()
+    return EXIT_OK if server.serve(server_args) else EXIT_NO_INDEX
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search the crawled pages.")
+    parser.add_argument("--timings", action="store_true", help="Print the time of each stage to stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index = commands.add_parser("index", help="Build the index, or update it with the pages that changed")
+    index.add_argument("--data", help="Folder of crawled JSON pages (default: data/developer/DEV)")
+    index.add_argument("--index", default=INDEX_DIR, help="Index directory")
+    index.add_argument("--workers", type=int, default=INDEX_WORKERS, help="Parse/tokenize processes")
+    index.add_argument("--chunk-size", type=int, default=INDEX_CHUNK_SIZE, help="Files per worker task")
+    index.add_argument("--memory-budget-mb", type=int, default=MEMORY_BUDGET_MB,
+                       help="Postings held in memory before a flush")
+    index.add_argument("--positions", action=argparse.BooleanOptionalAction, default=INDEX_POSITIONS,
+                       help="Store token positions for \"phrase\" queries (new indexes only)")
+    index.add_argument("--docstore", action=argparse.BooleanOptionalAction, default=INDEX_DOCSTORE,
+                       help="Keep page text for result snippets (new indexes only)")
+    index.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=INDEX_DEDUP,
+                       help="Collapse duplicate and near-duplicate pages")
+    index.add_argument("--doc-order", default=INDEX_DOC_ORDER, choices=["", "url", "pagerank", "bisection"],
+                       help="Renumber documents after a full build")
+    index.add_argument("--champions", action=argparse.BooleanOptionalAction, default=INDEX_CHAMPIONS,
+                       help="Build tier 1 (champion lists) for fast first-pass retrieval")
+    index.add_argument("--merge", action=argparse.BooleanOptionalAction, default=True,
+                       help="Compact delta segments before exiting (--no-merge leaves it to `serve`)")
+    index.add_argument("--json", action="store_true", help="Print the stats as JSON (progress goes to stderr)")
+
+    query = commands.add_parser("query", help="Search the index")
+    query.add_argument("query", nargs="*", help="Query words (default: one query per line of stdin)")
+    query.add_argument("--index", default=INDEX_DIR, help="Index directory or segment")
+    query.add_argument("-k", type=int, default=5, help="Results per query")
+    query.add_argument("--shards", type=int, default=SEARCH_SHARDS, help="Search this many shards in parallel")
+    query.add_argument("--json", action="store_true", help="One JSON object per query")
+
+    complete = commands.add_parser("complete", help="Complete the last word of a query from the index's terms")
+    complete.add_argument("query", nargs="+", help="Query whose last word to complete")
+    complete.add_argument("--index", default=INDEX_DIR, help="Index directory or segment")
+    complete.add_argument("-n", type=int, default=10, help="Completions to show")
+    complete.add_argument("--json", action="store_true")
+
+    commands.add_parser("serve", add_help=False, help="Run the HTTP/JSON search service (options of server.py)")
+
+    stats = commands.add_parser("stats", help="Show document, term and size counts of the index")
+    stats.add_argument("--index", default=INDEX_DIR, help="Index directory or segment")
+    stats.add_argument("--json", action="store_true")
+
+    gui = commands.add_parser("gui", help="Search in a Tkinter window")
+    gui.add_argument("--index", default=INDEX_DIR, help="Index directory or segment")
+    gui.add_argument("--shards", type=int, default=SEARCH_SHARDS, help="Search this many shards in parallel")
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != "serve":
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.server_args = extra
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    timings = Timings(args.timings)
+    if args.command == "index":
+        if args.json:
+            with contextlib.redirect_stdout(sys.stderr):
+                status, stats = run_indexing(args, timings)
+            print(json.dumps(stats))
+        else:
+            status, _ = run_indexing(args, timings)
+    elif args.command == "query":
+        status = run_query(args, timings)
+    elif args.command == "complete":
+        status = run_complete(args, timings)
+    elif args.command == "stats":
+        status = run_stats(args, timings)
+    elif args.command == "gui":
+        return run_gui_search(args, timings)
+    else:
+        return run_server(args, timings)
+    timings.report()
+    return status
 
-    root.mainloop()
 
 if __name__ == "__main__":
-    run_indexing()
-
-    print("\nChoose your search method:")
-    print("1 - Command Line Search")
-    print("2 - GUI Search")
-
-    choice = input("Enter your choice (1/2): ").strip()
-
-    if choice == "1":
-        run_search()
-    elif choice == "2":
-        run_gui_search()
-    else:
-        print("Invalid choice. Running command-line search by default.")
-        run_search()
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# Lightweight, opt-in instrumentation of the indexing and query paths.
+#
+#   SEARCH_METRICS=1                  collect spans, counters and histograms
+#   SEARCH_METRICS_FILE=metrics.prom  also write them at exit (.prom: Prometheus text, else JSON)
+#   SEARCH_PROFILE_SLOWEST=10         cProfile every query and keep the 10 slowest profiles
+#
+# Spans time a stage with the monotonic perf_counter clock and feed a histogram named after
+# the stage; counters add up work done (postings scanned, candidates scored, cache hits).
+# When collection is off, span() hands back one shared no-op object and count() returns at
+# once, so instrumented code pays a function call and nothing more.
+import os
+import io
+import json
+import time
+import heapq
+import atexit
+import pstats
+import cProfile
+import threading
+import functools
+from itertools import count as sequence
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+PROMETHEUS_PREFIX = "searchengine"
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, Prometheus style."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        for position, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[position] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (0 when empty)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "p50": self.quantile(0.5), "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99), "buckets": {str(bound): bucket_count for bound, bucket_count
+                                                         in zip(self.buckets, self.counts)}}
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class SlowQueryProfiler:
+    """
+    Runs queries under cProfile and keeps the `slowest` profiles by wall time. cProfile
+    can't profile two threads at once, so a query that starts while another one is being
+    profiled runs unprofiled.
+    """
+
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self.entries = []  # Min-heap of (seconds, sequence, label, profile text)
+        self.sequence = sequence()
+        self.lock = threading.Lock()
+
+    def run(self, label, function, *args, **kwargs):
+        if not self.lock.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                if len(self.entries) < self.slowest or elapsed > self.entries[0][0]:
+                    text = io.StringIO()
+                    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(25)
+                    entry = (elapsed, next(self.sequence), label, text.getvalue())
+                    if len(self.entries) < self.slowest:
+                        heapq.heappush(self.entries, entry)
+                    else:
+                        heapq.heapreplace(self.entries, entry)
+        finally:
+            self.lock.release()
+
+    def report(self):
+        """Profiles of the slowest queries, slowest first."""
+        return [{"label": label, "seconds": seconds, "profile": text}
+                for seconds, _, label, text in sorted(self.entries, reverse=True)]
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []  # Callables returning {name: value} gauges at export time
+        self.profiler = None
+        self.lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+        if self.profiler is not None:
+            self.profiler = SlowQueryProfiler(self.profiler.slowest)
+
+    def gauges(self):
+        values = {}
+        for collector in self.collectors:
+            values.update(collector())
+        return values
+
+    def snapshot(self):
+        with self.lock:
+            result = {"counters": dict(self.counters),
+                      "spans": {name: histogram.to_dict() for name, histogram in self.histograms.items()}}
+        result["gauges"] = self.gauges()
+        if self.profiler is not None:
+            result["slowest_queries"] = self.profiler.report()
+        return result
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+            for name, value in counters:
+                metric = f"{PROMETHEUS_PREFIX}_{_metric_name(name)}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            if histograms:
+                metric = f"{PROMETHEUS_PREFIX}_span_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in histograms:
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{span="{name}"}} {histogram.count}')
+        for name, value in sorted(self.gauges().items()):
+            metric = f"{PROMETHEUS_PREFIX}_{_metric_name(name)}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write Prometheus text to a .prom file and JSON to anything else."""
+        with open(path, "w", encoding="utf-8") as file:
+            if path.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), file, indent=4)
+
+
+def _metric_name(name):
+    return "".join(character if character.isalnum() else "_" for character in name)
+
+
+registry = MetricsRegistry()
+
+
+def enable(profile_slowest=0):
+    """Start collecting; with profile_slowest > 0, also profile queries and keep the slowest ones."""
+    registry.enabled = True
+    if profile_slowest > 0:
+        registry.profiler = SlowQueryProfiler(profile_slowest)
+
+
+def disable():
+    registry.enabled = False
+    registry.profiler = None
+
+
+def enabled():
+    return registry.enabled
+
+
+def span(name):
+    """Context manager timing a stage into the histogram `name` (no-op when collection is off)."""
+    if not registry.enabled:
+        return NULL_SPAN
+    return _Span(registry, name)
+
+
+def timed(name):
+    """Decorator form of span(): time every call of the function into the histogram `name`."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+            with _Span(registry, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1):
+    if registry.enabled:
+        registry.count(name, value)
+
+
+def observe(name, seconds):
+    if registry.enabled:
+        registry.observe(name, seconds)
+
+
+def add_collector(collector):
+    """Register a callable returning {name: number} gauges, read whenever metrics are exported."""
+    registry.collectors.append(collector)
+
+
+def profile(label, function, *args, **kwargs):
+    """Call function(*args, **kwargs), under cProfile if slow-query profiling is on."""
+    if registry.profiler is None:
+        return function(*args, **kwargs)
+    return registry.profiler.run(label, function, *args, **kwargs)
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def to_prometheus():
+    return registry.to_prometheus()
+
+
+def write(path):
+    registry.write(path)
+
+
+def reset():
+    registry.reset()
+
+
+def _configure_from_environment():
+    output = os.environ.get("SEARCH_METRICS_FILE")
+    slowest = int(os.environ.get("SEARCH_PROFILE_SLOWEST", "0") or 0)
+    if os.environ.get("SEARCH_METRICS", "") not in ("", "0") or output or slowest:
+        enable(slowest)
+    if output:
+        atexit.register(write, output)
+
+
+_configure_from_environment()
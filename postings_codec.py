@@ -0,0 +1,348 @@
+import numpy as np
+
+# Posting lists are cut into blocks of BLOCK_SIZE postings. Each block stores its doc ids
+# as gaps from the previous doc id and its frequencies minus one, each bit-packed at the
+# smallest width that fits the block's largest value (the "binary packing" scheme that
+# PForDelta builds on):
+#
+#   [doc width: u8][freq width: u8][packed doc gaps][packed freqs]
+#
+# When a few large gaps would widen the whole block (typically the jumps between clusters
+# of a reordered index, see reorder.py), the gaps are packed narrower and those few are
+# patched as exceptions, PForDelta style. The doc width byte then has EXCEPTIONS_FLAG set:
+#
+#   [doc width | 0x80][freq width][exception count: u8][high bits width: u8]
+#   [packed low bits of the gaps][packed freqs][exception slots: u8 each][packed high bits]
+#
+# A skip entry per block records the block's last doc id and its byte offset, so a reader
+# can find the block holding any doc id with one binary search and decode just that block.
+
+#
+# Token positions are optional and live in a separate stream, so queries that don't need
+# them never read them. Each posting block has a matching positions block holding, for
+# each posting, its number of positions, then every position as the gap from the previous
+# position of the same posting (the first from -1) minus one:
+#
+#   [count width: u8][gap width: u8][packed counts][packed gaps]
+#
+# One byte offset per positions block is stored alongside the skip entries.
+
+BLOCK_SIZE = 128
+SKIP_DTYPE = np.dtype([("last_doc", "<u4"), ("offset", "<u8")])
+BLOCK_HEADER_SIZE = 2
+EXCEPTIONS_FLAG = 0x80
+EXCEPTION_OVERHEAD_BITS = 8  # Slot byte of each exception (plus a 16-bit header per patched block)
+
+
+def pack_bits(values, width=None):
+    """
+    Bit-pack non-negative integers (< 2**32) at the smallest common width, or at `width`
+    if given (values must fit it). Returns (width, bytes).
+    """
+    values = np.asarray(values, dtype=np.uint32)
+    if width is None:
+        width = int(values.max()).bit_length() if len(values) else 0
+    if width == 0:
+        return 0, b""
+    bits = (values[:, None] >> np.arange(width, dtype=np.uint32)) & 1
+    return width, np.packbits(bits.astype(np.uint8), axis=None, bitorder="little").tobytes()
+
+
+def packed_size(count, width):
+    """Bytes used by `count` values packed at `width` bits."""
+    return (count * width + 7) // 8
+
+
+def _bits_to_values(bits):
+    """Turn little-endian bit rows (last axis, at most 32 bits) back into uint32 values."""
+    padded = np.zeros(bits.shape[:-1] + (32,), dtype=np.uint8)
+    padded[..., :bits.shape[-1]] = bits
+    return np.packbits(padded, axis=-1, bitorder="little").view("<u4")[..., 0]
+
+
+def unpack_bits(buffer, offset, count, width):
+    """Inverse of pack_bits for `count` values starting at byte `offset` of `buffer`."""
+    if width == 0:
+        return np.zeros(count, dtype=np.uint32)
+    packed = np.frombuffer(buffer, dtype=np.uint8, count=packed_size(count, width), offset=offset)
+    bits = np.unpackbits(packed, count=count * width, bitorder="little").reshape(count, width)
+    return _bits_to_values(bits)
+
+
+def bit_lengths(values):
+    """int.bit_length() of every value of an integer array."""
+    return np.frexp(np.asarray(values, dtype=np.float64))[1]
+
+
+def patched_widths(gaps):
+    """
+    Bit width of each BLOCK_SIZE block of `gaps` that packs it smallest, counting the
+    exceptions (gaps that don't fit, which also store their high bits) it leaves.
+    """
+    lengths = bit_lengths(gaps)
+    num_blocks = (len(gaps) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    blocks = np.arange(len(gaps)) // BLOCK_SIZE
+    histogram = np.bincount(blocks * 33 + lengths, minlength=num_blocks * 33).reshape(num_blocks, 33)
+    sizes = histogram.sum(axis=1, keepdims=True)
+    max_widths = 32 - np.argmax(histogram[:, ::-1] > 0, axis=1)[:, None]
+    widths = np.arange(33)[None, :]
+    exceptions = sizes - np.cumsum(histogram, axis=1)
+    cost = (sizes * widths + exceptions * (EXCEPTION_OVERHEAD_BITS + max_widths - widths)
+            + 16 * (exceptions > 0))
+    return 32 - np.argmin(cost[:, ::-1], axis=1)  # Fewest exceptions among the cheapest
+
+
+def _encode_gaps(gaps, width):
+    """Doc width byte, exception header and payload of one block's doc gaps packed at `width`."""
+    slots = np.flatnonzero(gaps >> width)
+    if not len(slots):
+        width, packed = pack_bits(gaps, width)
+        return width, b"", packed, b""
+    high_width, high = pack_bits(gaps[slots] >> width)
+    _, low = pack_bits(gaps & ((1 << width) - 1), width)
+    return width | EXCEPTIONS_FLAG, bytes((len(slots), high_width)), low, slots.astype(np.uint8).tobytes() + high
+
+
+def _block_layout(buffer, offset, count):
+    """
+    Parse a block header: (doc width, freq width, doc gaps offset, exceptions offset,
+    exception count, high bits width). Without exceptions the last three are 0.
+    """
+    doc_byte, freq_width = int(buffer[offset]), int(buffer[offset + 1])
+    doc_width = doc_byte & ~EXCEPTIONS_FLAG
+    offset += BLOCK_HEADER_SIZE
+    if not doc_byte & EXCEPTIONS_FLAG:
+        return doc_width, freq_width, offset, 0, 0, 0
+    num_exceptions, high_width = int(buffer[offset]), int(buffer[offset + 1])
+    offset += 2
+    exceptions = offset + packed_size(count, doc_width) + packed_size(count, freq_width)
+    return doc_width, freq_width, offset, exceptions, num_exceptions, high_width
+
+
+def _patch(gaps, buffer, offset, num_exceptions, high_width, width):
+    """Add the high bits of the exceptions stored at `offset` back into the gaps (in place)."""
+    slots = np.frombuffer(buffer, dtype=np.uint8, count=num_exceptions, offset=offset).astype(np.int64)
+    high = unpack_bits(buffer, offset + num_exceptions, num_exceptions, high_width)
+    gaps[slots] |= high << np.uint32(width)
+
+
+def encode_postings(documents, frequencies):
+    """
+    Encode one posting list. Returns (payload, skips) where skips is a SKIP_DTYPE array
+    with offsets relative to the start of the payload.
+    """
+    documents = np.asarray(documents, dtype=np.int64)
+    frequencies = np.asarray(frequencies, dtype=np.int64)
+    num_blocks = (len(documents) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    skips = np.zeros(num_blocks, dtype=SKIP_DTYPE)
+
+    gaps = np.diff(documents, prepend=-1) - 1
+    widths = patched_widths(gaps)
+    chunks = []
+    offset = 0
+    for block in range(num_blocks):
+        docs = documents[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+        freqs = frequencies[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+
+        doc_byte, exception_header, doc_bytes, exception_bytes = _encode_gaps(
+            gaps[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE], int(widths[block]))
+        freq_width, freq_bytes = pack_bits(freqs - 1)
+        chunk = bytes((doc_byte, freq_width)) + exception_header + doc_bytes + freq_bytes + exception_bytes
+
+        skips[block] = (docs[-1], offset)
+        chunks.append(chunk)
+        offset += len(chunk)
+
+    return b"".join(chunks), skips
+
+
+def decode_block(buffer, offset, count, previous_doc):
+    """Decode one block of `count` postings; `previous_doc` is the last doc id of the block before (-1 for none)."""
+    doc_width, freq_width, offset, exceptions, num_exceptions, high_width = _block_layout(buffer, offset, count)
+    gaps = unpack_bits(buffer, offset, count, doc_width)
+    freqs = unpack_bits(buffer, offset + packed_size(count, doc_width), count, freq_width)
+    if num_exceptions:
+        _patch(gaps, buffer, exceptions, num_exceptions, high_width, doc_width)
+    documents = np.cumsum(gaps.astype(np.int64) + 1) + previous_doc
+    return documents, freqs.astype(np.int64) + 1
+
+
+def _unpack_full_blocks(data, starts, widths):
+    """Unpack BLOCK_SIZE values from each of several blocks at once, grouping blocks by bit width."""
+    values = np.zeros((len(starts), BLOCK_SIZE), dtype=np.uint32)
+    for width in np.unique(widths):
+        if width == 0:
+            continue
+        selected = widths == width
+        num_bytes = packed_size(BLOCK_SIZE, int(width))
+        packed = data[starts[selected, None] + np.arange(num_bytes)]
+        bits = np.unpackbits(packed, axis=1, bitorder="little").reshape(-1, BLOCK_SIZE, int(width))
+        values[selected] = _bits_to_values(bits)
+    return values.ravel()
+
+
+def _unpack_varying(data, starts, index, widths):
+    """The index-th value of bit-packed arrays at byte `starts`, each packed at its own width (<= 32)."""
+    bits = index * widths
+    first_bytes = starts + bits // 8
+    nearby = np.minimum(first_bytes[:, None] + np.arange(5), len(data) - 1)  # 32 bits plus the 7-bit shift
+    words = (data[nearby].astype(np.uint64) << (8 * np.arange(5, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+    return (words >> (bits % 8).astype(np.uint64)) & ((np.uint64(1) << widths.astype(np.uint64)) - np.uint64(1))
+
+
+def _patch_full_blocks(gaps, data, starts, blocks, doc_widths, freq_widths):
+    """Patch the exceptions of the given full blocks into their unpacked gaps, all blocks at once."""
+    block_starts = starts[blocks]
+    counts = data[block_starts + BLOCK_HEADER_SIZE].astype(np.int64)
+    high_widths = data[block_starts + BLOCK_HEADER_SIZE + 1].astype(np.int64)
+    widths = doc_widths[blocks].astype(np.int64)
+    exception_starts = (block_starts + BLOCK_HEADER_SIZE + 2 + (widths * BLOCK_SIZE + 7) // 8
+                        + (freq_widths[blocks].astype(np.int64) * BLOCK_SIZE + 7) // 8)
+
+    owner = np.repeat(np.arange(len(blocks)), counts)
+    index = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    slots = data[exception_starts[owner] + index].astype(np.int64)
+    high = _unpack_varying(data, exception_starts[owner] + counts[owner], index, high_widths[owner])
+    gaps[blocks[owner] * BLOCK_SIZE + slots] |= (high << widths[owner].astype(np.uint64)).astype(np.uint32)
+
+
+def decode_postings(buffer, skips, df):
+    """Decode a whole posting list, unpacking all full blocks of the same width in one vectorized step."""
+    num_full = df // BLOCK_SIZE
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    starts = skips["offset"][:num_full].astype(np.int64)
+    patched = (data[starts] & EXCEPTIONS_FLAG) != 0
+    doc_widths = data[starts] & ~np.uint8(EXCEPTIONS_FLAG)
+    freq_widths = data[starts + 1]
+    gap_starts = starts + BLOCK_HEADER_SIZE + 2 * patched
+
+    gaps = [_unpack_full_blocks(data, gap_starts, doc_widths)]
+    freqs = [_unpack_full_blocks(data, gap_starts + (doc_widths.astype(np.int64) * BLOCK_SIZE + 7) // 8, freq_widths)]
+    if patched.any():
+        _patch_full_blocks(gaps[0], data, starts, np.flatnonzero(patched), doc_widths, freq_widths)
+    if num_full < len(skips):
+        offset = int(skips[num_full]["offset"])
+        count = df - num_full * BLOCK_SIZE
+        doc_width, freq_width, offset, exceptions, num_exceptions, high_width = _block_layout(buffer, offset, count)
+        gaps.append(unpack_bits(buffer, offset, count, doc_width))
+        freqs.append(unpack_bits(buffer, offset + packed_size(count, doc_width), count, freq_width))
+        if num_exceptions:
+            _patch(gaps[-1], buffer, exceptions, num_exceptions, high_width, doc_width)
+
+    # Block bases chain through the previous block's last doc, so one running sum decodes every gap
+    documents = np.cumsum(np.concatenate(gaps).astype(np.int64) + 1) - 1
+    return documents, np.concatenate(freqs).astype(np.int64) + 1
+
+
+def encode_positions(counts, positions):
+    """
+    Encode one term's positions: `counts` has one entry per posting and `positions` is
+    every posting's ascending positions concatenated. Returns (payload, offsets) with one
+    offset per posting block, relative to the start of the payload.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    gaps = np.diff(positions, prepend=-1) - 1
+    firsts = starts[counts > 0]
+    gaps[firsts] = positions[firsts]  # Every posting starts again from -1
+
+    num_blocks = (len(counts) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    offsets = np.zeros(num_blocks, dtype="<u8")
+    chunks = []
+    offset = 0
+    for block in range(num_blocks):
+        first, last = block * BLOCK_SIZE, min(len(counts), (block + 1) * BLOCK_SIZE) - 1
+        count_width, count_bytes = pack_bits(counts[first:last + 1])
+        gap_width, gap_bytes = pack_bits(gaps[starts[first]:ends[last]])
+        chunk = bytes((count_width, gap_width)) + count_bytes + gap_bytes
+        offsets[block] = offset
+        chunks.append(chunk)
+        offset += len(chunk)
+    return b"".join(chunks), offsets
+
+
+def decode_positions_block(buffer, offset, count):
+    """Decode the positions block of `count` postings. Returns (counts, concatenated positions)."""
+    count_width, gap_width = int(buffer[offset]), int(buffer[offset + 1])
+    offset += BLOCK_HEADER_SIZE
+    counts = unpack_bits(buffer, offset, count, count_width).astype(np.int64)
+    gaps = unpack_bits(buffer, offset + packed_size(count, count_width), int(counts.sum()), gap_width)
+    running = np.cumsum(gaps.astype(np.int64) + 1)
+    # Restart the running sum at each posting's first position
+    before = np.concatenate([[0], running])[np.cumsum(counts) - counts]
+    return counts, running - np.repeat(before, counts) - 1
+
+
+def split_positions(counts, positions):
+    """One array of positions per posting."""
+    return np.split(positions, np.cumsum(counts)[:-1]) if len(counts) else []
+
+
+class BlockPostings:
+    """
+    One term's compressed posting list. Blocks are decoded on demand for skipping
+    (`block_last_docs`, `block(i)`), and the whole list can still be read like the
+    in-memory index's postings dict: postings["documents"], postings["frequency"],
+    postings["idf"] and postings["max_score"]. If the segment stores positions,
+    `positions` is (positions buffer, one offset per block) and position_block(i) reads them.
+    """
+
+    def __init__(self, buffer, skips, df, idf, max_score, positions=None):
+        self.buffer = buffer
+        self.skips = skips
+        self.df = df
+        self.idf = idf
+        self.max_score = max_score
+        self.block_last_docs = skips["last_doc"]
+        self.num_blocks = len(skips)
+        self.positions = positions
+        self.has_positions = positions is not None
+        self._decoded = None
+
+    def __len__(self):
+        return self.df
+
+    def block_size(self, block):
+        return min(BLOCK_SIZE, self.df - block * BLOCK_SIZE)
+
+    def block(self, block):
+        """(documents, frequencies) of one block."""
+        previous_doc = int(self.block_last_docs[block - 1]) if block else -1
+        return decode_block(self.buffer, int(self.skips[block]["offset"]), self.block_size(block), previous_doc)
+
+    def decode(self):
+        """(documents, frequencies) of the whole list."""
+        if self._decoded is None:
+            self._decoded = decode_postings(self.buffer, self.skips, self.df)
+        return self._decoded
+
+    def position_block(self, block):
+        """(counts, concatenated positions) of one block's postings."""
+        buffer, offsets = self.positions
+        return decode_positions_block(buffer, int(offsets[block]), self.block_size(block))
+
+    def decode_positions(self):
+        """(counts, concatenated positions) of the whole list."""
+        blocks = [self.position_block(block) for block in range(self.num_blocks)]
+        if not blocks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate([counts for counts, _ in blocks]), np.concatenate([positions for _, positions in blocks])
+
+    def __getitem__(self, key):
+        if key == "documents":
+            return self.decode()[0]
+        if key == "frequency":
+            return self.decode()[1]
+        if key == "idf":
+            return self.idf
+        if key == "max_score":
+            return self.max_score
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
@@ -0,0 +1,214 @@
+from collections import OrderedDict
+import numpy as np
+from postings_codec import BLOCK_SIZE
+
+# Two caches sit in front of the index (see search.search):
+#
+#   results   final top-k results, keyed by the query's sorted distinct tokens and k, so
+#             "Machine Learning" and "machine learning" share one entry
+#   postings  fully decoded posting lists of hot terms, and conjunctive intersections,
+#             bounded by bytes; a term is only admitted on its second miss so one-off
+#             terms never push out the hot ones (the "doorkeeper" of TinyLFU)
+#
+# Both are tagged with the index path, generation and build id they were filled from and
+# are cleared as soon as a search runs against a different one, including an index rebuilt
+# from scratch at the same path.
+
+DEFAULT_RESULT_ENTRIES = 10_000
+DEFAULT_POSTINGS_BYTES = 64 * 1024 * 1024
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and/or total size in bytes. With
+    `admit_after` > 1 a key is only stored once it has missed that many times; keys seen
+    fewer times are remembered in a doorkeeper set that is reset when it grows too big.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, admit_after=1):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.admit_after = admit_after
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.bytes = 0
+        self.doorkeeper = {}
+        self.doorkeeper_limit = 4 * (max_entries or 10_000)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def admits(self, key):
+        """Record a miss for `key` and tell whether it is now hot enough to be stored."""
+        if self.admit_after <= 1:
+            return True
+        seen = self.doorkeeper.get(key, 0) + 1
+        if seen >= self.admit_after:
+            self.doorkeeper.pop(key, None)
+            return True
+        if len(self.doorkeeper) >= self.doorkeeper_limit:
+            self.doorkeeper.clear()
+        self.doorkeeper[key] = seen
+        self.rejected += 1
+        return False
+
+    def put(self, key, value, size=1):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while ((self.max_entries is not None and len(self.entries) > self.max_entries)
+               or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.doorkeeper.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0, "evictions": self.evictions,
+                "rejected": self.rejected}
+
+
+class DecodedPostings:
+    """
+    A posting list held decoded in memory. Blocks are BLOCK_SIZE slices of the arrays, so
+    cursors still skip with block_last_docs exactly as over compressed postings. Positions
+    are not cached; they are read from `source` (the original postings) when a phrase or
+    proximity check needs them.
+    """
+
+    def __init__(self, documents, frequencies, idf, max_score, source=None):
+        self.documents = np.asarray(documents)
+        self.frequencies = np.asarray(frequencies)
+        self.idf = idf
+        self.max_score = max_score
+        self.df = len(self.documents)
+        last = np.arange(BLOCK_SIZE - 1, self.df + BLOCK_SIZE - 1, BLOCK_SIZE)
+        self.block_last_docs = self.documents[np.minimum(last, self.df - 1)] if self.df else self.documents[:0]
+        self.num_blocks = len(self.block_last_docs)
+        self.nbytes = self.documents.nbytes + self.frequencies.nbytes
+        self.has_positions = bool(getattr(source, "has_positions", False))
+        self.source = source if self.has_positions else None
+        self._position_starts = None
+
+    def __len__(self):
+        return self.df
+
+    def block(self, block):
+        start = block * BLOCK_SIZE
+        return self.documents[start:start + BLOCK_SIZE], self.frequencies[start:start + BLOCK_SIZE]
+
+    def position_block(self, block):
+        if self._position_starts is None:
+            self._position_counts, self._positions = self.source.decode_positions()
+            self._position_starts = np.concatenate([[0], np.cumsum(self._position_counts)])
+        first = block * BLOCK_SIZE
+        last = min(self.df, first + BLOCK_SIZE)
+        positions = self._positions[self._position_starts[first]:self._position_starts[last]]
+        return self._position_counts[first:last], positions
+
+    def __getitem__(self, key):
+        if key == "documents":
+            return self.documents
+        if key == "frequency":
+            return self.frequencies
+        if key == "idf":
+            return self.idf
+        if key == "max_score":
+            return self.max_score
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class CachedPostings:
+    """
+    Index view whose get(term) serves hot terms' postings from the postings cache, decoding
+    a list fully once it is admitted. Anything else falls through to the index.
+    """
+
+    def __init__(self, index, cache):
+        self.index = index
+        self.cache = cache
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def prefix_terms(self, prefix, limit=None):
+        return self.index.prefix_terms(prefix, limit)
+
+    def get(self, term, default=None):
+        postings = self.cache.get(("postings", term))
+        if postings is not None:
+            return postings
+        postings = self.index.get(term)
+        if postings is None:
+            return default
+        if self.cache.admits(("postings", term)):
+            postings = DecodedPostings(postings["documents"], postings["frequency"],
+                                       postings["idf"], postings["max_score"], source=postings)
+            self.cache.put(("postings", term), postings, postings.nbytes)
+        return postings
+
+
+def query_key(query_tokens, k, phrases=()):
+    """Normalized result cache key: distinct tokens in sorted order, plus k and any phrases."""
+    if phrases:
+        return tuple(sorted(set(query_tokens))), k, tuple(sorted(phrases))
+    return tuple(sorted(set(query_tokens))), k
+
+
+class SearchCache:
+    """The result and postings caches for one index generation, with their counters."""
+
+    def __init__(self, max_results=DEFAULT_RESULT_ENTRIES, max_postings_bytes=DEFAULT_POSTINGS_BYTES,
+                 admit_after=2):
+        self.results = LRUCache(max_entries=max_results)
+        self.postings = LRUCache(max_bytes=max_postings_bytes, admit_after=admit_after)
+        self.source = None
+        self.invalidations = 0
+
+    def check_generation(self, index):
+        """Clear both caches if `index` isn't the index build and generation they were filled from."""
+        path = getattr(index, "path", None)
+        if path:
+            source = (path, getattr(index, "generation", 0), getattr(index, "build_id", None))
+        else:
+            source = ("object", id(index))
+        if source != self.source:
+            if self.source is not None:
+                self.invalidations += 1
+            self.results.clear()
+            self.postings.clear()
+            self.source = source
+
+    def view(self, index):
+        return CachedPostings(index, self.postings)
+
+    def stats(self):
+        return {"results": self.results.stats(), "postings": self.postings.stats(),
+                "invalidations": self.invalidations}
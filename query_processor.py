@@ -1,4 +1,28 @@
-from tokenizer import tokenize
+import re
+import math
+import heapq
+from bisect import bisect_left
+import numpy as np
+import metrics
+from tokenizer import tokenize, default_tokenizer
+from scoring import pagerank_prior_weight
+from query_cache import DecodedPostings
+
+END_OF_POSTINGS = float("inf")
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+WILDCARD_PATTERN = re.compile(r"(?<![A-Za-z0-9])([A-Za-z0-9]+)\*")
+
+# A `prefix*` query term matches documents with any of the MAX_PREFIX_EXPANSIONS terms
+# starting with the prefix that occur in the most documents, scored as a single term
+# (term frequencies summed, IDF from the number of documents with any of them). The
+# prefix is matched against stems as typed, so "comput*" finds "comput" and "computation".
+MAX_PREFIX_EXPANSIONS = 64
+
+# Proximity boost for conjunctive queries over a positional index: a document whose query
+# terms all fall within PROXIMITY_WINDOW tokens gets up to PROXIMITY_WEIGHT times the
+# query's TF-IDF bound extra, scaled by how tight the window is (terms side by side get it all).
+PROXIMITY_WINDOW = 10
+PROXIMITY_WEIGHT = 0.25
 
 
 def preprocess_query(query):
@@ -9,31 +33,438 @@ def preprocess_query(query):
     return tokenize(query)
 
 
-def boolean_and_query(query_tokens, inverted_index, max_results=100):
+def parse_query(query):
+    """
+    Split a query into its distinct tokens and its quoted phrases, e.g.
+    'faculty "machine learning" comput*' -> (["faculti", "machin", "learn", "comput*"],
+    [("machin", "learn")]). Phrase tokens are also query tokens; a quoted single word is
+    just a term. Prefix terms keep their "*" and are not stemmed (see MAX_PREFIX_EXPANSIONS).
+    """
+    wildcards = [prefix.lower() + "*" for prefix in WILDCARD_PATTERN.findall(query)]
+    if wildcards:
+        query = WILDCARD_PATTERN.sub(" ", query)
+    phrases = []
+    for text in PHRASE_PATTERN.findall(query):
+        phrase = tuple(default_tokenizer.tokens(text))
+        if len(phrase) > 1 and phrase not in phrases:
+            phrases.append(phrase)
+    return list(dict.fromkeys(tokenize(query) + wildcards)), phrases
+
+
+def is_wildcard(term):
+    return term.endswith("*")
+
+
+def prefix_expansions(inverted_index, prefix, limit=MAX_PREFIX_EXPANSIONS):
+    """The `limit` terms starting with `prefix` that occur in the most documents."""
+    if hasattr(inverted_index, "prefix_terms"):
+        return [term for term, _ in inverted_index.prefix_terms(prefix, limit)]
+    matches = [(term, len(postings["documents"])) for term, postings in inverted_index.items()
+               if term.startswith(prefix)]  # In-memory dict index
+    return [term for term, _ in sorted(matches, key=lambda entry: (-entry[1], entry[0]))[:limit]]
+
+
+def union_postings(inverted_index, terms, doc_lengths, idf=None, max_score=None):
     """
-    Retrieve a set of document IDs that contain all query terms (Boolean AND).
-    Limit the number of results to speed up processing.
+    The postings of several terms read as one: every document with any of them, with the
+    frequencies summed. IDF and the max-score bound are computed as SegmentWriter would
+    from the union, unless given (corpus-wide values for a shard). None if no term occurs.
+    """
+    postings = [entry for entry in (inverted_index.get(term) for term in terms) if entry is not None]
+    if not postings:
+        return None
+    documents = np.concatenate([np.asarray(entry["documents"], dtype=np.int64) for entry in postings])
+    frequencies = np.concatenate([np.asarray(entry["frequency"], dtype=np.int64) for entry in postings])
+    documents, inverse = np.unique(documents, return_inverse=True)
+    frequencies = np.bincount(inverse, weights=frequencies).astype(np.int64)
+    if idf is None:
+        idf = math.log((len(doc_lengths) + 1) / (len(documents) + 1)) + 1
+    if max_score is None:
+        max_score = float((frequencies / (np.asarray(doc_lengths)[documents] + 1) * idf).max(initial=0.0))
+    return DecodedPostings(documents, frequencies, idf, max_score)
+
+
+def term_postings(inverted_index, term, doc_lengths, wildcards=None):
+    """Postings of a query term: a stored term's own, or the union of a `prefix*` term's expansions."""
+    if not is_wildcard(term):
+        return inverted_index.get(term)
+    if wildcards and term in wildcards:
+        expansions, idf, max_score = wildcards[term]
+        return union_postings(inverted_index, expansions, doc_lengths, idf, max_score)
+    return union_postings(inverted_index, prefix_expansions(inverted_index, term[:-1]), doc_lengths)
+
+
+def boolean_and_query(query_tokens, inverted_index, cache=None):
+    """
+    Retrieve the sorted IDs of all documents that contain every query term (Boolean AND),
+    intersecting the posting arrays from the shortest up instead of building sets.
+    If a cache (query_cache.LRUCache) is given, intersections of hot term sets are kept in it.
     """
     if not query_tokens:
-        return set()
+        return []
 
-    doc_sets = []
-    for term in query_tokens:
-        if term in inverted_index:
-            doc_sets.append(set(inverted_index[term]["documents"]))
-        else:
-            return set()  # If one term is missing, return empty result
+    if cache is not None:
+        key = ("and",) + tuple(sorted(set(query_tokens)))
+        result_docs = cache.get(key)
+        if result_docs is None:
+            result_docs = boolean_and_query(query_tokens, inverted_index)
+            if cache.admits(key):
+                cache.put(key, result_docs, 8 * len(result_docs) + 64)
+        return result_docs
+
+    with metrics.span("query.boolean"):
+        return _intersect(query_tokens, inverted_index)
+
+
+def document_frequency(postings):
+    """
+    Documents in one term's posting list: `df` of compressed and merged postings, the length
+    of "documents" for a plain postings dict (whose own len() counts its keys).
+    """
+    df = getattr(postings, "df", None)
+    return len(postings["documents"]) if df is None else df
 
-    # Sort by the smallest set first (faster intersection)
-    doc_sets.sort(key=len)
 
-    result_docs = doc_sets[0]
+def _intersect(query_tokens, inverted_index):
+    posting_lists = []
+    for term in dict.fromkeys(query_tokens):
+        postings = inverted_index.get(term)
+        if postings is None:
+            return []  # If one term is missing, return empty result
+        posting_lists.append(postings)
 
-    for doc_set in doc_sets[1:]:
-        result_docs.intersection_update(doc_set)
+    # Sort by the shortest list first (faster intersection)
+    posting_lists.sort(key=document_frequency)
 
-        # Stop early if max results reached
-        if not result_docs or len(result_docs) >= max_results:
+    result_docs = np.asarray(posting_lists[0]["documents"])
+    for postings in posting_lists[1:]:
+        result_docs = np.intersect1d(result_docs, _documents_near(postings, result_docs), assume_unique=True)
+        if len(result_docs) == 0:
             break
 
-    return list(result_docs)[:max_results]  # Return only the top results
+    return result_docs.tolist()
+
+
+def _documents_near(postings, candidates):
+    """
+    Doc ids of `postings` that could match `candidates`. Compressed postings use their skip
+    entries to decode only the blocks whose doc id range covers a candidate.
+    """
+    if not hasattr(postings, "block_last_docs"):
+        return np.asarray(postings["documents"])
+
+    blocks = np.unique(np.searchsorted(postings.block_last_docs, candidates))
+    blocks = blocks[blocks < postings.num_blocks]
+    if len(blocks) * 2 > postings.num_blocks:
+        return postings["documents"]  # Most blocks are needed anyway; decode in one pass
+    if len(blocks) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate([postings.block(int(block))[0] for block in blocks])
+
+
+class PostingCursor:
+    """
+    Forward-only cursor over one term's posting list, scoring postings on demand.
+    Compressed postings are decoded one block at a time, and next_geq() uses the
+    block skip entries to jump over blocks without decoding them. Positions, if the
+    postings have them, are only decoded when positions() is called.
+    """
+
+    def __init__(self, postings, doc_lengths):
+        self.idf = postings["idf"]
+        self.max_score = postings["max_score"]
+        self.doc_lengths = doc_lengths
+
+        if hasattr(postings, "block_last_docs"):
+            self.block_last_docs = np.asarray(postings.block_last_docs)
+            self.read_block = postings.block
+            self.has_positions = getattr(postings, "has_positions", False)
+            self.read_positions = postings.position_block if self.has_positions else None
+        else:
+            documents = np.asarray(postings["documents"])
+            frequency = np.asarray(postings["frequency"])
+            self.block_last_docs = documents[-1:]
+            self.read_block = lambda block: (documents, frequency)
+            positions = postings.get("positions")
+            self.has_positions = positions is not None
+            self.read_positions = lambda block: ([len(entry) for entry in positions],
+                                                 [position for entry in positions for position in entry])
+        self.positions_block = None
+        self.df = document_frequency(postings)
+        self.scanned = 0  # Postings decoded so far, for metrics
+        self.num_blocks = len(self.block_last_docs)
+        self._load_block(0)
+
+    def __len__(self):
+        return self.df
+
+    def _load_block(self, block):
+        # Blocks of multi-segment postings can come back empty once deleted documents
+        # are filtered out; move on to the next non-empty one
+        self.position = 0
+        self.documents = []
+        self.frequency = []
+        while block < self.num_blocks:
+            documents, frequency = self.read_block(block)
+            self.scanned += len(documents)
+            if len(documents):
+                self.documents = documents.tolist()
+                self.frequency = frequency.tolist()
+                break
+            block += 1
+        self.block_index = block
+
+    def doc(self):
+        """Current doc id, or END_OF_POSTINGS once the list is exhausted."""
+        if self.position < len(self.documents):
+            return self.documents[self.position]
+        return END_OF_POSTINGS
+
+    def positions(self):
+        """Token positions (a list) of the current posting, decoding its block's positions on first use."""
+        if self.positions_block != self.block_index:
+            counts, positions = self.read_positions(self.block_index)
+            self.position_starts = [0]
+            for count in np.asarray(counts).tolist():
+                self.position_starts.append(self.position_starts[-1] + count)
+            self.block_positions = np.asarray(positions).tolist()
+            self.positions_block = self.block_index
+        return self.block_positions[self.position_starts[self.position]:self.position_starts[self.position + 1]]
+
+    def score(self):
+        """TF-IDF contribution of the current posting (same formula as scoring.compute_tf_idf_scores)."""
+        doc_id = self.documents[self.position]
+        return self.frequency[self.position] / (self.doc_lengths[doc_id] + 1) * self.idf
+
+    def next(self):
+        self.position += 1
+        if self.position >= len(self.documents) and self.block_index < self.num_blocks:
+            self._load_block(self.block_index + 1)
+        return self.doc()
+
+    def next_geq(self, target):
+        """Skip forward to the first posting with doc id >= target."""
+        if self.block_index >= self.num_blocks:
+            return END_OF_POSTINGS
+        if target > self.block_last_docs[self.block_index]:
+            if target == END_OF_POSTINGS:
+                self._load_block(self.num_blocks)
+                return END_OF_POSTINGS
+            self._load_block(int(np.searchsorted(self.block_last_docs, target)))
+        self.position = bisect_left(self.documents, target, self.position)
+        if self.position >= len(self.documents) and self.block_index < self.num_blocks:
+            self._load_block(self.block_index + 1)  # Block bound was loose (filtered postings)
+        return self.doc()
+
+
+class TopKHeap:
+    """Fixed-size min-heap of (score, doc_id); ties are broken in favor of the lower doc id."""
+
+    def __init__(self, k):
+        self.k = k
+        self.entries = []
+        self.pushed = 0  # Candidates scored, for metrics
+
+    def threshold(self):
+        """Score a document must beat to enter the heap (0 until the heap is full)."""
+        return self.entries[0][0] if len(self.entries) >= self.k else 0.0
+
+    def push(self, doc_id, score):
+        self.pushed += 1
+        entry = (score, -doc_id)
+        if len(self.entries) < self.k:
+            heapq.heappush(self.entries, entry)
+        elif entry > self.entries[0]:
+            heapq.heapreplace(self.entries, entry)
+
+    def results(self):
+        """(doc_id, score) pairs, best first."""
+        return [(-neg_doc, score) for score, neg_doc in sorted(self.entries, reverse=True)]
+
+
+def phrase_match(position_lists):
+    """Whether the i-th position list contains p + i for some p of the first one, for every i."""
+    starts = set(position_lists[0])
+    for offset, positions in enumerate(position_lists[1:], 1):
+        starts.intersection_update([position - offset for position in positions])
+        if not starts:
+            return False
+    return bool(starts)
+
+
+def minimum_window(position_lists):
+    """
+    Length in tokens of the shortest span holding a position from every list, or None if
+    a list is empty. Walks the lists in position order, always advancing the smallest.
+    """
+    if any(len(positions) == 0 for positions in position_lists):
+        return None
+    heap = [(positions[0], term, 0) for term, positions in enumerate(position_lists)]
+    heapq.heapify(heap)
+    highest = max(position for position, _, _ in heap)
+    best = highest - heap[0][0] + 1
+    while True:
+        lowest, term, index = heapq.heappop(heap)
+        best = min(best, highest - lowest + 1)
+        if index + 1 == len(position_lists[term]):
+            return best
+        position = position_lists[term][index + 1]
+        highest = max(highest, position)
+        heapq.heappush(heap, (position, term, index + 1))
+
+
+def proximity_score(position_lists, window=PROXIMITY_WINDOW):
+    """1 when the terms are adjacent, falling to 0 once they don't fit in `window` tokens."""
+    span = minimum_window(position_lists)
+    if span is None or span > window:
+        return 0.0
+    return len(position_lists) / span
+
+
+def _conjunctive_top_k(cursors, prior, heap, phrases=(), proximity_weight=0.0, remaining_prior=None):
+    """
+    Leapfrog intersection; documents whose upper bound can't beat the heap are never scored.
+    Phrases (tuples of cursors) and the proximity boost read positions only for documents
+    that are in the intersection and could still make it into the heap. With
+    `remaining_prior` (the largest prior of any document from a doc id on), the walk stops
+    as soon as no later document can enter the heap. Returns whether it stopped early.
+    """
+    by_length = sorted(cursors, key=len)
+    lead = by_length[0]
+    score_bound = sum(cursor.max_score for cursor in cursors) + proximity_weight
+
+    doc_id = lead.doc()
+    while doc_id != END_OF_POSTINGS:
+        threshold = heap.threshold()
+        if score_bound + prior(doc_id) < threshold:
+            # The remaining bound is at least this document's, so only check it now
+            if remaining_prior is not None and score_bound + remaining_prior(doc_id) < threshold:
+                return True
+            doc_id = lead.next()
+            continue
+
+        for cursor in by_length[1:]:
+            found = cursor.next_geq(doc_id)
+            if found != doc_id:
+                doc_id = lead.next_geq(found)  # Jump the lead past the gap
+                break
+        else:
+            score = prior(doc_id) + sum(cursor.score() for cursor in by_length)
+            if score + proximity_weight >= heap.threshold():
+                if all(phrase_match([cursor.positions() for cursor in phrase]) for phrase in phrases):
+                    if proximity_weight:
+                        score += proximity_weight * proximity_score([cursor.positions() for cursor in cursors])
+                    heap.push(doc_id, score)
+            doc_id = lead.next()
+    return False
+
+
+def _disjunctive_top_k(cursors, prior, prior_bound, heap, remaining_prior=None):
+    """
+    MaxScore: cursors are ordered by max score, and the low-scoring prefix whose combined
+    bound can't reach the heap threshold becomes "non-essential". Only essential lists
+    generate candidates; non-essential lists are probed with skips, and probing stops
+    as soon as the remaining bound can't lift the document into the heap. With
+    `remaining_prior`, the prior bound shrinks to that of the documents not yet reached,
+    so once it is small enough every list turns non-essential and the walk stops.
+    Returns whether it stopped before the essential lists ran out.
+    """
+    cursors.sort(key=lambda cursor: cursor.max_score)
+    upper_bounds = []
+    total = 0.0
+    for cursor in cursors:
+        total += cursor.max_score
+        upper_bounds.append(total)
+
+    first_essential = 0
+    next_doc = 0
+    while first_essential < len(cursors):
+        threshold = heap.threshold()
+        if remaining_prior is not None:
+            prior_bound = remaining_prior(next_doc)
+        while first_essential < len(cursors) and upper_bounds[first_essential] + prior_bound < threshold:
+            first_essential += 1
+        if first_essential == len(cursors):
+            return any(cursor.doc() != END_OF_POSTINGS for cursor in cursors)
+
+        essential = cursors[first_essential:]
+        doc_id = min(cursor.doc() for cursor in essential)
+        if doc_id == END_OF_POSTINGS:
+            return False
+        next_doc = doc_id + 1
+
+        score = prior(doc_id)
+        for cursor in essential:
+            if cursor.doc() == doc_id:
+                score += cursor.score()
+                cursor.next()
+
+        for position in range(first_essential - 1, -1, -1):
+            if score + upper_bounds[position] < threshold:
+                break
+            cursor = cursors[position]
+            if cursor.next_geq(doc_id) == doc_id:
+                score += cursor.score()
+
+        heap.push(doc_id, score)
+    return False
+
+
+def ranked_query(query_tokens, inverted_index, doc_lengths, pagerank_scores, k=5, conjunctive=True,
+                 prior_weight=None, phrases=(), pagerank_bounds=None, wildcards=None):
+    """
+    Return the exact top-k (doc_id, score) pairs for the query, best first, scored as
+    TF-IDF plus the PageRank prior (see scoring.compute_combined_score). Conjunctive
+    queries require every term; disjunctive queries rank documents with any term.
+    Per-term max-score bounds let both modes skip most postings. A shard of a larger
+    index is passed the corpus-wide `prior_weight` so its scores match the whole index.
+
+    Over a positional index, conjunctive queries also require every phrase (a tuple of
+    query tokens, see parse_query) to occur verbatim, and documents whose terms sit close
+    together get the proximity boost. Without positions, phrases are treated as plain terms.
+
+    `pagerank_bounds` (scoring.pagerank_suffix_max of the PageRank scores) lets the query
+    stop before the end of its posting lists once no later document can reach the top k.
+    The results are the same; it saves work when doc ids are in descending PageRank order.
+
+    `prefix*` tokens match any of the prefix's most common expansions (see union_postings);
+    a shard is passed `wildcards`, {token: (expansions, idf, max_score)} of the whole index.
+    """
+    terms = list(dict.fromkeys(query_tokens))
+    postings = [term_postings(inverted_index, term, doc_lengths, wildcards) for term in terms]
+    if conjunctive and None in postings:
+        return []
+    terms = [term for term, entry in zip(terms, postings) if entry is not None]
+    postings = [entry for entry in postings if entry is not None]
+    if not postings or k <= 0:
+        return []
+
+    cursors = [PostingCursor(entry, doc_lengths) for entry in postings]
+    query_bound = sum(cursor.max_score for cursor in cursors)
+    if prior_weight is None:
+        prior_weight = pagerank_prior_weight(query_bound, pagerank_scores)
+    prior_bound = prior_weight * pagerank_scores.max() if len(pagerank_scores) else 0.0
+
+    def prior(doc_id):
+        return pagerank_scores[doc_id] * prior_weight if prior_weight else 0.0
+
+    remaining_prior = None
+    if pagerank_bounds is not None:
+        def remaining_prior(doc_id):
+            return pagerank_bounds[doc_id] * prior_weight
+
+    heap = TopKHeap(k)
+    if conjunctive:
+        positional = all(cursor.has_positions for cursor in cursors)
+        by_term = dict(zip(terms, cursors))
+        phrase_cursors = [[by_term[term] for term in phrase] for phrase in phrases] if positional else []
+        proximity_weight = PROXIMITY_WEIGHT * query_bound if positional and len(cursors) > 1 else 0.0
+        stopped = _conjunctive_top_k(cursors, prior, heap, phrase_cursors, proximity_weight, remaining_prior)
+    else:
+        stopped = _disjunctive_top_k(cursors, prior, prior_bound, heap, remaining_prior)
+    if metrics.enabled():
+        metrics.count("postings_scanned", sum(cursor.scanned for cursor in cursors))
+        metrics.count("candidates_scored", heap.pushed)
+        if stopped and remaining_prior is not None:
+            metrics.count("early_terminations")
+    return heap.results()
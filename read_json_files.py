@@ -1,74 +1,131 @@
 import os
 import json
+import metrics
 from extract_text import extract_text_from_html
-from tokenizer import tokenize
+from tokenizer import default_tokenizer
+from link_graph import normalize_links
+from ingest import ordered_parallel_map
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_FOLDER = os.path.join(BASE_DIR, "data", "developer", "DEV")
 OUTPUT_FILE = os.path.join(BASE_DIR, "processed_documents.json")
 
 
-def read_json_files():
-    document_list = []
-    file_count = 0
-    skipped_count = 0  # Counter for skipped documents
-    total_json_files = 0  # Counter for total files read
-
-    for folder_name, subfolder_names, file_names in os.walk(DATA_FOLDER):
-        for file in file_names:
+def discover_files(data_folder=None):
+    """Yield every .json file under the data folder in sorted order, so doc ids are reproducible."""
+    for folder_name, subfolder_names, file_names in os.walk(data_folder or DATA_FOLDER):
+        subfolder_names.sort()
+        for file in sorted(file_names):
             if file.endswith(".json"):
-                file_path = os.path.join(folder_name, file)
-                total_json_files += 1  # Count every file
-
-                with open(file_path, "r", encoding="utf-8") as json_file:
-                    try:
-                        data = json.load(json_file)
-                        url = data.get("url", "No URL Found")
-                        content = data.get("content", "No Content Found")
-
-                        try:
-                            processed_text = extract_text_from_html(content)
-                        except Exception as e:
-                            print(f"ERROR: Failed to process HTML for {url}: {str(e)}")
-                            continue
-
-                        regular_tokens = tokenize(processed_text["regular"])
-                        important_tokens = tokenize(processed_text["important"])
-
-                        if not regular_tokens and not important_tokens:
-                            print(f"Skipping empty document: {url}")
-                            skipped_count += 1
-                            continue  # Skip this document
-
-                        document_list.append({
-                            "url": url,
-                            "regular_tokens": regular_tokens,
-                            "important_tokens": important_tokens
-                        })
-                        file_count += 1
-
-                        if file_count % 100 == 0:
-                            print(f"Processed {file_count} files...")
-
-                        if file_count % 1000 == 0:
-                            with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-                                json.dump(document_list, f)
-                                f.write("\n")
-                            #document_list = []  # Clear memory
-
-                    except json.JSONDecodeError:
-                        print(f"Skipped invalid JSON file: {file_path}")
+                yield os.path.join(folder_name, file)
+
+
+def process_file(file_path, positions=False):
+    """
+    Parse and tokenize one crawled page. Returns ("ok", document), ("skipped", url) for pages
+    without any text, or ("failed", reason). Documents carry (term, count) pairs for their
+    regular and important text, the cleaned text of both (for the docstore), and with
+    `positions` also (term, [positions]) pairs for the regular text, for positional indexes.
+    Runs inside ingest worker processes (whose metrics stay in those processes; index with
+    one worker to collect them).
+    """
+    with metrics.span("index.read"), open(file_path, "r", encoding="utf-8") as json_file:
+        try:
+            data = json.load(json_file)
+        except json.JSONDecodeError:
+            return "failed", f"Skipped invalid JSON file: {file_path}"
+
+    url = data.get("url", "No URL Found")
+    content = data.get("content", "No Content Found")
+
+    try:
+        with metrics.span("index.parse"):
+            processed_text = extract_text_from_html(content)
+    except Exception as e:
+        return "failed", f"ERROR: Failed to process HTML for {url}: {str(e)}"
+
+    with metrics.span("index.tokenize"):
+        if positions:
+            term_positions = default_tokenizer.term_positions(processed_text["regular"])
+            regular_terms = [(term, len(entry)) for term, entry in term_positions]
+            important_terms = default_tokenizer.term_counts(processed_text["important"])
+        else:
+            regular_terms, important_terms = default_tokenizer.tokenize_batch(
+                [processed_text["regular"], processed_text["important"]], output="counts")
+
+    if not regular_terms and not important_terms:
+        return "skipped", url
+
+    document = {
+        "url": url,
+        "regular_terms": regular_terms,
+        "important_terms": important_terms,
+        "links": normalize_links(url, processed_text["links"]),
+        "text": processed_text["regular"],
+        "important_text": processed_text["important"],
+    }
+    if positions:
+        document["positions"] = term_positions
+    return "ok", document
+
+
+def process_file_with_positions(file_path):
+    """process_file with positions, as a module-level function for ingest worker processes."""
+    return process_file(file_path, positions=True)
+
+
+def iter_documents(stats=None, workers=1, chunk_size=32, data_folder=None, positions=False):
+    """
+    Yield tokenized documents one at a time, in file-discovery order, so callers that index
+    as they go never hold the whole corpus in memory. With workers > 1, files are parsed by
+    a process pool in chunks of `chunk_size` files. If a `stats` dict is given it is kept up
+    to date with "total_files_read", "documents", "skipped" and "failed" counts. With
+    `positions`, documents also carry token positions (see process_file).
+    """
+    if stats is None:
+        stats = {}
+    stats.update({"total_files_read": 0, "skipped": 0, "failed": 0, "documents": 0})
+
+    function = process_file_with_positions if positions else process_file
+    for status, payload in ordered_parallel_map(function, discover_files(data_folder), workers, chunk_size):
+        stats["total_files_read"] += 1  # Count every file
+
+        if status == "failed":
+            print(payload)
+            stats["failed"] += 1
+            metrics.count("files_failed")
+            continue
+        if status == "skipped":
+            print(f"Skipping empty document: {payload}")
+            stats["skipped"] += 1
+            metrics.count("files_skipped")
+            continue  # Skip this document
+
+        stats["documents"] += 1
+        metrics.count("documents_read")
+        if stats["documents"] % 100 == 0:
+            print(f"Processed {stats['documents']} files...")
+
+        yield payload
+
+
+def print_read_stats(stats):
+    """Print the final statistics of a read."""
+    print(f"\nTotal JSON files read: {stats['total_files_read']}")
+    print(f"Skipped empty documents: {stats['skipped']}")
+    print(f"Failed files: {stats['failed']}")
+    print(f"Final total documents sent for indexing: {stats['documents']}\n")
+
+
+def read_json_files(workers=1):
+    """Read and tokenize the whole corpus into a list. Use iter_documents to stream instead."""
+    stats = {}
+    document_list = list(iter_documents(stats, workers))
 
     if document_list:
         with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
             json.dump(document_list, f, indent=4)
-#            f.write("\n")
-
-    # Print the final statistics
-    print(f"\nTotal JSON files read: {total_json_files}")
-    print(f"Skipped empty documents: {skipped_count}")
-    print(f"Final total documents sent for indexing: {file_count}\n")
 
-    print(f"Final check before returning: {len(document_list)} documents being returned.")  # Debugging line
+    print_read_stats(stats)
 
-    return document_list, total_json_files
\ No newline at end of file
+    return document_list, stats["total_files_read"]
@@ -0,0 +1,208 @@
+import numpy as np
+from urllib.parse import urlsplit
+from segment import SegmentWriter
+
+# Doc id reassignment. Doc ids are handed out in crawl-folder order, which has nothing to
+# do with what pages contain, so the gaps between consecutive postings are large and a
+# query has to walk every posting list to the end. Renumbering the documents once, at
+# index time, fixes both:
+#
+#   url         sort by reversed host, then path: pages of a site and of a section get
+#               neighbouring ids, and they tend to share vocabulary (smaller d-gaps)
+#   pagerank    descending PageRank: the static part of the score only falls as doc ids
+#               grow, so a query can stop once nothing later can reach the top k
+#               (see query_processor.ranked_query's pagerank_bounds)
+#   bisection   recursive graph bisection of the document-term graph (Dhulipala et al.,
+#               KDD 2016), starting from URL order: each half is split again after
+#               swapping documents to minimize the log-gap cost of the postings
+#
+# An order is an array of old doc ids listed in their new order; new_id[order] = arange(n).
+
+BISECTION_LEAF_SIZE = 16     # Ranges this small are left in their current order
+BISECTION_ITERATIONS = 10    # Swap rounds per split
+BISECTION_MIN_DF = 2         # Terms in a single document don't affect gaps
+
+
+def url_key(url):
+    """Sort key grouping a site's pages: host labels reversed (www dropped), then path and query."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").removeprefix("www.")
+    return ".".join(reversed(host.split("."))), parts.path, parts.query
+
+
+def url_order(urls):
+    urls = list(urls)
+    return np.asarray(sorted(range(len(urls)), key=lambda doc_id: url_key(urls[doc_id])), dtype=np.int64)
+
+
+def pagerank_order(pagerank_scores):
+    """Highest PageRank first; ties keep their current order."""
+    return np.argsort(-np.asarray(pagerank_scores, dtype=np.float64), kind="stable")
+
+
+def _document_term_matrix(index, num_docs, min_df=BISECTION_MIN_DF):
+    """Binary documents x terms CSR matrix of the terms in at least `min_df` documents."""
+    from scipy import sparse
+
+    indptr, indices = [0], []
+    for term in index:
+        documents = np.asarray(index[term]["documents"], dtype=np.int64)
+        if len(documents) >= min_df:
+            indices.append(documents)
+            indptr.append(indptr[-1] + len(documents))
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    term_documents = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, np.asarray(indptr)),
+                                       shape=(len(indptr) - 1, num_docs))
+    return term_documents.T.tocsr()
+
+
+def _gap_cost(degree, size):
+    """Approximate bits for `degree` postings spread over `size` documents (log-gap model)."""
+    degree = np.maximum(degree, 0)
+    return degree * np.log2(size / (degree + 1))
+
+
+def _bisect(matrix, iterations):
+    """
+    Split the rows of `matrix` (one per document) into two halves with a low combined
+    log-gap cost. Returns a boolean array, True for the first half.
+    """
+    num_docs = matrix.shape[0]
+    first = np.zeros(num_docs, dtype=bool)
+    first[:num_docs // 2] = True
+    sizes = (num_docs // 2, num_docs - num_docs // 2)
+    degrees = np.asarray(matrix.sum(axis=0)).ravel()
+
+    for _ in range(iterations):
+        first_degrees = matrix.T @ first.astype(np.float32)
+        second_degrees = degrees - first_degrees
+        current = _gap_cost(first_degrees, sizes[0]) + _gap_cost(second_degrees, sizes[1])
+        # Cost saved, per term, by moving one of its documents to the other half
+        to_second = current - _gap_cost(first_degrees - 1, sizes[0]) - _gap_cost(second_degrees + 1, sizes[1])
+        to_first = current - _gap_cost(first_degrees + 1, sizes[0]) - _gap_cost(second_degrees - 1, sizes[1])
+
+        leaving_first = np.flatnonzero(first)
+        leaving_second = np.flatnonzero(~first)
+        gains_first = matrix[leaving_first] @ to_second
+        gains_second = matrix[leaving_second] @ to_first
+        by_gain = np.argsort(-gains_first, kind="stable")
+        leaving_first, gains_first = leaving_first[by_gain], gains_first[by_gain]
+        by_gain = np.argsort(-gains_second, kind="stable")
+        leaving_second, gains_second = leaving_second[by_gain], gains_second[by_gain]
+        pairs = min(len(leaving_first), len(leaving_second))
+        swap_gains = gains_first[:pairs] + gains_second[:pairs]
+        swaps = int(np.count_nonzero(swap_gains > 0))  # Both lists are sorted, so the gains only fall
+        if swaps == 0:
+            break
+        first[leaving_first[:swaps]] = False
+        first[leaving_second[:swaps]] = True
+    return first
+
+
+def bisection_order(index, num_docs, initial_order=None, leaf_size=BISECTION_LEAF_SIZE,
+                    iterations=BISECTION_ITERATIONS):
+    """
+    Recursive graph bisection: split the documents in two, swap documents between the
+    halves while that lowers the log-gap cost of the postings, and recurse into each half.
+    Documents that share many terms end up with nearby ids.
+    """
+    matrix = _document_term_matrix(index, num_docs)
+    order = np.arange(num_docs, dtype=np.int64) if initial_order is None else np.array(initial_order, dtype=np.int64)
+    ranges = [(0, num_docs)]
+    while ranges:
+        start, end = ranges.pop()
+        if end - start <= leaf_size:
+            continue
+        documents = order[start:end]
+        first = _bisect(matrix[documents], iterations)
+        order[start:end] = np.concatenate([documents[first], documents[~first]])
+        middle = start + int(first.sum())
+        ranges += [(start, middle), (middle, end)]
+    return order
+
+
+STRATEGIES = ("url", "pagerank", "bisection")
+
+
+def document_order(strategy, index, urls, pagerank_scores):
+    """The new doc id order of an index under one of STRATEGIES."""
+    if strategy == "url":
+        return url_order(urls)
+    if strategy == "pagerank":
+        return pagerank_order(pagerank_scores)
+    if strategy == "bisection":
+        return bisection_order(index, len(urls), initial_order=url_order(urls))
+    raise ValueError(f"Unknown doc id order {strategy!r} (expected one of {', '.join(STRATEGIES)})")
+
+
+def inverse_order(order):
+    """new_id such that new_id[old doc id] is its id under `order`."""
+    new_id = np.empty(len(order), dtype=np.int64)
+    new_id[order] = np.arange(len(order), dtype=np.int64)
+    return new_id
+
+
+def _reorder_postings(new_id, documents, frequencies, positions=None):
+    """One posting list renumbered by new_id and sorted by new doc id, positions included."""
+    new_documents = new_id[np.asarray(documents, dtype=np.int64)]
+    permutation = np.argsort(new_documents, kind="stable")
+    frequencies = np.asarray(frequencies)[permutation]
+    if positions is not None:
+        counts, flat = positions
+        counts = np.asarray(counts, dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        counts = counts[permutation]
+        # Index of every position in the new order: each posting's run, in its new place
+        moved = np.repeat(starts[permutation] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        positions = (counts, np.asarray(flat)[moved])
+    return new_documents[permutation], frequencies, positions
+
+
+def reorder_inverted_index(inverted_index, document_lookup, pagerank_scores, order):
+    """
+    Renumber an in-memory index (see build_index.build_inverted_index) by `order`. Returns
+    the new inverted index, document lookup and PageRank scores; IDF and max-score bounds
+    don't depend on doc ids and are carried over.
+    """
+    new_id = inverse_order(order)
+    reordered = {}
+    for term, postings in inverted_index.items():
+        positions = None
+        if "positions" in postings:
+            positions = ([len(entry) for entry in postings["positions"]],
+                         [position for entry in postings["positions"] for position in entry])
+        documents, frequencies, positions = _reorder_postings(new_id, postings["documents"], postings["frequency"],
+                                                              positions)
+        entry = dict(postings, documents=documents.tolist(), frequency=frequencies.tolist())
+        if positions is not None:
+            starts = np.cumsum(positions[0]).tolist()
+            flat = positions[1].tolist()
+            entry["positions"] = [flat[end - count:end] for count, end in zip(positions[0].tolist(), starts)]
+        reordered[term] = entry
+    lookup = {int(new_id[doc_id]): url for doc_id, url in document_lookup.items()}
+    return reordered, lookup, np.asarray(pagerank_scores)[order]
+
+
+def reorder_segment(index, path, order, aliases=None, **stats):
+    """
+    Write an open index (Segment, or a SegmentSet without tombstones) renumbered by `order`
+    as a new segment at `path`, with its PageRank scores, dedup fingerprints and docstore.
+    Terms are streamed one at a time. `aliases` ({old doc id: [URLs]}) is stored renumbered.
+    """
+    new_id = inverse_order(order)
+    positional = bool(getattr(index, "has_positions", False))
+    writer = SegmentWriter(path, np.asarray(index.doc_lengths)[order], positions=positional)
+    for term in index:
+        postings = index[term]
+        documents, frequencies = postings.decode()
+        documents, frequencies, positions = _reorder_postings(
+            new_id, documents, frequencies, postings.decode_positions() if positional else None)
+        writer.add_term(term, documents, frequencies, positions=positions)
+    urls = (index.url(doc_id) for doc_id in order.tolist())
+    fingerprints = getattr(index, "fingerprints", None)
+    records = None
+    if getattr(index, "has_docstore", False):
+        records = (index.document_record(doc_id) for doc_id in order.tolist())
+    writer.finish(urls, np.asarray(index.pagerank_scores)[order],
+                  fingerprints=None if fingerprints is None else np.asarray(fingerprints)[order], records=records,
+                  aliases={int(new_id[doc_id]): alias_urls for doc_id, alias_urls in (aliases or {}).items()}, **stats)
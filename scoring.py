@@ -1,88 +1,135 @@
-import math
+import time
 import numpy as np
+import metrics
 
-def compute_tf_idf_score(doc_id, query_tokens, inverted_index, total_docs):
+@metrics.timed("query.score")
+def compute_tf_idf_scores(candidates, query_tokens, inverted_index, doc_lengths):
     """
-    Compute the TF-IDF score for a given document (doc_id)
-    and a set of query tokens.
-    """
-    score = 0.0
-    doc_id = str(doc_id)  # Ensure doc_id is a string for correct matching
-    doc_length = sum(inverted_index.get(doc_id, {}).get("frequency", []))  # Normalize by doc length
-
-    for term in query_tokens:
-        if term in inverted_index:
-            postings = inverted_index[term]
-            doc_list = list(map(str, postings["documents"]))  # Convert doc IDs to strings
-            freq_list = postings["frequency"]
-
-            if doc_id in doc_list:
-                index = doc_list.index(doc_id)
-                tf = freq_list[index] / (doc_length + 1)  # Normalize TF
-                df = len(doc_list)
-                idf = math.log((total_docs + 1) / (df + 1)) + 1
-                score += tf * idf  # Now weighted properly
-    return score
-
+    Compute TF-IDF scores for all candidate documents at once, term-at-a-time.
+    Each query term's posting list is walked once and its contributions are added to
+    an accumulator slot per candidate. `candidates` must be sorted doc ids and the
+    postings must carry the precomputed "idf" (see build_index.compute_document_stats).
 
-
-def compute_pagerank(document_graph, num_iterations=20, damping_factor=0.85):
+    Returns an array of scores aligned with `candidates`.
+    """
+    candidates = np.asarray(candidates, dtype=np.int64)
+    accumulators = np.zeros(len(candidates))
+    if len(candidates) == 0:
+        return accumulators
+
+    for term in dict.fromkeys(query_tokens):
+        postings = inverted_index.get(term)
+        if postings is None:
+            continue
+
+        docs = np.asarray(postings["documents"], dtype=np.int64)
+        slots = np.searchsorted(candidates, docs)
+        slots[slots == len(candidates)] = 0
+        hits = candidates[slots] == docs
+        if not hits.any():
+            continue
+
+        docs = docs[hits]
+        freqs = np.asarray(postings["frequency"], dtype=np.float64)[hits]
+        tf = freqs / (doc_lengths[docs] + 1)  # Normalize TF
+        accumulators[slots[hits]] += tf * postings["idf"]
+    return accumulators
+
+
+@metrics.timed("index.pagerank")
+def compute_pagerank(indptr, indices, damping_factor=0.85, tolerance=1e-6, max_iterations=100):
     """
-    Compute PageRank scores using the power iteration method.
+    Compute PageRank scores by sparse power iteration over a CSR link graph
+    (see link_graph.build_link_graph). Rank held by dangling nodes is spread
+    uniformly over all nodes each iteration, and iteration stops once the L1
+    change between iterations drops below `tolerance`.
+
+    Returns (scores, stats) where scores[doc_id] is the PageRank of that document.
     """
     print("🔄 Starting PageRank computation...")  # Log start of PR
 
-    urls = list(document_graph.keys())
-    num_docs = len(urls)
-    if num_docs == 0:
+    num_docs = len(indptr) - 1
+    stats = {"nodes": num_docs, "edges": len(indices), "dangling": 0,
+             "iterations": 0, "converged": False, "residual": 0.0, "seconds": 0.0}
+    if num_docs <= 0:
         print("⚠️ PageRank skipped: No documents found in the graph.")
-        return {}
+        return np.zeros(0), stats
+
+    start_time = time.perf_counter()
 
-    url_to_index = {url: i for i, url in enumerate(urls)}
-    index_to_url = {i: url for url, i in url_to_index.items()}
+    out_degree = np.diff(indptr)
+    dangling = out_degree == 0
+    stats["dangling"] = int(dangling.sum())
 
-    # Initialize adjacency matrix
-    link_matrix = np.zeros((num_docs, num_docs))
+    # Source node of every edge, so one bincount pushes rank along all edges at once
+    sources = np.repeat(np.arange(num_docs, dtype=np.int32), out_degree)
+    inv_degree = np.zeros(num_docs)
+    np.divide(1.0, out_degree, out=inv_degree, where=~dangling)
+    teleport = (1 - damping_factor) / num_docs
 
-    for url, outgoing_links in document_graph.items():
-        if outgoing_links:
-            for link in outgoing_links:
-                if link in url_to_index:
-                    link_matrix[url_to_index[url], url_to_index[link]] = 1
+    pr_values = np.full(num_docs, 1.0 / num_docs)
 
-    # Normalize rows (handle dangling nodes)
-    for i in range(num_docs):
-        if np.sum(link_matrix[i]) > 0:
-            link_matrix[i] /= np.sum(link_matrix[i])
-        else:
-            link_matrix[i] = np.ones(num_docs) / num_docs  # Handle dangling nodes
+    for iteration in range(1, max_iterations + 1):
+        share = pr_values * inv_degree
+        new_values = np.bincount(indices, weights=share[sources], minlength=num_docs)
+        dangling_mass = pr_values[dangling].sum()
+        new_values = damping_factor * (new_values + dangling_mass / num_docs) + teleport
 
-    # PageRank initialization
-    pr_values = np.ones(num_docs) / num_docs
+        residual = float(np.abs(new_values - pr_values).sum())
+        pr_values = new_values
+        stats["iterations"] = iteration
+        stats["residual"] = residual
 
-    for iteration in range(num_iterations):
-        pr_values = (1 - damping_factor) / num_docs + damping_factor * link_matrix.T @ pr_values
         if iteration % 5 == 0:  # Log every 5 iterations
-            print(f"PageRank Iteration {iteration + 1}/{num_iterations} completed.")
+            print(f"PageRank Iteration {iteration}: residual {residual:.2e}")
 
-    print("PageRank computation finished!")  # Log completion
+        if residual < tolerance:
+            stats["converged"] = True
+            break
 
-    return {index_to_url[i]: pr_values[i] for i in range(num_docs)}
+    stats["seconds"] = time.perf_counter() - start_time
+    print(f"PageRank computation finished! {stats['iterations']} iterations, "
+          f"converged={stats['converged']}, {stats['seconds']:.2f}s")  # Log completion
 
+    return pr_values, stats
 
-def compute_combined_score(doc_id, query_tokens, inverted_index, total_docs, pagerank_scores):
+
+def pagerank_prior_weight(query_score_bound, pagerank_scores):
     """
-    Compute a combined score using TF-IDF and PageRank.
+    Weight that scales PageRank to be comparable to TF-IDF: the best-ranked page gets a
+    prior equal to the query's TF-IDF upper bound (the sum of its terms' max scores).
+    It depends only on the query, not on which documents match, so the combined score
+    stays safe for max-score pruning in query_processor.ranked_query.
     """
-    doc_id = str(doc_id)  # Ensure doc_id is a string
+    if len(pagerank_scores) == 0:
+        return 0.0
+    max_pagerank = pagerank_scores.max()
+    if max_pagerank <= 0:
+        return 0.0
+    return query_score_bound / max_pagerank
+
 
-    tf_idf_score = compute_tf_idf_score(doc_id, query_tokens, inverted_index, total_docs)
-    pagerank_score = pagerank_scores.get(doc_id, 0)  # Get PageRank
+def pagerank_suffix_max(pagerank_scores):
+    """
+    bounds[d] = the highest PageRank of any document with id >= d (bounds[num_docs] = 0).
+    It bounds the prior of every document a query hasn't reached yet; with doc ids in
+    descending PageRank order (reorder.py) it is just the PageRank itself.
+    """
+    scores = np.asarray(pagerank_scores, dtype=np.float64)
+    return np.append(np.maximum.accumulate(scores[::-1])[::-1], 0.0)
 
-    # Scale PageRank dynamically to be comparable to TF-IDF
-    if pagerank_score > 0:
-        pagerank_weight = max(tf_idf_score) / max(pagerank_scores.values())  # Normalize PR
-        pagerank_score *= pagerank_weight  # Scale PageRank appropriately
 
-    return tf_idf_score + pagerank_score  # PageRank now properly influences ranking
+def compute_combined_score(candidates, query_tokens, inverted_index, doc_lengths, pagerank_scores):
+    """
+    Compute combined TF-IDF + PageRank scores for the sorted candidate doc ids.
+    `pagerank_scores` is an array indexed by doc id.
+    """
+    tf_idf_scores = compute_tf_idf_scores(candidates, query_tokens, inverted_index, doc_lengths)
+    if len(tf_idf_scores) == 0:
+        return tf_idf_scores
+
+    query_score_bound = sum(inverted_index[term]["max_score"]
+                            for term in dict.fromkeys(query_tokens) if term in inverted_index)
+    pagerank_weight = pagerank_prior_weight(query_score_bound, pagerank_scores)
 
+    return tf_idf_scores + pagerank_scores[candidates] * pagerank_weight  # PageRank now properly influences ranking
@@ -1,38 +1,147 @@
-import json
-from query_processor import preprocess_query, boolean_and_query
-from scoring import compute_combined_score
+import time
+from query_processor import parse_query, ranked_query
+from segment import open_segment
+from segment_set import is_index_dir, open_index
+from query_cache import SearchCache, query_key
+from sharding import ShardedIndex
+from champions import open_champions
+from snippets import result_summary
+from tokenizer import default_tokenizer
+import metrics
 
-def load_inverted_index(file_path):
-    """Load the inverted index, document lookup, PageRank scores, summaries, and total document count."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+default_cache = SearchCache()
+metrics.add_collector(lambda: {f"cache_{level}_{name}": value for level in ("results", "postings")
+                               for name, value in default_cache.stats()[level].items()})
 
-    inverted_index = data["index"]
-    doc_lookup = data["document_lookup"]
-    pagerank_scores = data.get("pagerank_scores", {})
-    document_summaries = data.get("document_summaries", {})  # Load summaries
-    total_docs = data["total_documents"]
+def load_index(path):
+    """
+    Open the on-disk index: an incremental index directory (base and delta segments) or a
+    single segment. Postings and document data are memory-mapped, not read. A tier 1 built
+    from this generation of the index (see champions.py) is opened with it.
+    """
+    index = open_index(path) if is_index_dir(path) else open_segment(path)
+    index.champions = open_champions(index)
+    return index
 
-    return inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs  # Return summaries
+def search(query, index, k=5, cache=default_cache):
+    """
+    Process the query and return the top-k documents by TF-IDF + PageRank, as (doc_id, score,
+    url, summary) where the summary is a snippet around the query terms (see snippets.py).
+    Documents must contain every query term (Boolean AND) and every "quoted phrase" verbatim;
+    if none do, the phrases are relaxed to plain terms, then documents with any term are
+    ranked (OR).
+    Results and hot posting lists are served from `cache` (pass None to bypass it), which
+    is emptied whenever the index generation changes. An index with a tier 1 answers from
+    it whenever that is exact (see champions.py).
+    With metrics on, every call is timed into the "query" histogram (see metrics.py).
+    """
+    with metrics.span("query"):
+        return metrics.profile(query, _search, query, index, k, cache)
 
-def search(query, inverted_index, doc_lookup, pagerank_scores, document_summaries, total_docs):
-    """Process the query, retrieve matching documents via Boolean AND, and return TF-IDF + PageRank scores."""
-    query_tokens = preprocess_query(query)
-    matching_docs = boolean_and_query(query_tokens, inverted_index)
+def _search(query, index, k, cache):
+    with metrics.span("query.tokenize"):
+        query_tokens, phrases = parse_query(query)
 
-    if not matching_docs:
+    if cache is not None:
+        cache.check_generation(index)
+        key = query_key(query_tokens, k, phrases)
+        doc_scores = cache.results.get(key)
+        if doc_scores is None:
+            metrics.count("result_cache_misses")
+            doc_scores = _search_tokens(query_tokens, phrases, index, cache.view(index), k)
+            cache.results.put(key, doc_scores)
+        else:
+            metrics.count("result_cache_hits")
+    else:
+        doc_scores = _search_tokens(query_tokens, phrases, index, index, k)
+
+    if not doc_scores:
         print("\nNo results found.")
-        return []
+    return list(doc_scores)
+
+def _ranked(query_tokens, index, postings, k, conjunctive, phrases=()):
+    if isinstance(index, ShardedIndex):
+        return index.ranked_query(query_tokens, k, conjunctive, phrases)  # Scatter-gather over the shards
+    if getattr(index, "champions", None) is not None and not phrases:
+        with metrics.span("query.tier1"):
+            top_docs = index.champions.ranked_query(query_tokens, index, postings, k, conjunctive)
+        if top_docs is not None:
+            return top_docs  # Exact; otherwise tier 1 couldn't vouch for it, so search everything
+    return ranked_query(query_tokens, postings, index.doc_lengths, index.pagerank_scores, k, conjunctive,
+                        phrases=phrases, pagerank_bounds=getattr(index, "pagerank_bounds", None))
 
+def _rank_tokens(query_tokens, phrases, index, postings, k):
+    with metrics.span("query.rank"):
+        top_docs = _ranked(query_tokens, index, postings, k, conjunctive=True, phrases=phrases)
+        if not top_docs and phrases:
+            metrics.count("phrase_fallbacks")
+            top_docs = _ranked(query_tokens, index, postings, k, conjunctive=True)
+        if not top_docs:
+            metrics.count("or_fallbacks")
+            top_docs = _ranked(query_tokens, index, postings, k, conjunctive=False)
+    return top_docs
+
+def _search_tokens(query_tokens, phrases, index, postings, k):
+    top_docs = _rank_tokens(query_tokens, phrases, index, postings, k)
     doc_scores = []
-    for doc_id in matching_docs:
-        score = compute_combined_score(str(doc_id), query_tokens, inverted_index, total_docs,
-                                       pagerank_scores)
-        url = doc_lookup.get(str(doc_id), "URL Not Found")
-        #summary = document_summaries.get(str(doc_id), "Summary not available.")  # Retrieve saved summary
-        summary = "Summarization disabled."
-        doc_scores.append((doc_id, score, url, summary))  # Now includes summaries
+    with metrics.span("query.lookup"):
+        for doc_id, score in top_docs:
+            url = index.url(doc_id)
+            summary = result_summary(index, doc_id, query_tokens)
+            doc_scores.append((doc_id, float(score), url, summary))
+
+    return doc_scores
 
-    doc_scores.sort(key=lambda x: x[1], reverse=True)
-    return doc_scores[:5]  # Return top 5 results
+def search_stages(query, index, k=5, cache=default_cache):
+    """
+    search() one stage at a time, for interactive callers that show results as they come
+    and drop a query between stages once a newer one arrives. Yields (stage, seconds,
+    results): "tokenize" with no results, "rank" with the top-k and None for each summary,
+    then "snippets" with the same results as search() would return. A result cache hit
+    skips straight from "tokenize" to a complete "cache" stage.
+    """
+    start = time.perf_counter()
+    query_tokens, phrases = parse_query(query)
+    yield "tokenize", time.perf_counter() - start, []
+
+    start = time.perf_counter()
+    postings = index
+    if cache is not None:
+        cache.check_generation(index)
+        key = query_key(query_tokens, k, phrases)
+        doc_scores = cache.results.get(key)
+        if doc_scores is not None:
+            yield "cache", time.perf_counter() - start, list(doc_scores)
+            return
+        postings = cache.view(index)
+    results = [(doc_id, float(score), index.url(doc_id), None)
+               for doc_id, score in _rank_tokens(query_tokens, phrases, index, postings, k)]
+    yield "rank", time.perf_counter() - start, results
+
+    start = time.perf_counter()
+    results = [(doc_id, score, url, result_summary(index, doc_id, query_tokens)) for doc_id, score, url, _ in results]
+    if cache is not None:
+        cache.results.put(key, results)
+    yield "snippets", time.perf_counter() - start, results
+
+def complete(query, index, limit=10):
+    """
+    Autocomplete the last word of `query` from the index's lexicon: up to `limit` indexed
+    terms it starts, most documents first, as (term, df) pairs. Terms are stems, so when
+    the typed word itself prefixes none ("learning" -> "learn"), its stem is tried.
+    Cheap enough to run on every keystroke: only the terms returned are decoded.
+    """
+    words = query.lower().split()
+    word = words[-1].strip('"*') if words else ""
+    if not word.isalnum():
+        return []
+    completions = index.prefix_terms(word, limit)
+    if not completions:
+        stem = default_tokenizer.stem(word)
+        if stem != word:
+            completions = index.prefix_terms(stem, limit)
+    return completions
 
+def cache_stats(cache=default_cache):
+    """Hit/miss/eviction counters of the search caches."""
+    return cache.stats()
@@ -0,0 +1,89 @@
+import queue
+import threading
+from search import search_stages
+
+# Background searches for interactive front ends (gui.py). The caller submits queries and
+# polls `updates`, a queue of progress messages, from its own loop (Tk's after()), so the
+# UI thread never runs a search itself:
+#
+#   {"sequence": 7, "query": "machine learning", "stage": "rank", "seconds": 0.004,
+#    "results": [(doc_id, score, url, summary or None), ...], "done": False}
+#
+# A failed search ends with stage "error" and the message under "error".
+#
+# Every query gets a higher sequence number, and a newer query supersedes older ones:
+# queued ones are dropped unstarted and a running one stops at its next stage (see
+# search.search_stages), so typing fast never leaves a backlog of stale searches.
+
+POLL_SECONDS = 0.1
+
+
+class SearchWorker:
+    """Runs searches of `index` on one daemon thread; see the module comment."""
+
+    def __init__(self, index, k=5, stages=search_stages):
+        self.index = index
+        self.k = k
+        self.stages = stages
+        self.requests = queue.Queue()
+        self.updates = queue.Queue()
+        self.latest = 0  # Sequence number of the newest query
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "superseded": 0}
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, query):
+        """Queue a query, superseding any earlier one. Returns its sequence number."""
+        with self.lock:
+            self.latest += 1
+            sequence = self.latest
+            self.stats["submitted"] += 1
+        self.requests.put((sequence, query))
+        return sequence
+
+    def cancel(self):
+        """Supersede every submitted query without starting a new one."""
+        with self.lock:
+            self.latest += 1
+
+    def is_current(self, sequence):
+        return sequence == self.latest
+
+    def poll(self):
+        """Progress messages that arrived since the last poll (never blocks)."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.updates.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def _run(self):
+        while self.running:
+            try:
+                sequence, query = self.requests.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if not self.is_current(sequence):
+                self.stats["superseded"] += 1
+                continue
+            self._search(sequence, query)
+
+    def _search(self, sequence, query):
+        try:
+            for stage, seconds, results in self.stages(query, self.index, self.k):
+                if not self.is_current(sequence):
+                    self.stats["superseded"] += 1
+                    return
+                self.updates.put({"sequence": sequence, "query": query, "stage": stage, "seconds": seconds,
+                                  "results": results, "done": stage in ("snippets", "cache")})
+            self.stats["completed"] += 1
+        except Exception as e:  # Report it to the UI instead of killing the thread
+            self.updates.put({"sequence": sequence, "query": query, "stage": "error", "seconds": 0.0,
+                              "results": [], "done": True, "error": str(e)})
+
+    def close(self):
+        self.running = False
+        self.thread.join()
@@ -0,0 +1,370 @@
+import os
+import json
+import math
+import shutil
+import uuid
+import numpy as np
+import metrics
+from scoring import pagerank_suffix_max
+from docstore import DocStore, DocStoreWriter, has_docstore
+from lexicon import LexiconWriter, open_lexicon
+from postings_codec import BLOCK_SIZE, BlockPostings, SKIP_DTYPE, encode_postings, encode_positions
+
+# On-disk index segment: a directory of flat little-endian arrays that are opened with
+# numpy.memmap, so opening is near-instant and pages are shared between processes
+# through the OS page cache.
+#
+#   header.json   format name/version, a unique build id and corpus statistics
+#   lexicon.*     sorted, front-coded terms (see lexicon.py; terms.dat/terms.idx before version 4)
+#   terms.meta    per-term df, first skip entry, IDF and max-score bound (TERM_DTYPE), by term id
+#   postings.dat  compressed posting blocks, contiguous per term (see postings_codec.py)
+#   postings.skp  one skip entry (last doc id, byte offset) per block (SKIP_DTYPE)
+#   positions.dat optional delta-encoded token positions, one block per posting block
+#   positions.skp uint64 byte offset of each positions block (present with positions.dat)
+#   docs.dat      UTF-8 URLs, concatenated
+#   docs.table    per-document URL offset/length, PageRank, length and norm (DOC_DTYPE)
+#   links.jsonl   optional {"url", "links"} per document, kept by incremental indexes so
+#                 PageRank can be recomputed across segments
+#   fingerprints.dat  optional exact hash, SimHash and term count per document (FINGERPRINT_DTYPE),
+#                 so later updates can spot copies of indexed pages (see dedup.py)
+#   aliases.json  optional {doc id: [URLs]} of duplicate pages collapsed into a document
+#   docstore.*    optional compressed text (and summaries) of the documents (see docstore.py)
+
+SEGMENT_FORMAT = "searchengine-segment"
+SEGMENT_VERSION = 4
+READABLE_VERSIONS = (2, 3, 4)  # 3 added patched exceptions to posting blocks, 4 the front-coded lexicon
+LINKS_FILE = "links.jsonl"
+FINGERPRINTS_FILE = "fingerprints.dat"
+ALIASES_FILE = "aliases.json"
+
+TERM_DTYPE = np.dtype([("df", "<u4"), ("first_block", "<u8"), ("idf", "<f8"), ("max_score", "<f8")])
+DOC_DTYPE = np.dtype([("url_offset", "<u8"), ("url_length", "<u4"), ("pagerank", "<f8"),
+                      ("length", "<u4"), ("norm", "<f4")])
+FINGERPRINT_DTYPE = np.dtype([("exact", "<u8"), ("simhash", "<u8"), ("terms", "<u4")])
+
+
+class SegmentWriter:
+    """
+    Streams a segment to disk. Terms must be added in sorted order; document lengths
+    must be known up front because IDF, max-score bounds and norms are computed as
+    each term's postings are written. With `positions` the segment also stores token
+    positions for phrase and proximity queries.
+    """
+
+    def __init__(self, path, doc_lengths, positions=False):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        if os.path.exists(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        os.makedirs(self.tmp_path)
+
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        self.num_docs = len(self.doc_lengths)
+        self.norms_squared = np.zeros(self.num_docs)
+        self.term_meta = []
+        self.num_postings = 0
+        self.num_blocks = 0
+        self.postings_size = 0
+        self.last_term = None
+
+        self.lexicon = LexiconWriter(self.tmp_path)
+        self.postings_file = open(self._file("postings.dat"), "wb")
+        self.skips_file = open(self._file("postings.skp"), "wb")
+        self.positions = positions
+        self.positions_size = 0
+        if positions:
+            self.positions_file = open(self._file("positions.dat"), "wb")
+            self.position_offsets_file = open(self._file("positions.skp"), "wb")
+
+    def _file(self, name):
+        return os.path.join(self.tmp_path, name)
+
+    def add_term(self, term, documents, frequencies, idf=None, max_score=None, positions=None):
+        """
+        Append one term's postings (doc ids ascending). IDF and the max-score bound are
+        computed from this segment unless given, as they are for shards of a larger corpus.
+        `positions` is (count per posting, concatenated positions); a positional segment
+        stores no positions for a term added without them.
+        """
+        if self.last_term is not None and term <= self.last_term:
+            raise ValueError(f"Terms must be added in sorted order: {term!r} after {self.last_term!r}")
+        self.last_term = term
+
+        documents = np.asarray(documents, dtype=np.int64)
+        frequencies = np.asarray(frequencies, dtype=np.int64)
+
+        if idf is None:
+            idf = math.log((self.num_docs + 1) / (len(documents) + 1)) + 1
+        weights = frequencies / (self.doc_lengths[documents] + 1) * idf
+        self.norms_squared[documents] += weights * weights  # Doc ids are unique within a list
+        if max_score is None:
+            max_score = float(weights.max(initial=0.0))
+
+        self.term_meta.append((len(documents), self.num_blocks, idf, max_score))
+        self.lexicon.add(term)
+
+        payload, skips = encode_postings(documents, frequencies)
+        skips["offset"] += self.postings_size
+        self.postings_file.write(payload)
+        self.skips_file.write(skips.tobytes())
+        self.postings_size += len(payload)
+        self.num_blocks += len(skips)
+        self.num_postings += len(documents)
+
+        if self.positions:
+            if positions is None:
+                positions = (np.zeros(len(documents), dtype=np.int64), np.zeros(0, dtype=np.int64))
+            payload, offsets = encode_positions(*positions)
+            offsets += self.positions_size
+            self.positions_file.write(payload)
+            self.position_offsets_file.write(offsets.tobytes())
+            self.positions_size += len(payload)
+
+    def finish(self, urls, pagerank_scores, fingerprints=None, aliases=None, records=None, **stats):
+        """
+        Write the document table and header, then move the segment into place. `urls` is
+        any iterable yielding one URL per doc id, in order. `fingerprints` (one entry per doc
+        id, see dedup.fingerprint), `aliases` ({doc id: [URLs]}) and `records` (an iterable of
+        encoded docstore records in doc id order, see DocStore.record) are stored if given.
+        """
+        for handle in (self.postings_file, self.skips_file):
+            handle.close()
+        self.lexicon.finish()
+        if self.positions:
+            self.positions_file.close()
+            self.position_offsets_file.close()
+
+        np.array(self.term_meta, dtype=TERM_DTYPE).tofile(self._file("terms.meta"))
+
+        url_lengths = np.zeros(self.num_docs, dtype=np.int64)
+        with open(self._file("docs.dat"), "wb") as url_file:
+            for doc_id, url in enumerate(urls):  # May be a stream; never materialized
+                encoded = url.encode("utf-8")
+                url_file.write(encoded)
+                url_lengths[doc_id] = len(encoded)
+
+        table = np.zeros(self.num_docs, dtype=DOC_DTYPE)
+        table["url_offset"] = np.cumsum(url_lengths) - url_lengths
+        table["url_length"] = url_lengths
+        if len(pagerank_scores):
+            table["pagerank"] = pagerank_scores
+        table["length"] = self.doc_lengths
+        table["norm"] = np.sqrt(self.norms_squared)
+        table.tofile(self._file("docs.table"))
+        if fingerprints is not None:
+            np.asarray(fingerprints, dtype=FINGERPRINT_DTYPE).tofile(self._file(FINGERPRINTS_FILE))
+        if aliases:
+            with open(self._file(ALIASES_FILE), "w", encoding="utf-8") as file:
+                json.dump({str(doc_id): urls for doc_id, urls in sorted(aliases.items())}, file)
+        if records is not None:
+            docstore = DocStoreWriter(self.tmp_path)
+            for record in records:
+                docstore.add_record(record)
+            docstore.finish()
+
+        header = {
+            "format": SEGMENT_FORMAT,
+            "version": SEGMENT_VERSION,
+            "build_id": uuid.uuid4().hex,
+            "num_docs": self.num_docs,
+            "num_terms": len(self.term_meta),
+            "num_postings": self.num_postings,
+            "postings_bytes": self.postings_size,
+            "positions": self.positions,
+            "positions_bytes": self.positions_size,
+            "total_tokens": int(self.doc_lengths.sum()),
+            "avg_doc_length": float(self.doc_lengths.mean()) if self.num_docs else 0.0,
+        }
+        header.update(stats)
+        with open(self._file("header.json"), "w", encoding="utf-8") as file:
+            json.dump(header, file, indent=4)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self.tmp_path, self.path)
+
+
+@metrics.timed("index.write")
+def write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths, aliases=None, **stats):
+    """
+    Write an in-memory inverted index ({term: {"documents": [...], "frequency": [...]}}) as
+    a segment. Postings with a "positions" list (one list of positions per document) make
+    it a positional segment. `aliases` maps doc ids to the URLs of their collapsed copies.
+    """
+    positions = any("positions" in postings for postings in inverted_index.values())
+    writer = SegmentWriter(path, doc_lengths, positions=positions)
+    for term in sorted(inverted_index):
+        postings = inverted_index[term]
+        term_positions = postings.get("positions")
+        if term_positions is not None:
+            term_positions = ([len(entry) for entry in term_positions],
+                              [position for entry in term_positions for position in entry])
+        writer.add_term(term, postings["documents"], postings["frequency"], positions=term_positions)
+    writer.finish(urls, pagerank_scores, aliases=aliases, **stats)
+
+
+def _map(path, dtype):
+    """Memory-map a flat array file (numpy can't map empty files)."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _header_identity(path):
+    """Stand-in build id for segments written before headers had one: the header file's inode and mtime."""
+    stat = os.stat(os.path.join(path, "header.json"))
+    return f"{stat.st_ino}-{stat.st_mtime_ns}"
+
+
+class Segment:
+    """
+    Read-only, memory-mapped view of a segment. Behaves like the in-memory inverted index
+    for lookups: `term in segment`, `segment.get(term)` and `segment[term]` return the term's
+    BlockPostings, readable like a postings dict ("documents", "frequency", "idf", "max_score").
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "header.json"), "r", encoding="utf-8") as file:
+            self.header = json.load(file)
+        if self.header.get("format") != SEGMENT_FORMAT:
+            raise ValueError(f"{path} is not an index segment")
+        if self.header.get("version") not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported segment version {self.header.get('version')} in {path}")
+
+        self.path = path
+        self.build_id = self.header.get("build_id") or _header_identity(path)  # Tells rebuilds at one path apart
+        self.num_docs = self.header["num_docs"]
+        self.num_terms = self.header["num_terms"]
+
+        self.lexicon = open_lexicon(path, self.num_terms)
+        self.term_meta = _map(os.path.join(path, "terms.meta"), TERM_DTYPE)
+        self.postings_data = _map(os.path.join(path, "postings.dat"), np.uint8)
+        self.skips = _map(os.path.join(path, "postings.skp"), SKIP_DTYPE)
+        self.url_bytes = _map(os.path.join(path, "docs.dat"), np.uint8)
+        self.doc_table = _map(os.path.join(path, "docs.table"), DOC_DTYPE)
+        self.has_positions = bool(self.header.get("positions"))
+        if self.has_positions:
+            self.positions_data = _map(os.path.join(path, "positions.dat"), np.uint8)
+            self.position_offsets = _map(os.path.join(path, "positions.skp"), "<u8")
+
+        # Column views over the document table, indexed by doc id
+        self.pagerank_scores = self.doc_table["pagerank"]
+        self.doc_lengths = self.doc_table["length"]
+        self.doc_norms = self.doc_table["norm"]
+        self.doc_order = self.header.get("doc_order")  # How doc ids were assigned (see reorder.py)
+        self._pagerank_bounds = None
+
+        fingerprints_path = os.path.join(path, FINGERPRINTS_FILE)
+        self.fingerprints = _map(fingerprints_path, FINGERPRINT_DTYPE) if os.path.exists(fingerprints_path) else None
+        self.docstore = DocStore(path) if has_docstore(path) else None  # Opened on first lookup
+        self.has_docstore = self.docstore is not None
+        self.champions = None  # Tier-1 postings (champions.ChampionTier), attached by search.load_index
+        self.alias_urls = {}  # doc id -> URLs of duplicates collapsed into it (see dedup.py)
+        if os.path.exists(os.path.join(path, ALIASES_FILE)):
+            with open(os.path.join(path, ALIASES_FILE), "r", encoding="utf-8") as file:
+                self.alias_urls = {int(doc_id): urls for doc_id, urls in json.load(file).items()}
+
+    @property
+    def pagerank_bounds(self):
+        """PageRank suffix maxima for early termination, for segments in PageRank order (else None)."""
+        if self._pagerank_bounds is None and self.doc_order == "pagerank":
+            self._pagerank_bounds = pagerank_suffix_max(self.pagerank_scores)
+        return self._pagerank_bounds
+
+    def __len__(self):
+        return self.num_terms
+
+    def __contains__(self, term):
+        return self.term_id(term) >= 0
+
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+    def __iter__(self):
+        return iter(self.lexicon)
+
+    def term(self, term_id):
+        return self.lexicon.term(term_id)
+
+    def term_id(self, term):
+        """Binary search the sorted lexicon; returns -1 if the term is absent."""
+        return self.lexicon.term_id(term)
+
+    def prefix_terms(self, prefix, limit=None):
+        """
+        Terms starting with `prefix`, the `limit` with the most documents (all of them in
+        sorted order without a limit), as (term, df) pairs.
+        """
+        if limit is not None:
+            return self.lexicon.complete(prefix, self.term_meta["df"], limit)
+        return [(term, int(self.term_meta[term_id]["df"])) for term_id, term in self.lexicon.prefix_terms(prefix)]
+
+    def postings_by_id(self, term_id):
+        meta = self.term_meta[term_id]
+        df = int(meta["df"])
+        first_block = int(meta["first_block"])
+        num_blocks = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+        positions = None
+        if self.has_positions:
+            positions = (self.positions_data, self.position_offsets[first_block:first_block + num_blocks])
+        return BlockPostings(self.postings_data, self.skips[first_block:first_block + num_blocks], df,
+                             float(meta["idf"]), float(meta["max_score"]), positions)
+
+    def get(self, term, default=None):
+        term_id = self.term_id(term)
+        if term_id < 0:
+            return default
+        return self.postings_by_id(term_id)
+
+    def url(self, doc_id):
+        entry = self.doc_table[doc_id]
+        start = int(entry["url_offset"])
+        return self.url_bytes[start:start + int(entry["url_length"])].tobytes().decode("utf-8")
+
+    def aliases(self, doc_id):
+        """URLs of the duplicate pages collapsed into a document."""
+        return self.alias_urls.get(int(doc_id), [])
+
+    def document(self, doc_id):
+        """Stored {"text", "important", "summary"} of a document, or None if the segment has no docstore."""
+        if self.docstore is None:
+            return None
+        return self.docstore.get(int(doc_id))
+
+    def document_record(self, doc_id):
+        """The encoded docstore record of a document, for copying it into another segment."""
+        return self.docstore.record(int(doc_id))
+
+
+@metrics.timed("index.open")
+def open_segment(path):
+    """Open a segment directory for querying."""
+    return Segment(path)
+
+
+def convert_json_index(json_path, segment_path):
+    """Convert an index saved in the old single-file JSON format into a segment."""
+    with open(json_path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+
+    inverted_index = data["index"]
+    doc_lookup = data["document_lookup"]
+    total_docs = data["total_documents"]
+    urls = [doc_lookup.get(str(doc_id), "") for doc_id in range(total_docs)]
+
+    doc_lengths = data.get("doc_lengths")
+    if doc_lengths is None:
+        doc_lengths = np.zeros(total_docs)
+        for postings in inverted_index.values():
+            doc_lengths[postings["documents"]] += postings["frequency"]
+
+    pagerank_scores = data.get("pagerank_scores", [])
+    if isinstance(pagerank_scores, dict):  # Older indexes keyed PageRank by URL
+        pagerank_scores = [pagerank_scores.get(url, 0.0) for url in urls]
+
+    write_segment(segment_path, inverted_index, urls, pagerank_scores, doc_lengths,
+                  total_files_read=data.get("total_files_read", total_docs))
+    print(f"Converted {json_path} to segment {segment_path}")
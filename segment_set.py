@@ -0,0 +1,320 @@
+import os
+import json
+import heapq
+import math
+import numpy as np
+import metrics
+from scoring import pagerank_suffix_max
+from segment import FINGERPRINT_DTYPE, open_segment
+
+# An incremental index is a directory holding several segments plus a manifest:
+#
+#   manifest.json         the committed state: segments in doc id order, their tombstones,
+#                         the global PageRank file, a generation counter and the source file
+#                         fingerprints (see incremental.py)
+#   seg-00000/ ...        immutable segments (segment.py); the first is usually the large
+#                         base, later ones are small deltas from updates
+#   pagerank-<gen>.npy    PageRank over the live documents of every segment
+#
+# A file whose page duplicates an indexed one (see dedup.py) has no document of its own:
+# its manifest entry points at the canonical document and holds its URL under "alias".
+#
+# The manifest is replaced atomically, so readers always see one consistent generation.
+
+MANIFEST_NAME = "manifest.json"
+INDEX_FORMAT = "searchengine-index"
+INDEX_VERSION = 1
+
+
+def is_index_dir(path):
+    return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+
+def new_manifest():
+    return {"format": INDEX_FORMAT, "version": INDEX_VERSION, "generation": 0, "next_segment": 0,
+            "segments": [], "pagerank": None, "files": {}}
+
+
+def load_manifest(index_dir):
+    """The committed manifest of an index directory, or an empty one if there is none yet."""
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return new_manifest()
+    with open(path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    if manifest.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{index_dir} is not an incremental index")
+    if manifest.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version {manifest.get('version')} in {index_dir}")
+    return manifest
+
+
+def save_manifest(index_dir, manifest):
+    """Commit a manifest: write it beside the old one, then rename over it."""
+    path = os.path.join(index_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+
+
+def manifest_aliases(manifest):
+    """{global doc id: [alias URLs]} from the alias entries of a manifest's files."""
+    bases, base = {}, 0
+    for entry in manifest["segments"]:
+        bases[entry["name"]] = base
+        base += entry["num_docs"]
+    aliases = {}
+    for file_entry in manifest["files"].values():
+        if "alias" in file_entry and file_entry["doc"] and file_entry["doc"][0] in bases:
+            name, doc_id = file_entry["doc"]
+            aliases.setdefault(bases[name] + doc_id, []).append(file_entry["alias"])
+    return aliases
+
+
+def merge_prefix_terms(segments, prefix, limit=None):
+    """
+    Terms of any of `segments` starting with `prefix` as (term, df) pairs, df summed over
+    the segments: all of them in sorted order, or the `limit` with the most documents.
+    Those are picked from each segment's own top `limit`, which is exact for one segment
+    and misses only terms that are close seconds in every segment.
+    """
+    if limit is None:
+        totals = {}
+        for segment in segments:
+            for term, df in segment.prefix_terms(prefix):
+                totals[term] = totals.get(term, 0) + df
+        return sorted(totals.items())
+    totals = []
+    for term in {term for segment in segments for term, _ in segment.prefix_terms(prefix, limit)}:
+        df = 0
+        for segment in segments:
+            term_id = segment.term_id(term)
+            if term_id >= 0:
+                df += int(segment.term_meta[term_id]["df"])
+        totals.append((term, df))
+    return sorted(totals, key=lambda entry: (-entry[1], entry[0]))[:limit]
+
+
+class MergedPostings:
+    """
+    One term's postings across several segments, in global doc ids. Each segment's blocks
+    are kept as blocks (shifted by the segment's doc id base), so cursors can still skip,
+    and tombstoned documents are filtered out as blocks are decoded. Reads like BlockPostings.
+    """
+
+    def __init__(self, parts, deleted, idf, max_score):
+        self.parts = parts  # [(doc id base, BlockPostings)]
+        self.deleted = deleted
+        self.idf = idf
+        self.max_score = max_score
+        self.df = sum(len(postings) for _, postings in parts)
+        self.block_last_docs = np.concatenate([np.asarray(postings.block_last_docs, dtype=np.int64) + base
+                                               for base, postings in parts])
+        self.num_blocks = len(self.block_last_docs)
+        self.block_parts = [(part, block) for part, (_, postings) in enumerate(parts)
+                            for block in range(postings.num_blocks)]
+        self.has_positions = all(postings.has_positions for _, postings in parts)
+        self._decoded = None
+
+    def __len__(self):
+        return self.df
+
+    def _filter(self, documents, frequencies):
+        if self.deleted is None:
+            return documents, frequencies
+        live = ~self.deleted[documents]
+        return documents[live], frequencies[live]
+
+    def block(self, block):
+        part, part_block = self.block_parts[block]
+        base, postings = self.parts[part]
+        documents, frequencies = postings.block(part_block)
+        return self._filter(documents.astype(np.int64) + base, frequencies)
+
+    def position_block(self, block):
+        """(counts, concatenated positions) of the live postings of one block (see block())."""
+        part, part_block = self.block_parts[block]
+        base, postings = self.parts[part]
+        counts, positions = postings.position_block(part_block)
+        if self.deleted is None:
+            return counts, positions
+        documents, _ = postings.block(part_block)
+        live = ~self.deleted[documents.astype(np.int64) + base]
+        return counts[live], positions[np.repeat(live, counts)]
+
+    def decode_positions(self):
+        """(counts, concatenated positions) of the live postings."""
+        counts, positions = [], []
+        for base, postings in self.parts:
+            part_counts, part_positions = postings.decode_positions()
+            if self.deleted is not None:
+                live = ~self.deleted[postings["documents"].astype(np.int64) + base]
+                part_positions = part_positions[np.repeat(live, part_counts)]
+                part_counts = part_counts[live]
+            counts.append(part_counts)
+            positions.append(part_positions)
+        return np.concatenate(counts), np.concatenate(positions)
+
+    def decode(self):
+        if self._decoded is None:
+            documents = np.concatenate([postings["documents"].astype(np.int64) + base for base, postings in self.parts])
+            frequencies = np.concatenate([postings["frequency"] for _, postings in self.parts])
+            self._decoded = self._filter(documents, frequencies)
+        return self._decoded
+
+    def __getitem__(self, key):
+        if key == "documents":
+            return self.decode()[0]
+        if key == "frequency":
+            return self.decode()[1]
+        if key == "idf":
+            return self.idf
+        if key == "max_score":
+            return self.max_score
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class SegmentSet:
+    """
+    Read-only view of one generation of an incremental index. Segments are laid end to end
+    in doc id space, and the set behaves like a single Segment: get(term), `term in index`,
+    url(doc_id), doc_lengths and pagerank_scores. Like Lucene, document frequencies and the
+    document count include tombstoned documents until their segment is merged, so IDF only
+    needs each segment's term metadata, never a scan of the postings.
+    """
+
+    def __init__(self, index_dir, manifest=None):
+        self.path = index_dir
+        self.manifest = manifest or load_manifest(index_dir)
+        self.generation = self.manifest["generation"]
+        self.segments = [open_segment(os.path.join(index_dir, entry["name"])) for entry in self.manifest["segments"]]
+        self.build_id = tuple(segment.build_id for segment in self.segments)  # Differs if the index is rebuilt
+
+        sizes = [segment.num_docs for segment in self.segments]
+        self.bases = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64)
+        self.num_docs = int(self.bases[-1])
+
+        deleted = np.zeros(self.num_docs, dtype=bool)
+        for base, entry in zip(self.bases, self.manifest["segments"]):
+            deleted[base + np.asarray(entry["deleted"], dtype=np.int64)] = True
+        self.num_deleted = int(deleted.sum())
+        self.deleted = deleted if self.num_deleted else None
+        self.has_positions = bool(self.segments) and all(segment.has_positions for segment in self.segments)
+        self.has_docstore = bool(self.segments) and all(segment.has_docstore for segment in self.segments)
+
+        self.doc_lengths = self._concatenate("doc_lengths", np.uint32)
+        self.doc_norms = self._concatenate("doc_norms", np.float32)
+        if self.manifest.get("pagerank"):
+            self.pagerank_scores = np.load(os.path.join(index_dir, self.manifest["pagerank"]), mmap_mode="r")
+        else:
+            self.pagerank_scores = self._concatenate("pagerank_scores", np.float64)
+        self.doc_order = self.manifest.get("doc_order")  # Order of the base segment (see incremental.reorder_index)
+        self._pagerank_bounds = None
+        self.champions = None  # Tier-1 postings (champions.ChampionTier), attached by search.load_index
+        self.alias_urls = manifest_aliases(self.manifest)
+
+        self.header = {
+            "generation": self.generation,
+            "num_docs": self.num_docs - self.num_deleted,
+            "deleted_docs": self.num_deleted,
+            "num_segments": len(self.segments),
+            "segments": [{"name": entry["name"], "num_docs": segment.num_docs, "deleted": len(entry["deleted"])}
+                         for entry, segment in zip(self.manifest["segments"], self.segments)],
+        }
+        self._num_terms = None
+
+    @property
+    def pagerank_bounds(self):
+        """
+        PageRank suffix maxima for early termination, for indexes reordered by PageRank (else
+        None). Delta segments added since then sit after the base in doc id order, and the
+        bounds stay exact; they just stop falling as steeply.
+        """
+        if self._pagerank_bounds is None and self.doc_order == "pagerank":
+            self._pagerank_bounds = pagerank_suffix_max(self.pagerank_scores)
+        return self._pagerank_bounds
+
+    @property
+    def fingerprints(self):
+        """Dedup fingerprints of every document, or None if a segment was written without them."""
+        if any(segment.fingerprints is None for segment in self.segments):
+            return None
+        return self._concatenate("fingerprints", FINGERPRINT_DTYPE)
+
+    def _concatenate(self, column, dtype):
+        if not self.segments:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate([getattr(segment, column) for segment in self.segments])
+
+    def __len__(self):
+        if self._num_terms is None:
+            self._num_terms = sum(1 for _ in self)
+        return self._num_terms
+
+    def __contains__(self, term):
+        return any(term in segment for segment in self.segments)
+
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+    def __iter__(self):
+        """Distinct terms of every segment, in sorted order."""
+        previous = None
+        for term in heapq.merge(*self.segments):
+            if term != previous:
+                yield term
+                previous = term
+
+    def prefix_terms(self, prefix, limit=None):
+        """Terms of any segment starting with `prefix`, df summed like get() does (see merge_prefix_terms)."""
+        return merge_prefix_terms(self.segments, prefix, limit)
+
+    def get(self, term, default=None):
+        parts = []
+        max_weight = 0.0  # Largest tf / (length + 1) of the term in any segment
+        for base, segment in zip(self.bases, self.segments):
+            postings = segment.get(term)
+            if postings is not None:
+                parts.append((int(base), postings))
+                max_weight = max(max_weight, postings.max_score / postings.idf)
+        if not parts:
+            return default
+        df = sum(len(postings) for _, postings in parts)
+        idf = math.log((self.num_docs + 1) / (df + 1)) + 1  # Same formula as SegmentWriter
+        return MergedPostings(parts, self.deleted, idf, max_weight * idf)
+
+    def locate(self, doc_id):
+        """(segment position, local doc id) of a global doc id."""
+        position = int(np.searchsorted(self.bases, doc_id, side="right")) - 1
+        return position, doc_id - int(self.bases[position])
+
+    def url(self, doc_id):
+        position, local_id = self.locate(doc_id)
+        return self.segments[position].url(local_id)
+
+    def aliases(self, doc_id):
+        """URLs of the duplicate pages collapsed into a document."""
+        return self.alias_urls.get(int(doc_id), [])
+
+    def document(self, doc_id):
+        position, local_id = self.locate(doc_id)
+        return self.segments[position].document(local_id)
+
+    def document_record(self, doc_id):
+        position, local_id = self.locate(doc_id)
+        return self.segments[position].document_record(local_id)
+
+
+@metrics.timed("index.open")
+def open_index(index_dir):
+    """Open the current generation of an incremental index directory."""
+    return SegmentSet(index_dir)
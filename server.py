@@ -0,0 +1,379 @@
+# Local HTTP/JSON search service.
+#
+#   python server.py [--index PATH] [--port 8080] [--workers N]
+#
+#   GET /search?q=machine+learning&k=5   top-k results as JSON
+#   GET /health                          liveness and index generation
+#   GET /stats                           counters of the worker that answers
+#   GET /metrics                         that worker's metrics.py spans and counters as
+#                                        Prometheus text (JSON with ?format=json); needs --metrics
+#
+# The parent opens the index once (so a bad path fails before anything is forked), binds
+# the listening socket and forks the workers, which all accept on it. Each worker runs an
+# asyncio event loop and opens the index itself; segments are memory-mapped read-only, so
+# every worker shares the same pages through the OS page cache instead of holding its own
+# copy. A worker that dies is restarted after a backoff; if workers keep dying right after
+# starting, the server gives up. One worker (the only process, without forking) also runs
+# the merge policy of an incremental index every --merge-interval seconds on a background
+# thread, so deltas from `main.py index --no-merge` runs are compacted while searches go
+# on; workers pick up each merged generation like any other. It runs in a worker, not the
+# parent, because forking while a thread is busy is unsafe.
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from search import load_index, search, cache_stats
+from segment_set import MANIFEST_NAME, is_index_dir
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX = os.path.join(BASE_DIR, "index")
+DEFAULT_WORKERS = os.cpu_count() or 1
+MAX_K = 100
+MAX_IN_FLIGHT = 64          # Requests a worker accepts at once before answering 503
+REQUEST_TIMEOUT = 2.0       # Seconds a search may take before the client gets a 504
+HEADER_TIMEOUT = 5.0        # Seconds to receive a request's headers
+KEEP_ALIVE_TIMEOUT = 15.0   # Idle seconds before a keep-alive connection is closed
+RELOAD_CHECK_SECONDS = 1.0  # How often to look for a new index generation
+MIN_WORKER_SECONDS = 5.0    # A worker that dies sooner than this after starting counts as a crash
+MAX_QUICK_CRASHES = 5       # Crashes in a row before the server gives up
+RESTART_BACKOFF = 0.5       # Seconds before restarting a crashed worker, doubled for every crash in a row
+MERGE_INTERVAL = 60.0       # Seconds between background merge policy runs; 0 turns them off
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+class IndexHolder:
+    """
+    The open index of a worker, reopened when an incremental index commits a new generation.
+    current() may load the index, so it is only called off the event loop thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = load_index(path)
+        self.manifest_mtime = self._manifest_mtime()
+        self.checked = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _manifest_mtime(self):
+        try:
+            return os.stat(os.path.join(self.path, MANIFEST_NAME)).st_mtime_ns
+        except OSError:
+            return None
+
+    def current(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.checked >= RELOAD_CHECK_SECONDS:
+                self.checked = now
+                mtime = self._manifest_mtime()
+                if mtime != self.manifest_mtime:
+                    self.index = load_index(self.path)
+                    self.manifest_mtime = mtime
+            return self.index
+
+
+class SearchService:
+    """
+    Routing and counters for one worker. Searches run on one thread so the loop stays
+    responsive; a search that times out keeps its in-flight slot until it really ends.
+    """
+
+    def __init__(self, index_path, max_in_flight=MAX_IN_FLIGHT, request_timeout=REQUEST_TIMEOUT):
+        self.holder = IndexHolder(index_path)
+        self.max_in_flight = max_in_flight
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.in_flight = 0
+        self.started = time.time()
+        self.counters = {"requests": 0, "searches": 0, "errors": 0, "timeouts": 0, "rejected": 0}
+        self.latencies = []  # Recent search latencies in ms, for /stats
+
+    async def handle(self, method, target):
+        """Answer one request; returns (status, JSON-serializable payload)."""
+        self.counters["requests"] += 1
+        if method != "GET":
+            return 405, {"error": "Only GET is supported"}
+
+        parts = urlsplit(target)
+        params = parse_qs(parts.query)
+        if parts.path == "/search":
+            return await self.handle_search(params)
+        if parts.path == "/health":
+            index = await asyncio.get_running_loop().run_in_executor(None, self.holder.current)
+            return 200, {"status": "ok", "pid": os.getpid(), "generation": getattr(index, "generation", 0)}
+        if parts.path == "/stats":
+            index = await asyncio.get_running_loop().run_in_executor(None, self.holder.current)
+            return 200, self.stats(index)
+        if parts.path == "/metrics":
+            if not metrics.enabled():
+                return 404, {"error": "Metrics are off; start the server with --metrics"}
+            if params.get("format", [""])[0] == "json":
+                return 200, metrics.snapshot()
+            return 200, metrics.to_prometheus()
+        return 404, {"error": f"Unknown path {parts.path}"}
+
+    async def handle_search(self, params):
+        query = params.get("q", [""])[0].strip()
+        if not query:
+            return 400, {"error": "Missing query parameter q"}
+        try:
+            k = int(params.get("k", ["5"])[0])
+        except ValueError:
+            return 400, {"error": "k must be an integer"}
+        if not 1 <= k <= MAX_K:
+            return 400, {"error": f"k must be between 1 and {MAX_K}"}
+
+        if self.in_flight >= self.max_in_flight:
+            self.counters["rejected"] += 1
+            return 503, {"error": "Too many concurrent requests"}
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(self._search, query, k)
+        # Freed when the search ends, not when we stop waiting for it: a timed-out search
+        # still occupies the thread. One that never started is cancelled by wait_for
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            index, results = await asyncio.wait_for(asyncio.wrap_future(future), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            return 504, {"error": f"Search took longer than {self.request_timeout}s"}
+        except Exception as e:
+            self.counters["errors"] += 1
+            return 500, {"error": str(e)}
+
+        took_ms = (time.perf_counter() - start) * 1000
+        self.counters["searches"] += 1
+        self.latencies.append(took_ms)
+        del self.latencies[:-1000]
+        return 200, {
+            "query": query,
+            "k": k,
+            "took_ms": round(took_ms, 3),
+            "results": [{"doc_id": int(doc_id), "score": score, "url": url, "aliases": index.aliases(doc_id),
+                         "summary": summary}
+                        for doc_id, score, url, summary in results],
+        }
+
+    def _search(self, query, k):
+        """Runs on the search thread, with any index reload."""
+        index = self.holder.current()
+        return index, search(query, index, k)
+
+    def _release(self, loop):
+        def release():
+            self.in_flight -= 1
+        try:
+            loop.call_soon_threadsafe(release)
+        except RuntimeError:  # The loop is closed: the worker is shutting down
+            pass
+
+    def stats(self, index):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, len(latencies) * q // 100)], 3) if latencies else None
+
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "in_flight": self.in_flight,
+            **self.counters,
+            "latency_ms": {"p50": percentile(50), "p99": percentile(99)},
+            "index": {"path": self.holder.path, "generation": getattr(index, "generation", 0),
+                      "num_docs": index.header.get("num_docs") if hasattr(index, "header") else None},
+            "cache": cache_stats(),
+        }
+
+    async def serve_connection(self, reader, writer):
+        """HTTP/1.1 with keep-alive; one request at a time per connection."""
+        timeout = HEADER_TIMEOUT
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, 400, {"error": "Malformed Content-Length"}, keep_alive=False)
+                    return
+                if length:
+                    await reader.readexactly(length)  # Bodies are ignored
+
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version.upper() == "HTTP/1.1")
+                status, payload = await self.handle(method, target)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+                timeout = KEEP_ALIVE_TIMEOUT
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"  # Prometheus text
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve_socket(listener, index_path, max_in_flight=MAX_IN_FLIGHT, request_timeout=REQUEST_TIMEOUT):
+    """Run one worker's event loop on an already-bound listening socket until cancelled."""
+    service = SearchService(index_path, max_in_flight, request_timeout)
+    server = await asyncio.start_server(service.serve_connection, sock=listener)
+    async with server:
+        await server.serve_forever()
+
+
+def start_merger(args):
+    """Compact an incremental index in the background of this process (see incremental.start_background_merge)."""
+    if args.merge_interval > 0 and is_index_dir(args.index):
+        from incremental import start_background_merge
+
+        start_background_merge(args.index, interval=args.merge_interval)
+
+
+def _run_worker(listener, args, merger=False):
+    """Body of a forked worker; never returns. Exits non-zero if the worker fails."""
+    status = 1
+    try:
+        # Ctrl-C reaches the whole process group; only the parent reacts and stops the workers
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        if merger:
+            start_merger(args)
+        asyncio.run(serve_socket(listener, args.index, args.max_in_flight, args.timeout))
+        status = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(status)
+
+
+def serve(args):
+    """
+    Bind, pre-fork the workers and restart any that die, until interrupted. Returns False,
+    without serving, if the index can't be opened, or once workers keep crashing at startup.
+    """
+    try:
+        load_index(args.index)
+    except Exception as e:
+        print(f"Error: cannot open the index at {args.index}: {e}", file=sys.stderr)
+        return False
+    if args.metrics or args.profile_slowest:
+        metrics.enable(args.profile_slowest)
+    listener = socket.create_server((args.host, args.port), backlog=1024)
+    listener.setblocking(False)
+    print(f"Serving {args.index} on http://{args.host}:{listener.getsockname()[1]} with {args.workers} worker(s)")
+
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        start_merger(args)
+        try:
+            asyncio.run(serve_socket(listener, args.index, args.max_in_flight, args.timeout))
+        except KeyboardInterrupt:
+            pass
+        return True
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    children = {}  # pid: (when it was started, whether it runs the merger)
+    crashes = 0  # Workers in a row that died within MIN_WORKER_SECONDS
+
+    def spawn(merger):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(listener, args, merger)
+        children[pid] = (time.monotonic(), merger)
+
+    for worker in range(args.workers):
+        spawn(merger=worker == 0)
+    try:
+        while children:
+            pid, status = os.wait()
+            child = children.pop(pid, None)
+            if child is None:
+                continue
+            started, merger = child
+            if time.monotonic() - started < MIN_WORKER_SECONDS:
+                crashes += 1
+            else:
+                crashes = 0
+            if crashes >= MAX_QUICK_CRASHES:
+                print(f"Error: {crashes} workers in a row died right after starting; giving up", file=sys.stderr)
+                return False
+            delay = RESTART_BACKOFF * 2 ** (crashes - 1) if crashes else 0.0
+            print(f"Worker {pid} exited with status {status}; restarting it in {delay:.1f}s")
+            time.sleep(delay)
+            spawn(merger)
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the search index over HTTP.")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Index directory or segment")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Pre-forked worker processes")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="Concurrent requests per worker before answering 503")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Search timeout in seconds")
+    parser.add_argument("--merge-interval", type=float, default=MERGE_INTERVAL,
+                        help="Seconds between background merges of an incremental index (0: never)")
+    parser.add_argument("--metrics", action="store_true", help="Collect metrics and serve them at /metrics")
+    parser.add_argument("--profile-slowest", type=int, default=0, metavar="N",
+                        help="cProfile searches and keep the N slowest in /metrics?format=json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if serve(parse_args()) else 1)
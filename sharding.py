@@ -0,0 +1,217 @@
+import os
+import json
+import heapq
+import math
+import itertools
+import time
+import shutil
+import multiprocessing
+import numpy as np
+from segment import SegmentWriter, open_segment
+from segment_set import merge_prefix_terms
+from query_processor import ranked_query, is_wildcard, union_postings, MAX_PREFIX_EXPANSIONS
+
+# Document-partitioned shards: the doc id range of an index is cut into N contiguous
+# ranges and each range becomes its own segment with local doc ids. Every shard stores
+# the corpus-wide IDF and max-score bound of its terms, and the coordinator passes the
+# corpus-wide PageRank prior weight with each query, so a shard scores every document
+# exactly as the whole index would. Contiguous ranges keep global doc id order, so merging
+# local top-k lists by (score, lower doc id) reproduces the unsharded ranking.
+#
+#   shards.json   number of shards, their doc id bases and the source index generation
+#   shard-000/    one segment per shard (segment.py)
+
+SHARDS_FILE = "shards.json"
+
+
+def split_index(index, shards_dir, num_shards):
+    """
+    Split an open index (Segment or SegmentSet) into `num_shards` shard segments under
+    `shards_dir`. Postings are read term by term in sorted order and written to all shard
+    writers at once, so the index is never held in memory.
+    """
+    num_docs = len(index.doc_lengths)
+    num_shards = max(1, min(num_shards, num_docs))
+    bases = [num_docs * shard // num_shards for shard in range(num_shards + 1)]
+    if os.path.exists(shards_dir):
+        shutil.rmtree(shards_dir)  # Drop shards of an older split
+    os.makedirs(shards_dir)
+
+    doc_lengths = np.asarray(index.doc_lengths)
+    positional = bool(getattr(index, "has_positions", False))
+    writers = [SegmentWriter(_shard_path(shards_dir, shard), doc_lengths[bases[shard]:bases[shard + 1]],
+                             positions=positional)
+               for shard in range(num_shards)]
+    for term in index:
+        postings = index[term]
+        documents = np.asarray(postings["documents"], dtype=np.int64)
+        frequencies = np.asarray(postings["frequency"])
+        cuts = np.searchsorted(documents, bases)
+        if positional:
+            counts, positions = postings.decode_positions()
+            position_cuts = np.concatenate([[0], np.cumsum(counts)])[cuts]
+        for shard, writer in enumerate(writers):
+            start, end = cuts[shard], cuts[shard + 1]
+            if start < end:
+                shard_positions = None
+                if positional:
+                    shard_positions = (counts[start:end], positions[position_cuts[shard]:position_cuts[shard + 1]])
+                writer.add_term(term, documents[start:end] - bases[shard], frequencies[start:end],
+                                idf=postings["idf"], max_score=postings["max_score"], positions=shard_positions)
+
+    pagerank_scores = np.asarray(index.pagerank_scores)
+    alias_urls = getattr(index, "alias_urls", {})
+    for shard, writer in enumerate(writers):
+        urls = (index.url(doc_id) for doc_id in range(bases[shard], bases[shard + 1]))
+        aliases = {doc_id - bases[shard]: doc_aliases for doc_id, doc_aliases in alias_urls.items()
+                   if bases[shard] <= doc_id < bases[shard + 1]}
+        records = None
+        if getattr(index, "has_docstore", False):
+            records = (index.document_record(doc_id) for doc_id in range(bases[shard], bases[shard + 1]))
+        writer.finish(urls, pagerank_scores[bases[shard]:bases[shard + 1]], aliases=aliases, records=records,
+                      shard=shard, num_shards=num_shards, doc_base=bases[shard],
+                      doc_order=getattr(index, "doc_order", None))
+
+    with open(os.path.join(shards_dir, SHARDS_FILE), "w", encoding="utf-8") as file:
+        json.dump({"num_shards": num_shards, "bases": bases, "num_docs": num_docs,
+                   "max_pagerank": float(pagerank_scores.max()) if num_docs else 0.0,
+                   "source": getattr(index, "path", None), "generation": getattr(index, "generation", 0),
+                   "split_id": time.time_ns()},
+                  file, indent=4)
+    print(f"Split {num_docs} documents into {num_shards} shards in {shards_dir}")
+
+
+def _shard_path(shards_dir, shard):
+    return os.path.join(shards_dir, f"shard-{shard:03d}")
+
+
+def load_shard_info(shards_dir):
+    """Contents of shards.json, or None if `shards_dir` holds no shards."""
+    path = os.path.join(shards_dir, SHARDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+# Per-process shard handles, opened lazily in each worker and keyed by split so a re-split
+# directory is reopened. Segments are memory-mapped, so every worker shares the same pages
+# through the OS page cache.
+_open_shards = {}
+
+
+def _search_shard(task):
+    """Worker task: local top-k of one shard, returned with global doc ids."""
+    shards_dir, split_id, shard, base, query_tokens, k, conjunctive, prior_weight, phrases, wildcards = task
+    opened = _open_shards.get((shards_dir, shard))
+    if opened is None or opened[0] != split_id:
+        opened = _open_shards[(shards_dir, shard)] = (split_id, open_segment(_shard_path(shards_dir, shard)))
+    segment = opened[1]
+    results = ranked_query(query_tokens, segment, segment.doc_lengths, segment.pagerank_scores, k, conjunctive,
+                           prior_weight=prior_weight, phrases=phrases, pagerank_bounds=segment.pagerank_bounds,
+                           wildcards=wildcards)
+    return [(base + doc_id, score) for doc_id, score in results]
+
+
+class ShardedIndex:
+    """
+    Scatter-gather search coordinator. Each query is sent to every shard through a pool
+    of worker processes, and the local top-k lists are merged with a heap. The coordinator
+    also maps the shards itself, for term statistics and URLs.
+    """
+
+    def __init__(self, shards_dir, workers=None):
+        info = load_shard_info(shards_dir)
+        if info is None:
+            raise ValueError(f"No shards in {shards_dir}")
+        self.path = shards_dir
+        self.generation = info["generation"]
+        self.num_shards = info["num_shards"]
+        self.bases = info["bases"]
+        self.max_pagerank = info["max_pagerank"]
+        self.split_id = info["split_id"]
+        self.shards = [open_segment(_shard_path(shards_dir, shard)) for shard in range(self.num_shards)]
+        self.workers = workers if workers is not None else min(self.num_shards, os.cpu_count() or 1)
+        self.pool = multiprocessing.Pool(self.workers) if self.workers > 1 else None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def _wildcard_stats(self, query_tokens):
+        """
+        {`prefix*` token: (expansions, idf, max_score)} over all shards, so that every shard
+        expands and scores a prefix term as the whole index would. Shards hold disjoint
+        documents, so document frequencies, of single terms and of unions, add up.
+        """
+        num_docs = sum(len(shard.doc_lengths) for shard in self.shards)
+        stats = {}
+        for term in dict.fromkeys(query_tokens):
+            if not is_wildcard(term):
+                continue
+            expansions = [expansion for expansion, _ in self.prefix_terms(term[:-1], MAX_PREFIX_EXPANSIONS)]
+            unions = [union_postings(shard, expansions, shard.doc_lengths, idf=1.0) for shard in self.shards]
+            unions = [union for union in unions if union is not None]
+            if unions:
+                idf = math.log((num_docs + 1) / (sum(len(union) for union in unions) + 1)) + 1
+                stats[term] = (expansions, idf, max(union.max_score for union in unions) * idf)
+        return stats
+
+    def _term_bounds(self, query_tokens, wildcards):
+        """Corpus-wide max-score bound of each query term present in any shard."""
+        bounds = {}
+        for term in dict.fromkeys(query_tokens):
+            if is_wildcard(term):
+                if term in wildcards:
+                    bounds[term] = wildcards[term][2]
+                continue
+            for shard in self.shards:
+                postings = shard.get(term)
+                if postings is not None:
+                    bounds[term] = postings["max_score"]  # Stored corpus-wide, same in every shard
+                    break
+        return bounds
+
+    def ranked_query(self, query_tokens, k=5, conjunctive=True, phrases=()):
+        """Same contract and results as query_processor.ranked_query over the unsharded index."""
+        wildcards = self._wildcard_stats(query_tokens)
+        bounds = self._term_bounds(query_tokens, wildcards)
+        if not bounds or k <= 0 or (conjunctive and len(bounds) < len(set(query_tokens))):
+            return []
+        prior_weight = 0.0
+        if self.max_pagerank > 0:
+            prior_weight = sum(bounds.values()) / self.max_pagerank
+
+        tasks = [(self.path, self.split_id, shard, self.bases[shard], list(bounds), k, conjunctive, prior_weight,
+                  phrases, wildcards)
+                 for shard in range(self.num_shards)]
+        if self.pool is None:
+            local_results = [_search_shard(task) for task in tasks]
+        else:
+            local_results = self.pool.map(_search_shard, tasks)
+
+        # Each local list is sorted best first with ties broken by lower doc id
+        merged = heapq.merge(*local_results, key=lambda entry: (-entry[1], entry[0]))
+        return list(itertools.islice(merged, k))
+
+    def prefix_terms(self, prefix, limit=None):
+        """Terms of any shard starting with `prefix`, df summed over the shards (see merge_prefix_terms)."""
+        return merge_prefix_terms(self.shards, prefix, limit)
+
+    def url(self, doc_id):
+        shard = int(np.searchsorted(self.bases, doc_id, side="right")) - 1
+        return self.shards[shard].url(doc_id - self.bases[shard])
+
+    def aliases(self, doc_id):
+        shard = int(np.searchsorted(self.bases, doc_id, side="right")) - 1
+        return self.shards[shard].aliases(doc_id - self.bases[shard])
+
+    def document(self, doc_id):
+        shard = int(np.searchsorted(self.bases, doc_id, side="right")) - 1
+        return self.shards[shard].document(doc_id - self.bases[shard])
+
+
+def open_sharded_index(shards_dir, workers=None):
+    return ShardedIndex(shards_dir, workers)
@@ -0,0 +1,118 @@
+import re
+from tokenizer import default_tokenizer
+
+# Query-biased snippets from the docstore (docstore.py). The stored text is searched for
+# each query stem with str.find, so only the few words that could match are stemmed; the
+# snippet is the window of SNIPPET_CHARS characters holding the most distinct query terms
+# (then the most matches), widened to whole words.
+#
+# A result shows the document's abstractive summary when summarizer.py has stored one,
+# and the snippet otherwise.
+
+SNIPPET_CHARS = 240
+NO_SUMMARY = "Summarization disabled."  # Indexes built without a docstore
+
+WORD_PATTERN = re.compile(r"[a-z0-9]*")
+WORD_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789")
+ASCII_LOWERCASE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")  # Keeps offsets
+
+
+def _stem_prefix(term):
+    """
+    A prefix every word stemming to `term` starts with. Porter stems are prefixes of their
+    words, except that a final "i" or "l" may stand for other letters ("faculty" -> "faculti",
+    "sensibility" -> "sensibl").
+    """
+    return term[:-1] if len(term) > 3 and term[-1] in "il" else term
+
+
+def find_terms(text, terms):
+    """
+    (start, end, term) of every word of `text` that stems to one of `terms`, or starts with
+    the prefix of a "prefix*" term, in order.
+    """
+    terms = set(terms)
+    if not terms or not text:
+        return []
+    lowered = text.translate(ASCII_LOWERCASE)  # Tokens are ASCII letters and digits (see tokenizer.py)
+    stem = default_tokenizer.stem
+    stems = {}  # Word -> stem, for the words repeated within the page
+    wildcards = {term[:-1]: term for term in terms if term.endswith("*")}
+    matches = []
+    for prefix in {_stem_prefix(term) for term in terms if not term.endswith("*")} | set(wildcards):
+        position = lowered.find(prefix)
+        while position >= 0:
+            if position == 0 or lowered[position - 1] not in WORD_CHARACTERS:
+                end = WORD_PATTERN.match(lowered, position + len(prefix)).end()
+                word = lowered[position:end]
+                term = stems.get(word)
+                if term is None:
+                    term = stems[word] = stem(word)
+                if term in terms:
+                    matches.append((position, end, term))
+                elif prefix in wildcards:
+                    matches.append((position, end, wildcards[prefix]))
+            position = lowered.find(prefix, position + 1)
+    matches.sort()
+    return matches
+
+
+def best_window(matches, width=SNIPPET_CHARS):
+    """
+    (start, end) span of the matches inside the best window of `width` characters: the
+    most distinct terms, then the most matches, then the earliest. Two pointers, O(matches).
+    """
+    best, best_span = None, None
+    counts = {}
+    left = 0
+    for right, (start, end, term) in enumerate(matches):
+        counts[term] = counts.get(term, 0) + 1
+        while end - matches[left][0] > width:
+            left_term = matches[left][2]
+            counts[left_term] -= 1
+            if not counts[left_term]:
+                del counts[left_term]
+            left += 1
+        score = (len(counts), right - left + 1)
+        if best is None or score > best:
+            best, best_span = score, (matches[left][0], end)
+    return best_span
+
+
+def _word_boundary(text, position, forward):
+    """Move `position` to the nearest space, forward or backward (or the end of the text)."""
+    if forward:
+        space = text.find(" ", position)
+        return len(text) if space < 0 else space
+    space = text.rfind(" ", 0, position)
+    return 0 if space < 0 else space + 1
+
+
+def snippet(text, terms, width=SNIPPET_CHARS):
+    """
+    About `width` characters of `text` around its densest cluster of query terms, with
+    "..." where it was cut. Falls back to the start of the text when no term occurs.
+    """
+    if not text:
+        return ""
+    span = best_window(find_terms(text, terms), width)
+    if span is None:
+        start = 0
+    else:
+        slack = max(0, width - (span[1] - span[0]))
+        start = max(0, span[0] - slack // 2)
+    end = min(len(text), start + width)
+    start = max(0, min(start, end - width))  # Near the end, use the room before the matches
+    if start > 0:
+        start = _word_boundary(text, start, forward=False)
+    if end < len(text):
+        end = _word_boundary(text, end, forward=True)
+    return ("..." if start > 0 else "") + text[start:end].strip() + ("..." if end < len(text) else "")
+
+
+def result_summary(index, doc_id, terms):
+    """What a result shows: the stored summary, else a snippet for `terms`, else NO_SUMMARY."""
+    document = index.document(doc_id)
+    if document is None:
+        return NO_SUMMARY
+    return document.get("summary") or snippet(document["text"], terms)
@@ -0,0 +1,204 @@
+import os
+import json
+import heapq
+import shutil
+import struct
+import tempfile
+from array import array
+import numpy as np
+import metrics
+from segment import LINKS_FILE, SegmentWriter
+from docstore import DOCSTORE_FILES, DocStoreWriter
+from build_index import document_term_frequencies
+from link_graph import build_link_graph, save_link_graph
+from scoring import compute_pagerank
+
+# Single-pass in-memory indexing (SPIMI): postings are accumulated in a dict until the
+# estimated size reaches the memory budget, then the block is written to disk as a
+# sorted run and cleared. Runs are combined with a k-way heap merge straight into the
+# segment writer, so the full inverted index never exists in memory.
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# Rough per-entry costs of the in-memory block, used to decide when to flush
+POSTING_BYTES = 8       # doc id + frequency in two array("I")
+POSITION_BYTES = 4      # one array("I") entry per token position
+TERM_OVERHEAD_BYTES = 250  # dict slot, key string and two empty arrays
+
+RUN_TERM_HEADER = struct.Struct("<III")  # term byte length, number of postings, number of positions
+
+
+@metrics.timed("index.spill")
+def _write_run(block, path):
+    """
+    Write one in-memory block as a run file sorted by term. Positional blocks also hold a
+    position count per posting and the concatenated positions after the frequencies.
+    """
+    with open(path, "wb") as run_file:
+        for term in sorted(block):
+            arrays = block[term]
+            encoded = term.encode("utf-8")
+            num_positions = len(arrays[3]) if len(arrays) > 2 else 0
+            run_file.write(RUN_TERM_HEADER.pack(len(encoded), len(arrays[0]), num_positions))
+            run_file.write(encoded)
+            for values in arrays:
+                run_file.write(values.tobytes())
+
+
+def _read_run(path, positions=False):
+    """Yield (term, documents, frequencies, positions) from a run file in term order."""
+    with open(path, "rb") as run_file:
+        while True:
+            header = run_file.read(RUN_TERM_HEADER.size)
+            if not header:
+                return
+            term_length, count, num_positions = RUN_TERM_HEADER.unpack(header)
+            term = run_file.read(term_length).decode("utf-8")
+            documents = np.frombuffer(run_file.read(4 * count), dtype="<u4")
+            frequencies = np.frombuffer(run_file.read(4 * count), dtype="<u4")
+            term_positions = None
+            if positions:
+                counts = np.frombuffer(run_file.read(4 * count), dtype="<u4")
+                term_positions = (counts, np.frombuffer(run_file.read(4 * num_positions), dtype="<u4"))
+            yield term, documents, frequencies, term_positions
+
+
+def merge_runs(run_paths, positions=False):
+    """
+    k-way merge of sorted runs. Yields (term, documents, frequencies, positions) once per
+    term, where positions is (count per posting, concatenated positions) for positional
+    runs and None otherwise. Runs hold consecutive doc id ranges and heapq.merge keeps
+    equal terms in run order, so concatenating a term's pieces keeps its doc ids sorted.
+    """
+    merged = heapq.merge(*(_read_run(path, positions) for path in run_paths), key=lambda entry: entry[0])
+    current_term, pieces = None, []
+    for term, run_documents, run_frequencies, run_positions in merged:
+        if term != current_term:
+            if current_term is not None:
+                yield _join_pieces(current_term, pieces)
+            current_term, pieces = term, []
+        pieces.append((run_documents, run_frequencies, run_positions))
+    if current_term is not None:
+        yield _join_pieces(current_term, pieces)
+
+
+def _join_pieces(term, pieces):
+    documents = np.concatenate([piece[0] for piece in pieces])
+    frequencies = np.concatenate([piece[1] for piece in pieces])
+    positions = None
+    if pieces[0][2] is not None:
+        positions = (np.concatenate([piece[2][0] for piece in pieces]),
+                     np.concatenate([piece[2][1] for piece in pieces]))
+    return term, documents, frequencies, positions
+
+
+class _JsonLines:
+    """Re-iterable view of a JSON-lines file, one record per line."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                yield json.loads(line)
+
+
+def build_index_spimi(documents, index_path, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, link_graph_path=None,
+                      read_stats=None, temp_dir=None, keep_links=False, positions=False, aliases=None,
+                      docstore=False):
+    """
+    Index a stream of tokenized documents (as produced by read_json_files.iter_documents)
+    into a segment at `index_path` without holding the whole index in memory. Doc ids are
+    assigned in stream order, exactly like build_inverted_index. URLs and outlinks are
+    spooled to disk alongside the runs and used for the document table and PageRank.
+    `read_stats` is the stats dict filled in by iter_documents, if any. With `keep_links`
+    the spooled URLs and outlinks are kept in the segment as links.jsonl. With `positions`
+    the documents' token positions (see read_json_files.process_file) are indexed too.
+    Documents fingerprinted by a dedup.Deduplicator have their fingerprints stored, and
+    `aliases` ({doc id: [URLs]}, such as Deduplicator.aliases; only read once the stream
+    is exhausted) is stored and folded into the link graph. With `docstore` the documents'
+    cleaned "text" (and "important_text", for tier 1, see champions.py) is kept in a
+    compressed document store for result snippets.
+
+    Returns the number of documents indexed.
+    """
+    memory_budget = memory_budget_mb * 1024 * 1024
+    work_dir = tempfile.mkdtemp(prefix="spimi-", dir=temp_dir)
+    run_paths = []
+    doc_lengths = array("I")
+    fingerprints = []
+
+    try:
+        metadata_path = os.path.join(work_dir, "documents.jsonl")
+        block = {}
+        block_bytes = 0
+        docstore_writer = DocStoreWriter(work_dir) if docstore else None
+
+        with open(metadata_path, "w", encoding="utf-8") as metadata_file:
+            for doc_id, document in enumerate(documents):
+                term_frequencies = document_term_frequencies(document)
+                term_positions = dict(document["positions"]) if positions else None
+
+                for token, freq in term_frequencies.items():
+                    postings = block.get(token)
+                    if postings is None:
+                        postings = block[token] = tuple(array("I") for _ in range(4 if positions else 2))
+                        block_bytes += TERM_OVERHEAD_BYTES + len(token)
+                    postings[0].append(doc_id)
+                    postings[1].append(freq)
+                    if positions:
+                        token_positions = term_positions.get(token, ())
+                        postings[2].append(len(token_positions))
+                        postings[3].extend(token_positions)
+                        block_bytes += POSITION_BYTES * (len(token_positions) + 1)
+                block_bytes += POSTING_BYTES * len(term_frequencies)
+
+                doc_lengths.append(sum(term_frequencies.values()))
+                fingerprints.append(document.get("fingerprint"))
+                if docstore_writer is not None:
+                    docstore_writer.add(document.get("text", ""), important=document.get("important_text"))
+                metadata_file.write(json.dumps({"url": document["url"], "links": document.get("links", [])}) + "\n")
+
+                if block_bytes >= memory_budget:
+                    run_paths.append(os.path.join(work_dir, f"run-{len(run_paths):05d}.bin"))
+                    _write_run(block, run_paths[-1])
+                    print(f"Flushed run {len(run_paths)} at {doc_id + 1} documents")
+                    block, block_bytes = {}, 0
+
+        if docstore_writer is not None:
+            docstore_writer.finish()
+        if block:
+            run_paths.append(os.path.join(work_dir, f"run-{len(run_paths):05d}.bin"))
+            _write_run(block, run_paths[-1])
+        del block
+
+        num_docs = len(doc_lengths)
+        print(f"Merging {len(run_paths)} runs for {num_docs} documents...")
+
+        metrics.count("spimi_runs", len(run_paths))
+        writer = SegmentWriter(index_path, np.frombuffer(doc_lengths, dtype=np.uint32) if num_docs else [],
+                               positions=positions)
+        for term, term_documents, term_frequencies, term_positions in merge_runs(run_paths, positions):
+            writer.add_term(term, term_documents, term_frequencies, positions=term_positions)
+
+        metadata = _JsonLines(metadata_path)
+        indptr, indices = build_link_graph(metadata, aliases)
+        if link_graph_path:
+            save_link_graph(indptr, indices, link_graph_path)
+        pagerank_scores, _ = compute_pagerank(indptr, indices)
+        del indptr, indices
+
+        if None in fingerprints:
+            fingerprints = None
+        writer.finish((record["url"] for record in metadata), pagerank_scores, fingerprints=fingerprints,
+                      aliases=aliases, total_files_read=(read_stats or {}).get("total_files_read", num_docs),
+                      spimi_runs=len(run_paths))
+        if keep_links:
+            shutil.move(metadata_path, os.path.join(index_path, LINKS_FILE))
+        if docstore:
+            for name in DOCSTORE_FILES:
+                shutil.move(os.path.join(work_dir, name), os.path.join(index_path, name))
+        return num_docs
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
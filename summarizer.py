@@ -1,21 +1,112 @@
-from transformers import pipeline
+import os
+import sys
+import time
+import argparse
+
+# Offline abstractive summaries, stored in the index's docstore (docstore.py) and shown
+# in place of query-biased snippets once present.
+#
+#   python summarizer.py [--index PATH] [--batch-size 8] [--limit N]
+#
+# The model (SUMMARY_MODEL, a Hugging Face name or a local directory) is loaded on first
+# use and only from local files, so importing this module is free and nothing is ever
+# downloaded. Documents that already have a summary are skipped, so the job can be rerun
+# after every update to summarize just the new pages.
+
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "facebook/bart-large-cnn")
+MAX_INPUT_CHARS = 4000   # About the model's 1024-token input limit
+MIN_TEXT_CHARS = 500     # Shorter pages read fine as a snippet
+
+_summarizer = None
+
+
+def load_summarizer(model=SUMMARY_MODEL):
+    """The summarization pipeline, loaded once (raises ImportError without transformers)."""
+    global _summarizer
+    if _summarizer is None:
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")  # Local models only
+        from transformers import pipeline
+        _summarizer = pipeline("summarization", model=model)
+    return _summarizer
+
+
+def _two_sentences(summarized_text):
+    sentences = summarized_text.split(". ")  # Split into sentences
+    if len(sentences) > 2:
+        return ". ".join(sentences[:2]) + "."  # Return only first 2 sentences
+    return summarized_text  # If already short, return full summary
+
+
+def generate_summaries(texts, batch_size=8):
+    """Two-sentence summaries of several texts, run through the model in batches."""
+    summaries = load_summarizer()([text[:MAX_INPUT_CHARS] for text in texts], max_length=50, min_length=20,
+                                  do_sample=False, truncation=True, batch_size=batch_size)
+    return [_two_sentences(summary["summary_text"]) for summary in summaries]
 
-# Load a small, fast summarization model
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
 
 def generate_summary(text):
     """Summarizes text into two concise sentences."""
     try:
-        summary = summarizer(text, max_length=50, min_length=20, do_sample=False)
-        summarized_text = summary[0]['summary_text']
-        
-        # Ensure only 2 sentences are returned
-        sentences = summarized_text.split(". ")  # Split into sentences
-        if len(sentences) > 2:
-            return ". ".join(sentences[:2]) + "."  # Return only first 2 sentences
-        
-        return summarized_text  # If already short, return full summary
-
+        return generate_summaries([text])[0]
     except Exception as e:
         print(f"Error generating summary: {e}")
         return "Summary unavailable."
+
+
+def summarize_index(index_path, batch_size=8, limit=None):
+    """
+    Summarize every document of an index (segment or incremental index directory) that has
+    stored text but no summary yet, and write the summaries into each segment's docstore.
+    Returns the number of summaries written.
+    """
+    from docstore import rewrite_docstore
+    from search import load_index
+
+    index = load_index(index_path)
+    segments = getattr(index, "segments", [index])
+    written = 0
+    for segment in segments:
+        if not segment.has_docstore:
+            print(f"{segment.path} has no docstore; rebuild it with one to store summaries")
+            continue
+        pending = []
+        for doc_id in range(segment.num_docs):
+            document = segment.document(doc_id)
+            if "summary" not in document and len(document["text"]) >= MIN_TEXT_CHARS:
+                pending.append(doc_id)
+        if limit is not None:
+            pending = pending[:max(0, limit - written)]
+        if not pending:
+            continue
+
+        summaries = {}
+        start = time.perf_counter()
+        for offset in range(0, len(pending), batch_size):
+            batch = pending[offset:offset + batch_size]
+            texts = [segment.document(doc_id)["text"] for doc_id in batch]
+            summaries.update(zip(batch, generate_summaries(texts, batch_size)))
+            print(f"Summarized {len(summaries)}/{len(pending)} documents of {segment.path} "
+                  f"({len(summaries) / (time.perf_counter() - start):.1f} documents/s)")
+        rewrite_docstore(segment.path, summaries)
+        written += len(summaries)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Store abstractive summaries in an index's docstore.")
+    parser.add_argument("--index", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "index"),
+                        help="Index directory or segment")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--limit", type=int, help="Summarize at most this many documents")
+    args = parser.parse_args(argv)
+    try:
+        load_summarizer()
+    except Exception as e:  # transformers missing, or the model isn't available locally
+        print(f"Cannot load the summarization model {SUMMARY_MODEL!r}: {e}", file=sys.stderr)
+        return 1
+    print(f"Stored {summarize_index(args.index, args.batch_size, args.limit)} summaries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# Check that vectorized batch search returns the same rankings as search.search
+import os
+import json
+import random
+import tempfile
+import numpy as np
+from batch_search import TermDocumentMatrix, search_batch, main
+from search import load_index, search
+from segment import write_segment
+from test_ranked_query import build_random_index
+
+
+def random_queries(terms, count, seed=5):
+    rng = random.Random(seed)
+    queries = [" ".join(rng.sample(terms, rng.randint(1, 4))) for _ in range(count)]
+    wildcards = [f"{term[:2]}* {rng.choice(terms)}" for term in rng.sample(terms, 10)]
+    return queries + wildcards + ["", "missing", f"{terms[0]} missing", "t1*", "zz*", f"{terms[1]} zz*"]
+
+
+def test_batch_matches_search():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=800)
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        index = load_index(path)
+        queries = random_queries(sorted(inverted_index), 300)
+
+        matrix = TermDocumentMatrix.from_index(index)
+        matrix.save(os.path.join(folder, "matrix.npz"))
+        loaded = TermDocumentMatrix.load(os.path.join(folder, "matrix.npz"))
+        assert loaded.terms == matrix.terms and (loaded.weights != matrix.weights).nnz == 0
+
+        # Small chunks exercise the chunking; results must not depend on it
+        for query, results in search_batch(queries, index, k=5, matrix=loaded, chunk_size=7):
+            expected = search(query, index, k=5, cache=None)
+            assert [result[0] for result in results] == [result[0] for result in expected], query
+            assert np.allclose([result[1] for result in results], [result[1] for result in expected])
+
+
+def test_batch_cli_writes_jsonl():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        queries = random_queries(sorted(inverted_index), 20)
+        with open(os.path.join(folder, "queries.txt"), "w", encoding="utf-8") as file:
+            file.write("\n".join(queries))
+
+        output = os.path.join(folder, "results.jsonl")
+        assert main([os.path.join(folder, "queries.txt"), "--index", path, "--k", "3", "--output", output]) == 0
+        with open(output, "r", encoding="utf-8") as file:
+            lines = [json.loads(line) for line in file]
+        assert [line["query"] for line in lines] == [query for query in queries if query]
+        assert all(len(line["results"]) <= 3 for line in lines)
+
+
+if __name__ == "__main__":
+    test_batch_matches_search()
+    test_batch_cli_writes_jsonl()
+    print("Batch search matches search.search.")
@@ -0,0 +1,40 @@
+# Check the synthetic corpus generator and the regression comparison of the benchmark suite
+import os
+import json
+import tempfile
+from benchmark_suite import generate_corpus, compare_results
+from read_json_files import discover_files
+
+
+def test_generate_corpus_is_deterministic():
+    with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+        generate_corpus(first, num_pages=30, seed=7, vocabulary_size=500)
+        generate_corpus(second, num_pages=30, seed=7, vocabulary_size=500)
+        first_files = sorted(os.path.relpath(path, first) for path in discover_files(first))
+        second_files = sorted(os.path.relpath(path, second) for path in discover_files(second))
+        assert len(first_files) == 30 and first_files == second_files
+
+        with open(os.path.join(first, first_files[0]), "r", encoding="utf-8") as file:
+            page = json.load(file)
+        with open(os.path.join(second, first_files[0]), "r", encoding="utf-8") as file:
+            assert json.load(file) == page
+        assert set(page) == {"url", "content", "encoding"} and "<title>" in page["content"]
+
+
+def test_compare_results_flags_regressions():
+    baseline = {"stages": {"query": {"queries_per_second": 100.0, "p99_ms": 10.0, "queries": 50},
+                           "save": {"index_mb": 2.0}}}
+    current = {"stages": {"query": {"queries_per_second": 80.0, "p99_ms": 9.0, "queries": 60},
+                          "save": {"index_mb": 2.1}}}
+    rows = {(stage, name): (change, regressed) for stage, name, _, _, change, regressed
+            in compare_results(baseline, current, threshold=0.1)}
+    assert set(rows) == {("query", "queries_per_second"), ("query", "p99_ms"), ("save", "index_mb")}
+    assert rows[("query", "queries_per_second")][1]  # 20% slower
+    assert not rows[("query", "p99_ms")][1] and rows[("query", "p99_ms")][0] > 0  # Lower latency is better
+    assert not rows[("save", "index_mb")][1]  # 5% bigger is within the threshold
+
+
+if __name__ == "__main__":
+    test_generate_corpus_is_deterministic()
+    test_compare_results_flags_regressions()
+    print("Benchmark suite checks passed.")
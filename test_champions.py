@@ -0,0 +1,114 @@
+# Check that answers from the tier-1 champion lists are exactly the full index's top k,
+# that important-text postings make the tier, and that updates only build the tiers of
+# new segments while merges carry them over
+import os
+import json
+import random
+import tempfile
+import numpy as np
+from champions import build_champions, open_champions, ChampionTier, champions_path, CHAMPIONS_FILE
+from incremental import update_index, force_merge
+from main import build_tier
+from query_processor import ranked_query
+from search import load_index, search
+from segment import write_segment, open_segment
+from test_incremental import WORDS
+from test_lexicon import assert_same_results
+from test_ranked_query import build_random_index
+
+
+def check_tier(tier, index, queries, k=5):
+    """Every answer the tier gives matches the full ranking. Returns how many it answered."""
+    answered = 0
+    for query in queries:
+        for conjunctive in (True, False):
+            expected = ranked_query(query, index, index.doc_lengths, index.pagerank_scores, k, conjunctive)
+            results = tier.ranked_query(query, index, index, k, conjunctive)
+            if results is not None:
+                assert_same_results(results, expected, (query, conjunctive))
+                answered += 1
+            matching = {doc_id for doc_id, _ in ranked_query(query, index, index.doc_lengths, index.pagerank_scores,
+                                                             index.num_docs, conjunctive)}
+            loose = tier.ranked_query(query, index, index, k, conjunctive, exact=False)
+            assert len(loose) <= k and {doc_id for doc_id, _ in loose} <= matching  # Possibly not the top k
+    return answered
+
+
+def test_tier_matches_full_ranking():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=3000, vocabulary=80)
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    rng = random.Random(5)
+    terms = sorted(inverted_index)
+    queries = [rng.sample(terms, rng.randint(1, 3)) for _ in range(150)] + [["t1", "missing"], ["t2", "t2"]]
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "segment"), inverted_index, urls, pagerank_scores, doc_lengths)
+        segment = open_segment(os.path.join(folder, "segment"))
+        info = build_champions(segment)  # Lists of ~200 postings: every tier is partial
+        assert info["tier_postings"] < info["postings"] / 5 and info["bytes"] > 0
+        tier = open_champions(segment)
+        assert tier is not None and tier.is_current(segment)
+        assert check_tier(tier, segment, queries) > 0
+        assert tier.ranked_query(["t1*"], segment) is None  # Prefix queries always use the full lists
+        assert tier.ranked_query(["t1", "missing"], segment) == []
+
+
+def write_page(data_folder, name, url, title, words):
+    os.makedirs(data_folder, exist_ok=True)
+    html = f"<html><head><title>{' '.join(title)}</title></head><body><p>{' '.join(words)}</p></body></html>"
+    with open(os.path.join(data_folder, name), "w", encoding="utf-8") as file:
+        json.dump({"url": url, "content": html}, file)
+
+
+def test_incremental_tier():
+    rng = random.Random(6)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number in range(300):
+            title = ["rare"] if number == 17 else rng.choices(WORDS, k=2)
+            write_page(data_folder, f"{number:04d}.json", f"https://www.ics.uci.edu/page{number}", title,
+                       rng.choices(WORDS, k=rng.randint(20, 400)))
+        update_index(index_dir, data_folder)
+        assert load_index(index_dir).champions is None
+        info = build_tier(index_dir)
+        assert info["important_postings"] >= 300 and build_tier(index_dir) == info  # Current: not rebuilt
+
+        index = load_index(index_dir)
+        tier = index.champions
+        assert isinstance(tier, ChampionTier) and tier.info["tier_postings"] < tier.info["postings"]
+        page17 = next(doc_id for doc_id in range(index.num_docs) if index.url(doc_id).endswith("/page17"))
+        assert page17 in tier.entry("rare")[1]
+        queries = [rng.sample(WORDS, rng.randint(1, 3)) for _ in range(60)]
+        assert check_tier(tier, index, queries) > 0
+        full = load_index(index_dir)
+        full.champions = None
+        for query in queries[:20]:
+            results, expected = search(" ".join(query), index, cache=None), search(" ".join(query), full, cache=None)
+            assert [result[:1] + result[2:] for result in results] == [result[:1] + result[2:] for result in expected]
+            assert np.allclose([result[1] for result in results], [result[1] for result in expected])
+
+        # An update adds a delta segment without a tier, so tier 1 is unused until the delta's
+        # own is built; the base keeps its tier under the new PageRank and tombstones
+        base_info = os.path.join(champions_path(index.segments[0]), CHAMPIONS_FILE)
+        built = os.stat(base_info).st_mtime_ns
+        write_page(data_folder, "0300.json", "https://www.ics.uci.edu/page300", ["rare"], ["word1"] * 50)
+        write_page(data_folder, "0017.json", "https://www.ics.uci.edu/page17", ["common"], ["word2"] * 30)
+        update_index(index_dir, data_folder)
+        assert load_index(index_dir).champions is None
+        info = build_tier(index_dir)
+        assert info["segments"] == 2 and info["missing"] == 0 and os.stat(base_info).st_mtime_ns == built
+        index = load_index(index_dir)
+        assert index.champions is not None and check_tier(index.champions, index, queries + [["rare"]]) > 0
+        rare = index.champions.entry("rare")[1].tolist()
+        assert [index.url(doc_id) for doc_id in rare] == ["https://www.ics.uci.edu/page300"]
+
+        # A merged segment gets its tier with the merge
+        force_merge(index_dir)
+        index = load_index(index_dir)
+        assert len(index.segments) == 1 and index.champions is not None
+        assert check_tier(index.champions, index, queries) > 0
+
+
+if __name__ == "__main__":
+    test_tier_matches_full_ranking()
+    test_incremental_tier()
+    print("Champion list checks passed.")
@@ -0,0 +1,140 @@
+# Check duplicate detection: SimHash distances, the banded lookup against brute force, and that
+# copies collapse into aliases in the SPIMI builder and across incremental updates
+import os
+import json
+import random
+import tempfile
+import numpy as np
+from dedup import Deduplicator, simhash, fingerprint, MAX_HAMMING_DISTANCE
+from incremental import update_index, force_merge
+from search import load_index
+from segment import open_segment
+from segment_set import load_manifest
+from spimi import build_index_spimi
+from test_incremental import WORDS
+
+VOCABULARY = [f"term{index}" for index in range(2000)]
+
+
+def document(url, terms, links=()):
+    counts = {}
+    for term in terms:
+        counts[term] = counts.get(term, 0) + 1
+    return {"url": url, "regular_terms": list(counts.items()), "important_terms": [], "links": list(links)}
+
+
+def test_simhash_distances():
+    rng = random.Random(1)
+    text = rng.sample(VOCABULARY, 300)
+    edited = text[:-1] + ["edited"]
+    unrelated = rng.sample(VOCABULARY, 300)
+    base = simhash(dict.fromkeys(text, 1))
+    assert (base ^ simhash(dict.fromkeys(edited, 1))).bit_count() <= MAX_HAMMING_DISTANCE
+    assert (base ^ simhash(dict.fromkeys(unrelated, 1))).bit_count() > 10
+    assert fingerprint(document("a", text))[0] == fingerprint(document("b", list(reversed(text))))[0]
+    assert fingerprint(document("a", text))[0] != fingerprint(document("b", edited))[0]
+
+
+def test_band_lookup_matches_brute_force():
+    rng = random.Random(2)
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    for _ in range(300):  # Planted near copies, 0 to 5 bits away
+        flips = rng.sample(range(64), rng.randint(0, 5))
+        values.append(rng.choice(values) ^ sum(1 << bit for bit in flips))
+
+    deduplicator = Deduplicator()
+    kept = []
+    for key, value in enumerate(values):
+        found, _ = deduplicator.find(key, value, 100)  # Keys double as exact hashes, which never repeat
+        expected = next((other for other in kept if (values[other] ^ value).bit_count() <= MAX_HAMMING_DISTANCE),
+                        None)
+        assert (found is None) == (expected is None)
+        if found is None:
+            deduplicator.add(key, key, value, 100)
+            kept.append(key)
+        else:
+            assert (values[found] ^ value).bit_count() <= MAX_HAMMING_DISTANCE
+    assert deduplicator.stats["comparisons"] < len(values) * len(kept) / 100
+
+
+def test_spimi_collapses_duplicates():
+    rng = random.Random(3)
+    documents, expected_aliases = [], {}
+    for doc_id in range(60):
+        documents.append(document(f"https://www.ics.uci.edu/page{doc_id}", rng.sample(VOCABULARY, 200)))
+    # Trailing slash, a query variant and a calendar view with one word changed
+    for source, url, edit in [(3, "https://www.ics.uci.edu/page3/", False),
+                              (3, "https://www.ics.uci.edu/page3?sort=asc", False),
+                              (7, "https://www.ics.uci.edu/calendar?month=5", True)]:
+        terms = [term for term, _ in documents[source]["regular_terms"]]
+        documents.append(document(url, terms[:-1] + ["may"] if edit else terms))
+        expected_aliases.setdefault(source, []).append(url)
+    # Pages linking to the copies only
+    documents += [document(f"https://www.ics.uci.edu/linker{number}", rng.sample(VOCABULARY, 30),
+                           ["https://www.ics.uci.edu/page3/", "https://www.ics.uci.edu/calendar?month=5"])
+                  for number in range(5)]
+
+    deduplicator = Deduplicator()
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        num_docs = build_index_spimi(deduplicator.filter(iter(documents)), path, temp_dir=folder,
+                                     aliases=deduplicator.aliases)
+        segment = open_segment(path)
+        assert num_docs == len(documents) - 3
+        assert (deduplicator.stats["exact_duplicates"], deduplicator.stats["near_duplicates"]) == (2, 1)
+        assert deduplicator.stats["postings_saved"] == 600
+        assert {doc_id: segment.aliases(doc_id) for doc_id in (3, 7)} == expected_aliases
+        assert segment.aliases(0) == []
+        assert len(segment.fingerprints) == num_docs
+        # In-links to the aliases count for the canonical pages
+        assert segment.pagerank_scores[3] > 2 * np.median(segment.pagerank_scores)
+        assert segment.pagerank_scores[7] > 2 * np.median(segment.pagerank_scores)
+
+
+def write_html(data_folder, name, url, words):
+    os.makedirs(data_folder, exist_ok=True)
+    html = f"<html><body><p>{' '.join(words)}</p></body></html>"
+    with open(os.path.join(data_folder, name), "w", encoding="utf-8") as file:
+        json.dump({"url": url, "content": html}, file)
+
+
+def test_incremental_aliases():
+    rng = random.Random(4)
+    pages = {number: rng.choices(WORDS, k=60) for number in range(20)}
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number, words in pages.items():
+            write_html(data_folder, f"{number:04d}.json", f"https://www.ics.uci.edu/page{number}", words)
+        write_html(data_folder, "0100.json", "https://www.ics.uci.edu/page1/", pages[1])
+        stats = update_index(index_dir, data_folder)
+        assert (stats["documents"], stats["duplicates"]) == (20, 1)
+
+        # A later copy of an indexed page is collapsed into it, across segments
+        write_html(data_folder, "0101.json", "https://www.ics.uci.edu/page2?view=print", pages[2])
+        stats = update_index(index_dir, data_folder)
+        assert (stats["documents"], stats["duplicates"]) == (0, 1)
+        files = load_manifest(index_dir)["files"]
+        assert files["0101.json"]["doc"] == files["0002.json"]["doc"]
+        index = load_index(index_dir)
+        page2 = next(doc_id for doc_id in range(index.num_docs) if index.url(doc_id).endswith("page2"))
+        assert index.aliases(page2) == ["https://www.ics.uci.edu/page2?view=print"]
+
+        # Deleting a canonical page brings its copy back as a document of its own
+        os.remove(os.path.join(data_folder, "0001.json"))
+        stats = update_index(index_dir, data_folder)
+        assert (stats["documents"], stats["duplicates"]) == (1, 0)
+        force_merge(index_dir)
+        index = load_index(index_dir)
+        urls = [index.url(doc_id) for doc_id in range(index.num_docs)]
+        assert "https://www.ics.uci.edu/page1/" in urls and "https://www.ics.uci.edu/page1" not in urls
+        assert len(index.fingerprints) == index.num_docs == 20
+        page2 = urls.index("https://www.ics.uci.edu/page2")
+        assert index.aliases(page2) == ["https://www.ics.uci.edu/page2?view=print"]
+
+
+if __name__ == "__main__":
+    test_simhash_distances()
+    test_band_lookup_matches_brute_force()
+    test_spimi_collapses_duplicates()
+    test_incremental_aliases()
+    print("Dedup checks passed.")
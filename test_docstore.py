@@ -0,0 +1,105 @@
+# Check the compressed docstore (round trip, summaries, carried through merges, reorders and
+# shards) and query-biased snippets
+import os
+import time
+import random
+import tempfile
+from docstore import DocStore, DocStoreWriter, rewrite_docstore, BLOCK_BYTES
+from incremental import update_index, force_merge, reorder_index
+from search import load_index, search
+from sharding import split_index, open_sharded_index
+from snippets import snippet, find_terms, result_summary, NO_SUMMARY, SNIPPET_CHARS
+from test_dedup import write_html
+from test_incremental import WORDS
+
+
+def test_docstore_round_trip():
+    rng = random.Random(1)
+    texts = [" ".join(rng.choices(WORDS, k=rng.randint(0, 3000))) for _ in range(200)]
+    with tempfile.TemporaryDirectory() as folder:
+        writer = DocStoreWriter(folder)
+        for text in texts:
+            writer.add(text)
+        assert writer.finish() == len(texts)
+        assert os.path.getsize(os.path.join(folder, "docstore.dat")) < sum(map(len, texts)) / 2
+
+        store = DocStore(folder)
+        assert store.entries is None  # Nothing read until the first lookup
+        for doc_id in rng.sample(range(len(texts)), 50):
+            assert store.get(doc_id) == {"text": texts[doc_id]}
+        assert len({int(entry["block_offset"]) for entry in store.entries}) > sum(map(len, texts)) // BLOCK_BYTES // 2
+
+        rewrite_docstore(folder, {3: "Summary three.", 150: "Summary 150."})
+        store = DocStore(folder)
+        assert store.get(3) == {"text": texts[3], "summary": "Summary three."}
+        assert store.get(150)["summary"] == "Summary 150."
+        assert [store.get(doc_id)["text"] for doc_id in range(len(texts))] == texts
+
+
+def test_snippets():
+    text = ("The department offers courses. " * 30 + "Our faculty teach machine learning and research "
+            "in machine learning systems. " + "Other news follows here. " * 30)
+    result = snippet(text, ["machin", "learn", "faculti"])
+    assert "faculty teach machine learning" in result and result.startswith("...") and result.endswith("...")
+    assert len(result) <= SNIPPET_CHARS + 40
+    assert snippet(text, ["nowher"]).startswith("The department")
+    assert snippet("Short page.", ["page"]) == "Short page."
+    assert [term for _, _, term in find_terms("Studies, STUDYING and studied", ["studi"])] == ["studi"] * 3
+
+    # A long page (about 20 KB) with hundreds of matches: under a millisecond per snippet
+    rng = random.Random(2)
+    long_text = " ".join(rng.choices(WORDS + ["Research", "learning", "learned"], k=3000))
+    start = time.perf_counter()
+    for _ in range(50):
+        snippet(long_text, ["research", "learn"])
+    assert (time.perf_counter() - start) / 50 < 0.001
+
+
+def test_incremental_docstore():
+    rng = random.Random(3)
+    pages = {number: rng.choices(WORDS, k=80) for number in range(30)}
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number, words in pages.items():
+            write_html(data_folder, f"{number:04d}.json", f"https://www.ics.uci.edu/page{number}", words)
+        update_index(index_dir, data_folder)
+        for number in range(25, 35):
+            pages[number] = rng.choices(WORDS, k=80)
+            write_html(data_folder, f"{number:04d}.json", f"https://www.ics.uci.edu/page{number}", pages[number])
+        update_index(index_dir, data_folder)
+
+        def check(index):
+            assert index.has_docstore
+            for doc_id in range(index.num_docs):
+                if index.deleted is not None and index.deleted[doc_id]:
+                    continue  # Old versions of the changed pages
+                number = int(index.url(doc_id).rsplit("page", 1)[1])
+                assert index.document(doc_id)["text"] == " ".join(pages[number])
+
+        check(load_index(index_dir))
+        force_merge(index_dir)
+        check(load_index(index_dir))
+        reorder_index(index_dir, "url")
+        index = load_index(index_dir)
+        check(index)
+
+        rewrite_docstore(index.segments[0].path, {0: "A stored summary."})
+        index = load_index(index_dir)
+        assert result_summary(index, 0, ["word1"]) == "A stored summary."
+        results = search(" ".join(pages[7][:2]), index, cache=None)
+        assert results and all(summary != NO_SUMMARY for _, _, _, summary in results)
+        page7 = next(summary for _, _, url, summary in results if url.endswith("/page7"))
+        assert page7.startswith(" ".join(pages[7][:2]))
+
+        split_index(index, os.path.join(folder, "shards"), 3)
+        sharded = open_sharded_index(os.path.join(folder, "shards"), workers=1)
+        assert [sharded.document(doc_id) for doc_id in range(index.num_docs)] == \
+            [index.document(doc_id) for doc_id in range(index.num_docs)]
+        sharded.close()
+
+
+if __name__ == "__main__":
+    test_docstore_round_trip()
+    test_snippets()
+    test_incremental_docstore()
+    print("Docstore checks passed.")
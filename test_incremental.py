@@ -0,0 +1,196 @@
+# Check that incremental updates (delta segments, tombstones, merges) rank exactly like a full rebuild
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from incremental import update_index, force_merge, find_merge, run_merges, start_background_merge
+from query_processor import ranked_query
+from read_json_files import iter_documents
+from search import load_index
+from segment_set import load_manifest
+from spimi import build_index_spimi
+
+WORDS = [f"word{index}" for index in range(80)]
+
+
+def write_page(data_folder, number, rng, version=0):
+    host = f"host{number % 3}.ics.uci.edu"
+    os.makedirs(os.path.join(data_folder, host), exist_ok=True)
+    body = " ".join(rng.choices(WORDS, k=rng.randint(5, 40)))
+    links = "".join(f'<a href="https://host{target % 3}.ics.uci.edu/page{target}">link</a>'
+                    for target in rng.sample(range(60), 3))
+    html = f"<html><title>page {number} v{version}</title><body><p>{body}</p>{links}</body></html>"
+    with open(os.path.join(data_folder, host, f"{number:04d}.json"), "w", encoding="utf-8") as file:
+        json.dump({"url": f"https://{host}/page{number}", "content": html}, file)
+
+
+def all_scores(index):
+    """url -> score of every document matching any word, for a tie-free comparison."""
+    tokens = [word for word in WORDS if word in index]
+    results = ranked_query(tokens, index, index.doc_lengths, index.pagerank_scores, k=10_000, conjunctive=False)
+    return {index.url(doc_id): score for doc_id, score in results}
+
+
+def assert_matches_rebuild(index, data_folder, folder):
+    reference_path = os.path.join(folder, "reference")
+    build_index_spimi(iter_documents(data_folder=data_folder), reference_path, temp_dir=folder)
+    expected = all_scores(load_index(reference_path))
+    actual = all_scores(index)
+    assert actual.keys() == expected.keys()
+    for url, score in expected.items():
+        assert np.isclose(actual[url], score), url
+
+
+def test_incremental_updates_match_rebuild():
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder = os.path.join(folder, "DEV")
+        index_dir = os.path.join(folder, "index")
+        for number in range(40):
+            write_page(data_folder, number, rng)
+        stats = update_index(index_dir, data_folder)
+        assert stats["added"] == 40 and stats["generation"] == 1
+
+        # Adds only: document counts are exact, so scores already equal a rebuild
+        for number in range(40, 50):
+            write_page(data_folder, number, rng)
+        stats = update_index(index_dir, data_folder)
+        assert (stats["added"], stats["documents"], stats["unchanged"]) == (10, 10, 40)
+        assert len(load_manifest(index_dir)["segments"]) == 2
+        assert_matches_rebuild(load_index(index_dir), data_folder, folder)
+
+        # Nothing changed, or only the mtime: no new generation
+        path = os.path.join(data_folder, "host0.ics.uci.edu", "0003.json")
+        os.utime(path, (1, 1))
+        stats = update_index(index_dir, data_folder)
+        assert stats["documents"] == 0 and stats["generation"] == 2
+
+        # Change and delete pages: old versions disappear at once
+        for number in (3, 7, 45):
+            write_page(data_folder, number, rng, version=1)
+        os.remove(os.path.join(data_folder, "host1.ics.uci.edu", "0010.json"))
+        stats = update_index(index_dir, data_folder)
+        assert (stats["changed"], stats["deleted"], stats["documents"]) == (3, 1, 3)
+        index = load_index(index_dir)
+        assert index.header["deleted_docs"] == 4
+        urls = [index.url(doc_id) for doc_id, _ in ranked_query(["page"], index, index.doc_lengths,
+                                                                index.pagerank_scores, k=100)]
+        assert len(urls) == 49 and len(set(urls)) == 49
+        assert "https://host1.ics.uci.edu/page10" not in urls
+        assert index.url(50) == "https://host0.ics.uci.edu/page3"  # New versions go in the third segment
+        assert index.url(index.bases[-1] - 1) == "https://host1.ics.uci.edu/page7"
+
+        # Merging drops the tombstones, after which scores equal a rebuild again
+        force_merge(index_dir)
+        index = load_index(index_dir)
+        assert index.header["num_segments"] == 1 and index.header["deleted_docs"] == 0
+        assert index.num_docs == 49
+        assert_matches_rebuild(index, data_folder, folder)
+
+
+def test_size_tiered_policy():
+    def segments(*sizes):
+        return [{"name": f"seg-{position}", "num_docs": size, "deleted": []} for position, size in enumerate(sizes)]
+
+    assert find_merge(segments(50_000, 5, 5, 5), merge_factor=4) == []
+    assert find_merge(segments(50_000, 5, 5, 5, 5), merge_factor=4) == [1, 2, 3, 4]
+    assert find_merge(segments(2000, 2000, 3000, 3500, 5), merge_factor=4) == [0, 1, 2, 3]
+    mostly_deleted = segments(50_000, 200)
+    mostly_deleted[0]["deleted"] = list(range(30_000))
+    assert find_merge(mostly_deleted, merge_factor=4) == [0]
+
+
+def test_merges_compact_deltas():
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder = os.path.join(folder, "DEV")
+        index_dir = os.path.join(folder, "index")
+        for number in range(12):
+            write_page(data_folder, number, rng)
+            update_index(index_dir, data_folder)
+        assert len(load_manifest(index_dir)["segments"]) == 12
+
+        assert run_merges(index_dir, merge_factor=4) == 1  # The whole run of tier-0 segments at once
+        assert len(load_manifest(index_dir)["segments"]) == 1
+        assert_matches_rebuild(load_index(index_dir), data_folder, folder)
+
+
+def test_background_merge():
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder = os.path.join(folder, "DEV")
+        index_dir = os.path.join(folder, "index")
+        for number in range(4):
+            write_page(data_folder, number, rng)
+            update_index(index_dir, data_folder)
+        start_background_merge(index_dir, merge_factor=4).join()  # One pass
+        assert len(load_manifest(index_dir)["segments"]) == 1
+
+        # Periodic passes compact the deltas of updates made while it runs
+        stop = threading.Event()
+        thread = start_background_merge(index_dir, merge_factor=4, interval=0.05, stop=stop)
+        for number in range(4, 7):
+            write_page(data_folder, number, rng)
+            update_index(index_dir, data_folder)
+        deadline = time.monotonic() + 30
+        while len(load_manifest(index_dir)["segments"]) > 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stop.set()
+        thread.join()
+        assert len(load_manifest(index_dir)["segments"]) == 1
+        assert_matches_rebuild(load_index(index_dir), data_folder, folder)
+
+
+def start_python(code):
+    return subprocess.Popen([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL)
+
+
+def test_concurrent_index_processes():
+    rng = random.Random(6)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder = os.path.join(folder, "DEV")
+        index_dir = os.path.join(folder, "index")
+        for number in range(12):
+            write_page(data_folder, number, rng)
+            update_index(index_dir, data_folder)
+
+        # Another process holding the writer lock makes this one wait for it
+        holder = start_python(f"import time, incremental\nwith incremental._manifest_lock({index_dir!r}):\n"
+                              f"    print('locked', flush=True)\n    time.sleep(1.0)")
+        time.sleep(0.5)
+        write_page(data_folder, 12, rng)
+        start = time.perf_counter()
+        update_index(index_dir, data_folder)
+        assert time.perf_counter() - start > 0.3 and holder.wait() == 0
+
+        # Overlapping merges and updates neither lose updates nor delete each other's segments
+        mergers = [start_python(f"import incremental\nincremental.run_merges({index_dir!r}, merge_factor=4)")
+                   for _ in range(2)]
+        for number in range(13, 16):
+            write_page(data_folder, number, rng)
+            update_index(index_dir, data_folder)
+        assert [merger.wait() for merger in mergers] == [0, 0]
+        run_merges(index_dir, merge_factor=4)
+
+        manifest = load_manifest(index_dir)
+        assert len(manifest["files"]) == 16
+        names = {entry["name"] for entry in manifest["segments"]}
+        assert all(entry["doc"][0] in names for entry in manifest["files"].values())
+        assert all(os.path.isdir(os.path.join(index_dir, name)) for name in names)
+        assert not [name for name in os.listdir(index_dir) if name.endswith(".tmp")]
+        assert_matches_rebuild(load_index(index_dir), data_folder, folder)
+
+
+if __name__ == "__main__":
+    test_incremental_updates_match_rebuild()
+    test_size_tiered_policy()
+    test_merges_compact_deltas()
+    test_background_merge()
+    test_concurrent_index_processes()
+    print("Incremental indexing matches a full rebuild.")
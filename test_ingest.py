@@ -0,0 +1,22 @@
+# Check the ordered parallel map of the ingest stage: input order across chunks and
+# workers, and per-item failures that don't stop the stream
+from ingest import ordered_parallel_map
+
+
+def square_unless_seven(item):
+    if item % 7 == 0:
+        raise ValueError("multiple of seven")
+    return ("ok", item * item)
+
+
+def test_ordered_parallel_map():
+    items = list(range(1, 60))
+    expected = [("failed", f"{item}: multiple of seven") if item % 7 == 0 else ("ok", item * item) for item in items]
+    for workers, chunk_size, max_pending in [(1, 4, None), (2, 3, None), (2, 5, 1)]:
+        assert list(ordered_parallel_map(square_unless_seven, items, workers, chunk_size, max_pending)) == expected
+    assert list(ordered_parallel_map(square_unless_seven, [], workers=2, chunk_size=3)) == []
+
+
+if __name__ == "__main__":
+    test_ordered_parallel_map()
+    print("Ingest checks passed.")
@@ -0,0 +1,122 @@
+# Check the front-coded lexicon against a sorted list, and that prefix* queries over a
+# segment and over shards score like the expanded terms merged into one
+import os
+import random
+import tempfile
+import numpy as np
+from build_index import compute_document_stats
+from lexicon import LexiconWriter, Lexicon, PlainLexicon, PLAIN_TERM_FILES
+from query_processor import parse_query, ranked_query
+from search import complete
+from segment import write_segment, open_segment
+from sharding import split_index, open_sharded_index
+from snippets import find_terms
+from test_ranked_query import build_random_index
+
+
+def random_terms(rng, count=1000):
+    terms = set()
+    while len(terms) < count:
+        terms.add("".join(rng.choice("abcde") for _ in range(rng.randint(1, 7))))
+    return sorted(terms | {"été", "étude"}, key=lambda term: term.encode("utf-8"))  # "étude" < "été" as UTF-8
+
+
+def write_plain_terms(path, terms):
+    """The terms.dat/terms.idx layout of segments before the lexicon."""
+    encoded = [term.encode("utf-8") for term in terms]
+    with open(os.path.join(path, PLAIN_TERM_FILES[0]), "wb") as output:
+        output.write(b"".join(encoded))
+    offsets = np.cumsum([0] + [len(term) for term in encoded]).astype("<u8")
+    offsets.tofile(os.path.join(path, PLAIN_TERM_FILES[1]))
+
+
+def test_lexicon_lookups():
+    rng = random.Random(3)
+    terms = random_terms(rng)
+    frequencies = np.array([rng.randint(1, 50) for _ in terms])
+    with tempfile.TemporaryDirectory() as folder:
+        writer = LexiconWriter(folder)
+        for term in terms:
+            writer.add(term)
+        assert writer.finish() == len(terms)
+        write_plain_terms(folder, terms)
+
+        for lexicon in (Lexicon(folder, len(terms)), PlainLexicon(folder, len(terms))):
+            assert len(lexicon) == len(terms) and list(lexicon) == terms
+            assert all(lexicon.term_id(term) == term_id and lexicon.term(term_id) == term
+                       for term_id, term in enumerate(terms))
+            assert lexicon.term_id("f") == lexicon.term_id("") == lexicon.term_id("abcdeabc") == -1
+            for prefix in ["", "a", "cab", "eeeeeee", "f", "ét", "abcdeabcde"]:
+                expected = [(term_id, term) for term_id, term in enumerate(terms) if term.startswith(prefix)]
+                assert list(lexicon.prefix_terms(prefix)) == expected, prefix
+                ranked = sorted(expected, key=lambda entry: (-frequencies[entry[0]], entry[0]))[:10]
+                assert lexicon.complete(prefix, frequencies) == [(term, frequencies[term_id])
+                                                                 for term_id, term in ranked]
+
+    with tempfile.TemporaryDirectory() as folder:
+        assert LexiconWriter(folder).finish() == 0
+        empty = Lexicon(folder, 0)
+        assert list(empty) == [] and empty.term_id("a") == -1 and empty.complete("a", []) == []
+
+
+def merged_index(inverted_index, num_docs, prefix, name):
+    """A copy of the index with every term starting with `prefix` merged into the term `name`."""
+    merged = {term: postings for term, postings in inverted_index.items() if not term.startswith(prefix)}
+    frequencies = {}
+    for term, postings in inverted_index.items():
+        if term.startswith(prefix):
+            for doc_id, frequency in zip(postings["documents"], postings["frequency"]):
+                frequencies[doc_id] = frequencies.get(doc_id, 0) + frequency
+    merged[name] = {"documents": sorted(frequencies), "frequency": [frequencies[doc] for doc in sorted(frequencies)]}
+    compute_document_stats(merged, num_docs)  # Same document lengths: merging keeps every token
+    return merged
+
+
+def assert_same_results(results, expected, query):
+    assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected], query
+    assert np.allclose([score for _, score in results], [score for _, score in expected])
+
+
+def test_wildcard_queries():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=600)
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    merged = merged_index(inverted_index, len(doc_lengths), "t1", "merged")
+    assert parse_query("T1* t2") == (["t2", "t1*"], [])
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "segment"), inverted_index, urls, pagerank_scores, doc_lengths)
+        segment = open_segment(os.path.join(folder, "segment"))
+        assert [term for term, _ in segment.prefix_terms("t1")] == sorted(term for term in inverted_index
+                                                                           if term.startswith("t1"))
+        assert complete("machine t1", segment, 3) == segment.prefix_terms("t1", 3)
+        assert complete("t1*", segment, 3)[0][1] == max(len(inverted_index[term]["documents"])
+                                                         for term in inverted_index if term.startswith("t1"))
+
+        split_index(segment, os.path.join(folder, "shards"), 3)
+        sharded = open_sharded_index(os.path.join(folder, "shards"), workers=1)
+        try:
+            assert sharded.prefix_terms("t1") == segment.prefix_terms("t1")
+            for conjunctive in (True, False):
+                for query in (["t1*"], ["t1*", "t2"], ["t2", "t3*", "t45"], ["t9*", "x*"]):
+                    expected = ranked_query(query, inverted_index, doc_lengths, pagerank_scores, 10, conjunctive)
+                    if "t1*" in query:
+                        assert_same_results(expected, ranked_query([term.replace("t1*", "merged") for term in query],
+                                                                   merged, doc_lengths, pagerank_scores, 10,
+                                                                   conjunctive), query)
+                    assert_same_results(ranked_query(query, segment, segment.doc_lengths, segment.pagerank_scores,
+                                                     10, conjunctive), expected, query)
+                    assert_same_results(sharded.ranked_query(query, 10, conjunctive), expected, query)
+        finally:
+            sharded.close()
+
+
+def test_wildcard_snippet_terms():
+    text = "Computing and computers; a computation. Recomputed."
+    assert [text[start:end] for start, end, _ in find_terms(text, ["comput*"])] == ["Computing", "computers",
+                                                                                     "computation"]
+
+
+if __name__ == "__main__":
+    test_lexicon_lookups()
+    test_wildcard_queries()
+    test_wildcard_snippet_terms()
+    print("Lexicon checks passed.")
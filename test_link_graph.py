@@ -0,0 +1,73 @@
+# Check URL normalization, the CSR link graph and sparse PageRank against a dense
+# power iteration
+import numpy as np
+from link_graph import normalize_url, normalize_links, build_link_graph
+from scoring import compute_pagerank
+
+
+def test_normalize_url():
+    page = "https://www.ics.uci.edu/dept/about.html"
+    assert normalize_url("https://WWW.ICS.UCI.EDU/a#section") == "https://www.ics.uci.edu/a"
+    assert normalize_url("https://www.ics.uci.edu") == "https://www.ics.uci.edu/"
+    assert normalize_url("https://www.ics.uci.edu/a/") == "https://www.ics.uci.edu/a/"  # Kept: may be another page
+    assert normalize_url("people.html", page) == "https://www.ics.uci.edu/dept/people.html"
+    assert normalize_url("../index.html?x=1#top", page) == "https://www.ics.uci.edu/index.html?x=1"
+    assert normalize_url("//cs.uci.edu", page) == "https://cs.uci.edu/"
+    assert normalize_url("http://ics.uci.edu:80/a") == "http://ics.uci.edu/a"
+    assert normalize_url("https://ics.uci.edu:443/a") == "https://ics.uci.edu/a"
+    assert normalize_url("https://ics.uci.edu:8443/a") == "https://ics.uci.edu:8443/a"
+    for href in ["mailto:someone@uci.edu", "javascript:void(0)", "tel:123", "", None, "http://[bad/", "ftp://x.edu"]:
+        assert normalize_url(href, page) is None, href
+    assert normalize_links(page, ["#top", "about.html", "people.html", "people.html#x", "mailto:a@b"]) == [
+        "https://www.ics.uci.edu/dept/people.html"]
+
+
+def test_build_link_graph():
+    documents = [
+        {"url": "https://a.edu/", "links": ["https://b.edu/", "https://b.edu/", "https://a.edu/", "https://x.edu/"]},
+        {"url": "https://b.edu/", "links": ["https://c.edu/", "https://a.edu/"]},
+        {"url": "https://c.edu/", "links": ["https://b.edu/copy"]},
+        {"url": "https://d.edu/", "links": []},
+    ]
+    indptr, indices = build_link_graph(documents, aliases={1: ["https://b.edu/copy"]})
+    outlinks = [indices[indptr[doc_id]:indptr[doc_id + 1]].tolist() for doc_id in range(len(documents))]
+    assert outlinks == [[1], [0, 2], [1], []]  # No self-link, duplicate or unknown page; aliases resolved
+
+
+def dense_pagerank(indptr, indices, damping_factor=0.85):
+    num_docs = len(indptr) - 1
+    transitions = np.full((num_docs, num_docs), 1.0 / num_docs)  # Dangling pages link everywhere
+    for source in range(num_docs):
+        targets = indices[indptr[source]:indptr[source + 1]]
+        if len(targets):
+            transitions[:, source] = 0.0
+            transitions[targets, source] = 1.0 / len(targets)
+    google = damping_factor * transitions + (1 - damping_factor) / num_docs
+    scores = np.full(num_docs, 1.0 / num_docs)
+    for _ in range(1000):
+        scores = google @ scores
+    return scores
+
+
+def test_pagerank_matches_dense_reference():
+    indptr = np.array([0, 2, 3, 3, 5])  # 0 -> 1, 2; 1 -> 2; 2 dangling; 3 -> 0, 2
+    indices = np.array([1, 2, 2, 0, 2], dtype=np.int32)
+    scores, stats = compute_pagerank(indptr, indices, tolerance=1e-12)
+    assert stats["converged"] and stats["dangling"] == 1 and stats["residual"] < 1e-12
+    assert np.isclose(scores.sum(), 1.0) and np.allclose(scores, dense_pagerank(indptr, indices), atol=1e-10)
+    assert scores.argmax() == 2
+
+    _, loose_stats = compute_pagerank(indptr, indices, tolerance=1e-3)
+    one_less = compute_pagerank(indptr, indices, tolerance=0.0, max_iterations=loose_stats["iterations"] - 1)[1]
+    assert loose_stats["converged"] and loose_stats["residual"] < 1e-3 <= one_less["residual"]  # The first below it
+    assert loose_stats["iterations"] < stats["iterations"]
+    _, capped = compute_pagerank(indptr, indices, tolerance=1e-12, max_iterations=2)
+    assert (capped["iterations"], capped["converged"]) == (2, False)
+    assert len(compute_pagerank(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))[0]) == 0
+
+
+if __name__ == "__main__":
+    test_normalize_url()
+    test_build_link_graph()
+    test_pagerank_matches_dense_reference()
+    print("Link graph checks passed.")
@@ -0,0 +1,84 @@
+# Check the command line: subcommands, JSON output, exit codes, and that heavy modules are
+# only imported by the subcommands that need them
+import io
+import os
+import sys
+import json
+import contextlib
+import random
+import tempfile
+import subprocess
+import main
+from test_dedup import write_html
+from test_incremental import WORDS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(code):
+    process = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    return process.stdout
+
+
+def run_main(*argv):
+    """Exit status and stdout of a subcommand."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = main.main(list(argv))
+    return status, output.getvalue()
+
+
+def test_heavy_imports_are_lazy():
+    loaded = run_python("import sys, main; print(sorted(m for m in ('numpy', 'nltk', 'scipy', 'tkinter') "
+                        "if m in sys.modules))")
+    assert loaded.strip() == "[]"
+
+
+def test_subcommands():
+    rng = random.Random(1)
+    pages = {number: rng.choices(WORDS, k=60) for number in range(20)}
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number, words in pages.items():
+            write_html(data_folder, f"{number:04d}.json", f"https://www.ics.uci.edu/page{number}", words)
+
+        assert run_main("stats", "--index", index_dir)[0] == main.EXIT_NO_INDEX
+        status, output = run_main("index", "--data", data_folder, "--index", index_dir, "--workers", "1", "--json")
+        assert status == main.EXIT_OK and json.loads(output)["documents"] == 20
+        status, output = run_main("index", "--data", data_folder, "--index", index_dir, "--workers", "1", "--json")
+        assert status == main.EXIT_OK and json.loads(output)["unchanged"] == 20
+
+        status, output = run_main("stats", "--index", index_dir, "--json")
+        stats = json.loads(output)
+        assert (stats["documents"], len(stats["segments"]), stats["docstore"]) == (20, 1, True)
+
+        query = " ".join(pages[3][:2])
+        status, output = run_main("query", query, "--index", index_dir, "-k", "3", "--json")
+        response = json.loads(output)  # Nothing else on stdout
+        assert status == main.EXIT_OK and response["query"] == query and 0 < len(response["results"]) <= 3
+        status, output = run_main("query", "zzzz", "--index", index_dir, "--json")
+        assert status == main.EXIT_NO_RESULTS and json.loads(output)["results"] == []
+
+        # A one-shot query from a fresh process imports NLTK for the stemmer, but not Tkinter
+        output = run_python(f"import sys, json, main; main.main(['query', {query!r}, '--index', {index_dir!r}, "
+                            "'--json']); print(json.dumps(sorted(m for m in ('nltk', 'tkinter') "
+                            "if m in sys.modules)))")
+        response, loaded = output.strip().splitlines()
+        assert json.loads(response)["results"] and json.loads(loaded) == ["nltk"]
+
+
+def test_index_without_documents():
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        os.makedirs(data_folder)
+        for data in (data_folder, os.path.join(folder, "missing")):
+            assert run_main("index", "--data", data, "--index", index_dir, "--workers", "1")[0] == main.EXIT_NO_INDEX
+            status, output = run_main("index", "--data", data, "--index", index_dir, "--workers", "1", "--json")
+            assert status == main.EXIT_NO_INDEX and json.loads(output)["documents"] == 0
+
+
+if __name__ == "__main__":
+    test_heavy_imports_are_lazy()
+    test_subcommands()
+    test_index_without_documents()
+    print("Command line checks passed.")
@@ -0,0 +1,58 @@
+# Check the metrics layer: nothing is recorded when off, spans and counters when on, and both exports
+import os
+import json
+import tempfile
+import metrics
+from search import load_index, search
+from segment import write_segment
+from test_ranked_query import build_random_index
+
+
+def run_searches(path, queries):
+    index = load_index(path)
+    for query in queries:
+        search(query, index, k=3, cache=None)
+
+
+def test_metrics_collection_and_export():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    terms = sorted(inverted_index)
+    queries = [" ".join(terms[position:position + 2]) for position in range(0, 20, 2)]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+
+        metrics.disable()
+        metrics.reset()
+        run_searches(path, queries)
+        assert metrics.snapshot()["counters"] == {} and metrics.snapshot()["spans"] == {}
+
+        metrics.enable(profile_slowest=3)
+        try:
+            run_searches(path, queries)
+            snapshot = metrics.snapshot()
+            assert snapshot["spans"]["query"]["count"] == len(queries)
+            assert snapshot["spans"]["query.rank"]["count"] == len(queries)
+            assert snapshot["spans"]["index.open"]["count"] == 1
+            assert snapshot["counters"]["postings_scanned"] > 0 and snapshot["counters"]["candidates_scored"] > 0
+            assert len(snapshot["slowest_queries"]) == 3
+            assert snapshot["slowest_queries"][0]["seconds"] >= snapshot["slowest_queries"][-1]["seconds"]
+            assert "cache_results_hits" in snapshot["gauges"]
+
+            text = metrics.to_prometheus()
+            assert "searchengine_postings_scanned_total" in text
+            assert f'searchengine_span_seconds_count{{span="query"}} {len(queries)}' in text
+            assert 'searchengine_span_seconds_bucket{span="query",le="+Inf"} ' + str(len(queries)) in text
+
+            metrics.write(os.path.join(folder, "metrics.json"))
+            with open(os.path.join(folder, "metrics.json"), "r", encoding="utf-8") as file:
+                assert json.load(file)["spans"]["query"]["count"] == len(queries)
+        finally:
+            metrics.disable()
+            metrics.reset()
+
+
+if __name__ == "__main__":
+    test_metrics_collection_and_export()
+    print("Metrics checks passed.")
@@ -0,0 +1,172 @@
+# Check positional indexes: the positions codec, phrase filtering and the proximity boost, and
+# that every way of building or splitting an index keeps the same positions
+import os
+import random
+import tempfile
+import numpy as np
+from build_index import build_inverted_index, compute_document_stats, document_term_frequencies
+from incremental import update_index, force_merge
+from postings_codec import encode_positions, decode_positions_block, split_positions, BLOCK_SIZE
+from query_processor import ranked_query, parse_query, minimum_window, PROXIMITY_WEIGHT, proximity_score
+from read_json_files import iter_documents
+from scoring import compute_combined_score
+from search import load_index
+from segment import write_segment, open_segment
+from sharding import split_index, open_sharded_index
+from spimi import build_index_spimi
+from test_incremental import write_page, WORDS
+
+VOCABULARY = [f"w{index}" for index in range(12)]
+
+
+def random_documents(num_docs=300, seed=5):
+    rng = random.Random(seed)
+    documents, streams = [], []
+    for doc_id in range(num_docs):
+        stream = rng.choices(VOCABULARY, weights=range(len(VOCABULARY), 0, -1), k=rng.randint(3, 40))
+        positions = {}
+        for position, term in enumerate(stream):
+            positions.setdefault(term, []).append(position)
+        documents.append({
+            "url": f"https://www.ics.uci.edu/page{doc_id}",
+            "regular_terms": [(term, len(entry)) for term, entry in positions.items()],
+            "important_terms": [(term, 1) for term in rng.sample(VOCABULARY, rng.randint(0, 2))],
+            "positions": list(positions.items()),
+            "links": [],
+        })
+        streams.append(stream)
+    return documents, streams
+
+
+def contains_phrase(stream, phrase):
+    return any(tuple(stream[start:start + len(phrase)]) == phrase for start in range(len(stream)))
+
+
+def test_positions_codec_round_trip():
+    rng = random.Random(1)
+    counts = [rng.choice([0, 0, 1, 2, 7]) for _ in range(3 * BLOCK_SIZE + 5)]
+    per_posting = [sorted(rng.sample(range(5000), count)) for count in counts]
+    payload, offsets = encode_positions(counts, [position for entry in per_posting for position in entry])
+    assert len(offsets) == 4
+    decoded = []
+    for block, offset in enumerate(offsets):
+        size = min(BLOCK_SIZE, len(counts) - block * BLOCK_SIZE)
+        decoded.extend(split_positions(*decode_positions_block(payload, int(offset), size)))
+    assert [entry.tolist() for entry in decoded] == per_posting
+
+
+def test_minimum_window_matches_brute_force():
+    rng = random.Random(2)
+    for _ in range(300):
+        lists = [sorted(rng.sample(range(60), rng.randint(1, 5))) for _ in range(rng.randint(1, 4))]
+        spans = []
+        for start in {position for entry in lists for position in entry}:
+            ends = [min((position for position in entry if position >= start), default=None) for entry in lists]
+            if None not in ends:
+                spans.append(max(ends) - start + 1)
+        assert minimum_window(lists) == min(spans)
+    assert minimum_window([[1, 5], []]) is None
+
+
+def test_parse_query():
+    tokens, phrases = parse_query('faculty "Machine Learning" "ICS" research')
+    assert phrases == [("machin", "learn")]
+    assert tokens == ["faculti", "machin", "learn", "ic", "research"]
+
+
+def test_phrase_queries_filter_and_boost():
+    documents, streams = random_documents()
+    inverted_index, document_lookup, _ = build_inverted_index(documents)
+    doc_lengths, _ = compute_document_stats(inverted_index, len(documents))
+    doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+    pagerank_scores = np.random.default_rng(3).random(len(documents))
+    urls = [document_lookup[doc_id] for doc_id in range(len(documents))]
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "segment"), inverted_index, urls, pagerank_scores, doc_lengths)
+        segment = open_segment(os.path.join(folder, "segment"))
+        assert segment.has_positions
+        split_index(segment, os.path.join(folder, "shards"), 3)
+        sharded = open_sharded_index(os.path.join(folder, "shards"), workers=1)
+
+        rng = random.Random(4)
+        for _ in range(100):
+            phrase = tuple(rng.choices(VOCABULARY[:6], k=rng.randint(2, 3)))
+            query_tokens = list(dict.fromkeys(phrase + tuple(rng.sample(VOCABULARY, rng.randint(0, 1)))))
+            matching = [doc_id for doc_id, (stream, document) in enumerate(zip(streams, documents))
+                        if contains_phrase(stream, phrase)
+                        and set(query_tokens) <= set(document_term_frequencies(document))]
+
+            # Expected scores: TF-IDF + PageRank prior, plus the proximity boost from the token streams
+            expected = []
+            if matching:
+                scores = compute_combined_score(np.asarray(matching), query_tokens, inverted_index, doc_lengths,
+                                                pagerank_scores)
+                if len(query_tokens) > 1:
+                    bound = PROXIMITY_WEIGHT * sum(inverted_index[term]["max_score"] for term in query_tokens)
+                    for slot, doc_id in enumerate(matching):
+                        lists = [[position for position, token in enumerate(streams[doc_id]) if token == term]
+                                 for term in query_tokens]
+                        scores[slot] += bound * proximity_score(lists)
+                expected = sorted(zip(matching, scores.tolist()), key=lambda pair: (-pair[1], pair[0]))[:5]
+
+            for index in (inverted_index, segment):
+                results = ranked_query(query_tokens, index, doc_lengths, pagerank_scores, 5, phrases=[phrase])
+                assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected], phrase
+                assert np.allclose([score for _, score in results], [score for _, score in expected])
+            results = sharded.ranked_query(query_tokens, 5, True, [phrase])
+            assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected], phrase
+        sharded.close()
+
+
+def test_spimi_and_incremental_keep_positions():
+    documents, _ = random_documents(num_docs=200, seed=6)
+    inverted_index, document_lookup, _ = build_inverted_index(documents)
+    doc_lengths, _ = compute_document_stats(inverted_index, len(documents))
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "in_memory"), inverted_index, [doc["url"] for doc in documents],
+                      np.zeros(len(documents)), doc_lengths)
+        build_index_spimi(iter(documents), os.path.join(folder, "spimi"), memory_budget_mb=0.01, temp_dir=folder,
+                          positions=True)
+        expected, segment = open_segment(os.path.join(folder, "in_memory")), open_segment(os.path.join(folder, "spimi"))
+        assert segment.header["spimi_runs"] >= 5
+        for term in expected:
+            for actual_part, expected_part in zip(segment[term].decode_positions(), expected[term].decode_positions()):
+                assert np.array_equal(actual_part, expected_part), term
+
+        # Incremental updates and merges of HTML pages against a positional rebuild
+        rng = random.Random(8)
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number in range(30):
+            write_page(data_folder, number, rng)
+        update_index(index_dir, data_folder, positions=True)
+        for number in range(20, 40):
+            write_page(data_folder, number, rng, version=1)
+        update_index(index_dir, data_folder)
+        unmerged = load_index(index_dir)
+        force_merge(index_dir)
+        merged = load_index(index_dir)
+        build_index_spimi(iter_documents(data_folder=data_folder, positions=True), os.path.join(folder, "reference"),
+                          temp_dir=folder, positions=True)
+        reference = load_index(os.path.join(folder, "reference"))
+        assert unmerged.has_positions and merged.has_positions and reference.has_positions
+
+        def urls(index, query_tokens, phrase):
+            results = ranked_query(query_tokens, index, index.doc_lengths, index.pagerank_scores, 1000,
+                                   phrases=[phrase])
+            return sorted(index.url(doc_id) for doc_id, _ in results)
+
+        for _ in range(40):
+            phrase = tuple(rng.sample(WORDS[:10], 2))
+            expected_urls = urls(reference, list(phrase), phrase)
+            assert urls(unmerged, list(phrase), phrase) == expected_urls
+            assert urls(merged, list(phrase), phrase) == expected_urls
+
+
+if __name__ == "__main__":
+    test_positions_codec_round_trip()
+    test_minimum_window_matches_brute_force()
+    test_parse_query()
+    test_phrase_queries_filter_and_boost()
+    test_spimi_and_incremental_keep_positions()
+    print("Positional index checks passed.")
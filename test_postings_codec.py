@@ -0,0 +1,100 @@
+# Round-trip and compression checks for the block-compressed posting list codec
+import os
+import random
+import tempfile
+import numpy as np
+from postings_codec import BLOCK_SIZE, BlockPostings, encode_postings, decode_postings, pack_bits, unpack_bits
+from segment import write_segment, open_segment
+from query_processor import boolean_and_query, ranked_query
+from test_ranked_query import build_random_index
+
+
+def random_postings(rng, length, universe):
+    documents = np.sort(rng.choice(universe, size=length, replace=False))
+    frequencies = rng.geometric(0.3, size=length)
+    return documents, frequencies
+
+
+def test_pack_bits_round_trip():
+    rng = np.random.default_rng(1)
+    for width in range(33):
+        values = rng.integers(0, 2 ** width, size=BLOCK_SIZE, dtype=np.uint64) if width else np.zeros(BLOCK_SIZE)
+        packed_width, packed = pack_bits(values)
+        assert packed_width <= width
+        assert unpack_bits(packed, 0, BLOCK_SIZE, packed_width).tolist() == np.asarray(values, np.uint32).tolist()
+
+
+def test_postings_round_trip():
+    rng = np.random.default_rng(2)
+    lengths = [1, 2, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 3 * BLOCK_SIZE, 5000]
+    for length in lengths:
+        for universe in (length, 10 * length, 2 ** 32 - 1):
+            documents, frequencies = random_postings(rng, length, universe)
+            payload, skips = encode_postings(documents, frequencies)
+            decoded_docs, decoded_freqs = decode_postings(payload, skips, length)
+            assert decoded_docs.tolist() == documents.tolist()
+            assert decoded_freqs.tolist() == frequencies.tolist()
+
+            postings = BlockPostings(payload, skips, length, 1.0, 1.0)
+            assert skips["last_doc"].tolist() == documents[BLOCK_SIZE - 1::BLOCK_SIZE].tolist() + (
+                [int(documents[-1])] if length % BLOCK_SIZE else [])
+            for block in range(postings.num_blocks):
+                block_docs, block_freqs = postings.block(block)
+                assert block_docs.tolist() == documents[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE].tolist()
+                assert block_freqs.tolist() == frequencies[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE].tolist()
+
+
+def test_clustered_postings_use_exceptions():
+    """Runs of small gaps broken by a few big jumps pack narrow, with the jumps patched as exceptions."""
+    rng = np.random.default_rng(4)
+    for length in (2, BLOCK_SIZE - 3, BLOCK_SIZE, 4 * BLOCK_SIZE + 7):
+        gaps = rng.integers(1, 4, size=length)
+        jumps = max(1, length // 40)
+        gaps[rng.choice(length, size=jumps, replace=False)] = rng.integers(1000, 2 ** 22, size=jumps)
+        documents = np.cumsum(gaps)
+        frequencies = rng.geometric(0.5, size=length)
+        payload, skips = encode_postings(documents, frequencies)
+        assert len(payload) < length * 4 // 3 + 6 * len(skips) + 8 * jumps  # Not 22 bits a gap
+        decoded_docs, decoded_freqs = decode_postings(payload, skips, length)
+        assert decoded_docs.tolist() == documents.tolist() and decoded_freqs.tolist() == frequencies.tolist()
+        postings = BlockPostings(payload, skips, length, 1.0, 1.0)
+        assert np.concatenate([postings.block(block)[0] for block in range(postings.num_blocks)]).tolist() \
+            == documents.tolist()
+
+
+def test_compressed_segment_queries_match_uncompressed():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=6000, vocabulary=40)
+    urls = [f"https://www.ics.uci.edu/{doc_id}" for doc_id in range(len(doc_lengths))]
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        segment = open_segment(path)
+
+        for _ in range(50):
+            query_tokens = rng.sample(sorted(inverted_index), rng.randint(1, 4))
+            assert boolean_and_query(query_tokens, segment) == boolean_and_query(query_tokens, inverted_index)
+            for conjunctive in (True, False):
+                expected = ranked_query(query_tokens, inverted_index, doc_lengths, pagerank_scores, 10, conjunctive)
+                results = ranked_query(query_tokens, segment, segment.doc_lengths, segment.pagerank_scores, 10,
+                                       conjunctive)
+                assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+
+
+def test_codec_compression_ratio():
+    """Throughput is measured by `python benchmarks.py codec`, outside the unit suite."""
+    rng = np.random.default_rng(3)
+    documents, frequencies = random_postings(rng, 200_000, 2_000_000)
+    raw_bytes = documents.astype(np.uint32).nbytes + frequencies.astype(np.uint32).nbytes
+    payload, skips = encode_postings(documents, frequencies)
+    assert raw_bytes / (len(payload) + skips.nbytes) > 2
+
+
+if __name__ == "__main__":
+    test_pack_bits_round_trip()
+    test_postings_round_trip()
+    test_clustered_postings_use_exceptions()
+    test_compressed_segment_queries_match_uncompressed()
+    test_codec_compression_ratio()
+    print("All codec checks passed.")
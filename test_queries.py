@@ -1,8 +1,12 @@
 # Run queries and measure performance
+#
+#   python test_queries.py [INDEX_PATH]
+import os
+import sys
 import time
-from search import search
+from search import load_index, search
 
-test_queries = [
+TEST_QUERIES = [
     "cristina lopes",
     "machine learning",
     "ACM",
@@ -25,8 +29,15 @@ test_queries = [
     "alumni career outcomes 2024"
 ]
 
-for query in test_queries:
-    start_time = time.time()
-    results = search(query)
-    elapsed_time = time.time() - start_time
-    print(f"Query: '{query}' | Time: {elapsed_time:.4f}s | Results: {len(results)}")
\ No newline at end of file
+
+def run_queries(index, queries=TEST_QUERIES):
+    for query in queries:
+        start_time = time.perf_counter()
+        results = search(query, index, cache=None)
+        elapsed_time = time.perf_counter() - start_time
+        print(f"Query: '{query}' | Time: {elapsed_time * 1000:.2f} ms | Results: {len(results)}")
+
+
+if __name__ == "__main__":
+    index_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "index")
+    run_queries(load_index(index_path))
@@ -0,0 +1,105 @@
+# Check the search caches: bounded eviction, admission, normalized keys and generation invalidation
+import os
+import random
+import tempfile
+import numpy as np
+from incremental import update_index
+from query_cache import LRUCache, SearchCache, CachedPostings
+from query_processor import ranked_query, boolean_and_query
+from search import load_index, search
+from segment import write_segment
+from test_incremental import write_page
+from test_ranked_query import build_random_index
+
+
+def test_lru_bounds_and_admission():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # Evicts "b", the least recently used
+    assert cache.get("b") is None and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1 and cache.hits == 2 and cache.misses == 1
+
+    by_bytes = LRUCache(max_bytes=100)
+    by_bytes.put("x", "x", 60)
+    by_bytes.put("y", "y", 60)
+    assert by_bytes.get("x") is None and by_bytes.bytes == 60
+
+    picky = LRUCache(max_entries=10, admit_after=2)
+    assert not picky.admits("term") and picky.admits("term")
+
+
+def test_cached_postings_rank_identically():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=1000)
+    cache = LRUCache(max_bytes=1 << 20, admit_after=1)
+    view = CachedPostings(inverted_index, cache)
+    rng = random.Random(2)
+    terms = sorted(inverted_index)
+    for _ in range(100):
+        query = rng.sample(terms, rng.randint(1, 4))
+        for conjunctive in (True, False):
+            expected = ranked_query(query, inverted_index, doc_lengths, pagerank_scores, 10, conjunctive)
+            results = ranked_query(query, view, doc_lengths, pagerank_scores, 10, conjunctive)
+            assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+            assert np.allclose([score for _, score in results], [score for _, score in expected])
+        assert boolean_and_query(query, view, cache) == boolean_and_query(query, inverted_index)
+    assert cache.hits > 0
+
+
+def test_search_cache_keys_and_generations():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        index = load_index(path)
+        query = " ".join(sorted(inverted_index)[:2])
+
+        cache = SearchCache()
+        first = search(query.upper(), index, cache=cache)
+        assert search(query, index, cache=cache) == first == search(query, index, cache=None)
+        assert cache.results.hits == 1 and cache.results.misses == 1
+
+        # A new generation of an incremental index empties the caches
+        data_folder = os.path.join(folder, "DEV")
+        index_dir = os.path.join(folder, "index")
+        rng = random.Random(1)
+        for number in range(10):
+            write_page(data_folder, number, rng)
+        update_index(index_dir, data_folder)
+        before = search("page", load_index(index_dir), cache=cache)
+        assert cache.invalidations == 1
+
+        write_page(data_folder, 10, rng)
+        update_index(index_dir, data_folder)
+        after = search("page", load_index(index_dir), cache=cache)
+        assert cache.invalidations == 2
+        assert len(after) == len(before) == 5 and cache.results.misses == 3
+
+
+
+def test_rebuilt_segment_invalidates_cache():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=200)
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    query = " ".join(sorted(inverted_index)[:2])
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        cache = SearchCache()
+        first = search(query, load_index(path), cache=cache)
+        assert search(query, load_index(path), cache=cache) == first and cache.invalidations == 0
+
+        # Same path, no generation: only the build id shows the index changed
+        write_segment(path, inverted_index, urls[::-1], pagerank_scores, doc_lengths)
+        rebuilt = load_index(path)
+        assert search(query, rebuilt, cache=cache) == search(query, rebuilt, cache=None) != first
+        assert cache.invalidations == 1
+
+
+if __name__ == "__main__":
+    test_lru_bounds_and_admission()
+    test_cached_postings_rank_identically()
+    test_search_cache_keys_and_generations()
+    test_rebuilt_segment_invalidates_cache()
+    print("Search cache checks passed.")
@@ -0,0 +1,83 @@
+# Check that max-score pruned top-k retrieval returns the same results as scoring every match
+import math
+import random
+import numpy as np
+from build_index import compute_document_stats
+from query_processor import ranked_query, boolean_and_query, document_frequency, PostingCursor
+from scoring import compute_combined_score, compute_tf_idf_scores
+
+
+def build_random_index(num_docs=400, vocabulary=60, seed=7):
+    rng = random.Random(seed)
+    inverted_index = {}
+    for doc_id in range(num_docs):
+        for term in rng.sample(range(vocabulary), rng.randint(1, 12)):
+            postings = inverted_index.setdefault(f"t{term}", {"documents": [], "frequency": []})
+            postings["documents"].append(doc_id)
+            postings["frequency"].append(rng.randint(1, 9))
+    doc_lengths, _ = compute_document_stats(inverted_index, num_docs)
+    pagerank_scores = np.array([rng.random() for _ in range(num_docs)])
+    return inverted_index, np.asarray(doc_lengths, dtype=np.float64), pagerank_scores / pagerank_scores.sum()
+
+
+def exhaustive_top_k(query_tokens, inverted_index, doc_lengths, pagerank_scores, k, conjunctive):
+    if conjunctive:
+        candidates = boolean_and_query(query_tokens, inverted_index)
+    else:
+        candidates = sorted({doc_id for term in query_tokens for doc_id in inverted_index[term]["documents"]})
+    if not candidates:
+        return []
+    scores = compute_combined_score(np.asarray(candidates), query_tokens, inverted_index, doc_lengths, pagerank_scores)
+    return sorted(zip(candidates, scores.tolist()), key=lambda pair: (-pair[1], pair[0]))[:k]
+
+
+def test_ranked_query_matches_exhaustive_scoring():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    rng = random.Random(11)
+    terms = sorted(inverted_index)
+    for _ in range(200):
+        query_tokens = rng.sample(terms, rng.randint(1, 4))
+        for conjunctive in (True, False):
+            expected = exhaustive_top_k(query_tokens, inverted_index, doc_lengths, pagerank_scores, 5, conjunctive)
+            results = ranked_query(query_tokens, inverted_index, doc_lengths, pagerank_scores, 5, conjunctive)
+            assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+            assert np.allclose([score for _, score in results], [score for _, score in expected])
+
+
+def test_conjunctive_query_with_missing_term_is_empty():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    assert ranked_query(["t1", "missing"], inverted_index, doc_lengths, pagerank_scores, 5) == []
+    assert ranked_query(["t1", "missing"], inverted_index, doc_lengths, pagerank_scores, 5, conjunctive=False)
+
+
+def test_tf_idf_scores_by_hand():
+    inverted_index = {"a": {"documents": [0, 2], "frequency": [2, 1]},
+                      "b": {"documents": [1, 2], "frequency": [3, 1]},
+                      "c": {"documents": [2], "frequency": [4]}}
+    doc_lengths, _ = compute_document_stats(inverted_index, 3)
+    assert doc_lengths == [2, 3, 6]
+    idf_ab, idf_c = math.log(4 / 3) + 1, math.log(4 / 2) + 1
+    assert np.isclose(inverted_index["a"]["idf"], idf_ab) and np.isclose(inverted_index["c"]["idf"], idf_c)
+    assert np.isclose(inverted_index["a"]["max_score"], 2 / 3 * idf_ab)
+
+    doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+    scores = compute_tf_idf_scores([0, 1, 2], ["a", "b", "a", "missing"], inverted_index, doc_lengths)
+    assert np.allclose(scores, [2 / 3 * idf_ab, 3 / 4 * idf_ab, 1 / 7 * idf_ab + 1 / 7 * idf_ab])
+    assert np.allclose(compute_tf_idf_scores([1, 2], ["c"], inverted_index, doc_lengths), [0.0, 4 / 7 * idf_c])
+    assert len(compute_tf_idf_scores([], ["a"], inverted_index, doc_lengths)) == 0
+
+
+def test_document_frequency_of_postings_dicts():
+    inverted_index, doc_lengths, _ = build_random_index()
+    for term in ("t0", "t30"):
+        postings = inverted_index[term]
+        assert document_frequency(postings) == len(postings["documents"]) != len(postings)  # Not the dict's keys
+        assert len(PostingCursor(postings, doc_lengths)) == len(postings["documents"])
+
+
+if __name__ == "__main__":
+    test_ranked_query_matches_exhaustive_scoring()
+    test_conjunctive_query_with_missing_term_is_empty()
+    test_tf_idf_scores_by_hand()
+    test_document_frequency_of_postings_dicts()
+    print("All ranked query checks passed.")
@@ -0,0 +1,109 @@
+# Check doc id reordering: every strategy keeps the ranking (by URL), bisection shrinks clustered
+# postings, and early termination over a PageRank-ordered index returns the exact top k
+import os
+import random
+import tempfile
+import numpy as np
+from build_index import build_inverted_index, compute_document_stats
+from incremental import update_index, reorder_index
+from query_processor import ranked_query
+from reorder import STRATEGIES, document_order, reorder_inverted_index, reorder_segment, url_order
+from scoring import pagerank_suffix_max
+from search import load_index
+from segment import write_segment, open_segment
+from segment_set import load_manifest
+from test_incremental import write_page, all_scores, WORDS
+
+
+def clustered_documents(num_docs=400, topics=8, seed=11):
+    """Documents drawing most words from one of `topics` vocabularies, in shuffled order."""
+    rng = random.Random(seed)
+    documents = []
+    for doc_id in range(num_docs):
+        topic = rng.randrange(topics)
+        words = [f"t{topic}w{rng.randrange(60)}" if rng.random() < 0.9 else f"common{rng.randrange(20)}"
+                 for _ in range(rng.randint(10, 50))]
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        documents.append({"url": f"https://host{rng.randrange(5)}.ics.uci.edu/page{doc_id}",
+                          "regular_terms": list(counts.items()), "important_terms": [], "links": []})
+    return documents
+
+
+def test_in_memory_reorder_keeps_ranking():
+    documents = clustered_documents(num_docs=150)
+    inverted_index, document_lookup, _ = build_inverted_index(documents)
+    doc_lengths, _ = compute_document_stats(inverted_index, len(documents))
+    pagerank_scores = np.random.default_rng(1).random(len(documents))
+    order = document_order("pagerank", inverted_index, [doc["url"] for doc in documents], pagerank_scores)
+    reordered, lookup, reordered_pagerank = reorder_inverted_index(inverted_index, document_lookup,
+                                                                   pagerank_scores, order)
+    assert np.all(np.diff(reordered_pagerank) <= 0)
+    reordered_lengths = np.asarray(doc_lengths)[order]
+    for term in ["t0w1", "t3w5", "common2"]:
+        expected = ranked_query([term], inverted_index, np.asarray(doc_lengths), pagerank_scores, 10)
+        actual = ranked_query([term], reordered, reordered_lengths, reordered_pagerank, 10)
+        assert [document_lookup[doc_id] for doc_id, _ in expected] == [lookup[doc_id] for doc_id, _ in actual]
+
+
+def test_bisection_shrinks_clustered_postings():
+    documents = clustered_documents()
+    inverted_index, document_lookup, _ = build_inverted_index(documents)
+    doc_lengths, _ = compute_document_stats(inverted_index, len(documents))
+    urls = [doc["url"] for doc in documents]
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "original"), inverted_index, urls, np.zeros(len(urls)), doc_lengths)
+        original = open_segment(os.path.join(folder, "original"))
+        order = document_order("bisection", original, urls, original.pagerank_scores)
+        assert sorted(order.tolist()) == list(range(len(urls)))
+        reorder_segment(original, os.path.join(folder, "bisection"), order, doc_order="bisection")
+        reordered = open_segment(os.path.join(folder, "bisection"))
+        assert reordered.header["postings_bytes"] < 0.9 * original.header["postings_bytes"]
+        assert [reordered.url(doc_id) for doc_id in range(3)] == [urls[doc_id] for doc_id in order[:3]]
+    assert url_order(["https://b.ics.uci.edu/x", "https://www.a.ics.uci.edu/y", "https://a.ics.uci.edu/a"]).tolist() \
+        == [2, 1, 0]
+
+
+def test_reorder_index_and_early_termination():
+    rng = random.Random(12)
+    with tempfile.TemporaryDirectory() as folder:
+        data_folder, index_dir = os.path.join(folder, "DEV"), os.path.join(folder, "index")
+        for number in range(60):
+            write_page(data_folder, number, rng)
+        update_index(index_dir, data_folder, positions=True)
+        expected = all_scores(load_index(index_dir))
+
+        for strategy in STRATEGIES + ("pagerank",):
+            stats = reorder_index(index_dir, strategy)
+            assert stats["documents"] == 60
+            index = load_index(index_dir)
+            assert index.doc_order == strategy and index.has_positions
+            actual = all_scores(index)
+            assert actual.keys() == expected.keys()
+            assert all(np.isclose(actual[url], score) for url, score in expected.items())
+            for name, entry in load_manifest(index_dir)["files"].items():
+                assert index.url(int(index.bases[0]) + entry["doc"][1]).endswith(f"page{int(name[-9:-5])}")
+
+        # A later update appends a delta segment; the bounds stay exact
+        for number in range(60, 70):
+            write_page(data_folder, number, rng)
+        update_index(index_dir, data_folder)
+        index = load_index(index_dir)
+        bounds = index.pagerank_bounds
+        assert np.allclose(bounds, pagerank_suffix_max(index.pagerank_scores))
+        for _ in range(60):
+            query = rng.sample(WORDS[:30], rng.randint(1, 3))
+            for conjunctive in (True, False):
+                exhaustive = ranked_query(query, index, index.doc_lengths, index.pagerank_scores, 5, conjunctive)
+                early = ranked_query(query, index, index.doc_lengths, index.pagerank_scores, 5, conjunctive,
+                                     pagerank_bounds=bounds)
+                assert [doc_id for doc_id, _ in early] == [doc_id for doc_id, _ in exhaustive], query
+                assert np.allclose([score for _, score in early], [score for _, score in exhaustive])
+
+
+if __name__ == "__main__":
+    test_in_memory_reorder_keeps_ranking()
+    test_bisection_shrinks_clustered_postings()
+    test_reorder_index_and_early_termination()
+    print("Doc id reordering checks passed.")
@@ -0,0 +1,90 @@
+# Check staged search and the background search worker the GUI uses: stage order, partial
+# results, and that newer queries supersede older ones
+import os
+import time
+import tempfile
+import threading
+from query_cache import SearchCache
+from search import load_index, search, search_stages
+from search_worker import SearchWorker
+from segment import write_segment
+from test_ranked_query import build_random_index
+
+
+def build_index(folder):
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    path = os.path.join(folder, "segment")
+    write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+    return load_index(path)
+
+
+def wait_for(worker, sequence, timeout=10):
+    """Progress messages up to the last one of query `sequence`."""
+    messages, deadline = [], time.time() + timeout
+    while time.time() < deadline:
+        messages += worker.poll()
+        if any(message["sequence"] == sequence and message["done"] for message in messages):
+            return messages
+        time.sleep(0.005)
+    raise AssertionError(f"query {sequence} never finished")
+
+
+def test_search_stages():
+    with tempfile.TemporaryDirectory() as folder:
+        index = build_index(folder)
+        expected = search("t1 t2", index, k=3, cache=None)
+        cache = SearchCache()
+        stages = list(search_stages("t1 t2", index, k=3, cache=cache))
+        assert [stage for stage, _, _ in stages] == ["tokenize", "rank", "snippets"]
+        assert stages[0][2] == [] and all(seconds >= 0 for _, seconds, _ in stages)
+        assert [result[:3] for result in stages[1][2]] == [result[:3] for result in expected]
+        assert all(summary is None for _, _, _, summary in stages[1][2])
+        assert stages[2][2] == expected
+        assert [stage for stage, _, _ in search_stages("t1 t2", index, k=3, cache=cache)] == ["tokenize", "cache"]
+
+
+def test_worker_supersedes_stale_queries():
+    with tempfile.TemporaryDirectory() as folder:
+        index = build_index(folder)
+        gate = threading.Event()
+
+        def gated_stages(query, index, k):
+            for stage in search_stages(query, index, k, cache=None):
+                gate.wait()  # Hold the first query mid-flight until more have been typed
+                yield stage
+
+        worker = SearchWorker(index, k=3, stages=gated_stages)
+        first = worker.submit("t1")
+        time.sleep(0.05)
+        worker.submit("t1 t2")
+        last = worker.submit("t1 t2 t3")
+        gate.set()
+        messages = wait_for(worker, last)
+        worker.close()
+
+        assert {message["sequence"] for message in messages} <= {first, last}
+        assert not any(message["done"] for message in messages if message["sequence"] == first)
+        final = [message for message in messages if message["sequence"] == last]
+        assert [message["stage"] for message in final] == ["tokenize", "rank", "snippets"]
+        assert final[-1]["results"] == search("t1 t2 t3", index, k=3, cache=None)
+        assert worker.stats == {"submitted": 3, "completed": 1, "superseded": 2}
+
+
+def test_worker_reports_errors():
+    def failing_stages(query, index, k):
+        yield "tokenize", 0.0, []
+        raise ValueError("index closed")
+
+    worker = SearchWorker(None, stages=failing_stages)
+    sequence = worker.submit("anything")
+    messages = wait_for(worker, sequence)
+    worker.close()
+    assert messages[-1]["stage"] == "error" and messages[-1]["error"] == "index closed"
+
+
+if __name__ == "__main__":
+    test_search_stages()
+    test_worker_supersedes_stale_queries()
+    test_worker_reports_errors()
+    print("Search worker checks passed.")
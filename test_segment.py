@@ -0,0 +1,67 @@
+# Check that an index written as a binary segment reads back identically and ranks the same
+import tempfile
+import os
+import json
+import numpy as np
+from segment import write_segment, open_segment, convert_json_index
+from query_processor import ranked_query
+from test_ranked_query import build_random_index
+
+
+def test_segment_round_trip():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths, total_files_read=len(urls))
+        segment = open_segment(path)
+
+        assert segment.num_docs == len(urls)
+        assert sorted(inverted_index) == list(segment)
+        assert segment.url(17) == urls[17]
+        assert "missing" not in segment
+        assert np.allclose(segment.pagerank_scores, pagerank_scores)
+        assert np.array_equal(segment.doc_lengths, doc_lengths)
+
+        for term, postings in inverted_index.items():
+            stored = segment[term]
+            assert stored["documents"].tolist() == postings["documents"]
+            assert stored["frequency"].tolist() == postings["frequency"]
+            assert np.isclose(stored["idf"], postings["idf"])
+            assert np.isclose(stored["max_score"], postings["max_score"])
+
+        for query_tokens in (["t1", "t2"], ["t5"], ["t3", "t9", "t40"]):
+            for conjunctive in (True, False):
+                expected = ranked_query(query_tokens, inverted_index, doc_lengths, pagerank_scores, 5, conjunctive)
+                results = ranked_query(query_tokens, segment, segment.doc_lengths, segment.pagerank_scores, 5,
+                                       conjunctive)
+                assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+
+
+def test_convert_json_index():
+    inverted_index = {"cat": {"documents": [0, 2], "frequency": [1, 3]}, "dog": {"documents": [1], "frequency": [2]}}
+    legacy = {
+        "total_files_read": 3,
+        "total_documents": 3,
+        "pagerank_scores": {"https://a.com/": 0.5, "https://b.com/": 0.3, "https://c.com/": 0.2},
+        "index": inverted_index,
+        "document_lookup": {"0": "https://a.com/", "1": "https://b.com/", "2": "https://c.com/"},
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        json_path = os.path.join(folder, "inverted_index.json")
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump(legacy, file)
+        convert_json_index(json_path, os.path.join(folder, "segment"))
+        segment = open_segment(os.path.join(folder, "segment"))
+
+        assert segment.url(2) == "https://c.com/"
+        assert segment.pagerank_scores.tolist() == [0.5, 0.3, 0.2]
+        assert segment.doc_lengths.tolist() == [1, 2, 3]
+        assert segment["cat"]["documents"].tolist() == [0, 2]
+
+
+if __name__ == "__main__":
+    test_segment_round_trip()
+    test_convert_json_index()
+    print("All segment checks passed.")
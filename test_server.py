@@ -0,0 +1,111 @@
+# Check the HTTP search service end to end against an in-process server
+import os
+import json
+import time
+import socket
+import asyncio
+import tempfile
+from load_test import request, run_load
+from search import load_index, search
+from segment import write_segment
+from server import SearchService, serve, parse_args
+from test_ranked_query import build_random_index
+
+
+async def exercise(index_path, query):
+    service = SearchService(index_path)
+    listener = socket.create_server(("127.0.0.1", 0))
+    server = await asyncio.start_server(service.serve_connection, sock=listener)
+    port = listener.getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    host = f"127.0.0.1:{port}"
+    try:
+        responses = {}
+        for path in [f"/search?q={query}&k=3", "/health", "/stats", "/search?k=3", "/search?q=x&k=0", "/nope"]:
+            status, body = await request(reader, writer, host, path)  # All on one keep-alive connection
+            responses[path] = (status, json.loads(body))
+
+        service.max_in_flight = 0
+        responses["limited"] = await service.handle("GET", f"/search?q={query}")
+        service.max_in_flight, service.request_timeout = 8, 0
+        responses["timeout"] = await service.handle("GET", f"/search?q={query}")
+        service.request_timeout = 2.0
+
+        report = await run_load(f"http://{host}", [query, "t1", "t2 t3"], connections=4, total_requests=200)
+        return responses, report
+    finally:
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_search_service():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        query = "+".join(sorted(inverted_index)[:2])
+        responses, report = asyncio.run(exercise(path, query))
+
+        status, payload = responses[f"/search?q={query}&k=3"]
+        expected = search(query.replace("+", " "), load_index(path), k=3, cache=None)
+        assert status == 200 and [result["url"] for result in payload["results"]] == [url for _, _, url, _ in expected]
+        assert responses["/health"][1]["status"] == "ok"
+        assert responses["/stats"][1]["searches"] == 1
+        assert [responses[path][0] for path in ["/search?k=3", "/search?q=x&k=0", "/nope"]] == [400, 400, 404]
+        assert responses["limited"][0] == 503 and responses["timeout"][0] == 504
+        assert report["statuses"] == {200: 200} and report["qps"] > 0
+
+
+class SlowHolder:
+    """Stands in for IndexHolder: every search first takes `seconds`."""
+
+    def __init__(self, holder, seconds):
+        self.holder, self.path, self.seconds = holder, holder.path, seconds
+
+    def current(self):
+        time.sleep(self.seconds)
+        return self.holder.index
+
+
+async def exercise_limits(index_path):
+    service = SearchService(index_path, max_in_flight=1, request_timeout=0.05)
+    service.holder = SlowHolder(service.holder, 0.3)
+    timed_out = await service.handle("GET", "/search?q=t1")
+    busy = await service.handle("GET", "/search?q=t1")  # The timed-out search still runs
+    await asyncio.sleep(0.4)
+    service.holder.seconds, service.request_timeout = 0, 2.0
+    done = await service.handle("GET", "/search?q=t1")
+
+    listener = socket.create_server(("127.0.0.1", 0))
+    server = await asyncio.start_server(service.serve_connection, sock=listener)
+    reader, writer = await asyncio.open_connection("127.0.0.1", listener.getsockname()[1])
+    writer.write(b"GET /health HTTP/1.1\r\nHost: x\r\nContent-Length: nope\r\n\r\n")
+    await writer.drain()
+    malformed = await reader.read()
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return [timed_out[0], busy[0], done[0], service.in_flight], malformed
+
+
+def test_search_limits():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index()
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "segment")
+        write_segment(path, inverted_index, urls, pagerank_scores, doc_lengths)
+        statuses, malformed = asyncio.run(exercise_limits(path))
+        assert statuses == [504, 503, 200, 0]
+        assert malformed.startswith(b"HTTP/1.1 400 ")
+
+        start = time.perf_counter()  # A bad index fails in the parent, before any worker is forked
+        assert not serve(parse_args(["--index", os.path.join(folder, "missing"), "--workers", "2", "--port", "0"]))
+        assert time.perf_counter() - start < 5
+
+
+if __name__ == "__main__":
+    test_search_service()
+    test_search_limits()
+    print("Search service checks passed.")
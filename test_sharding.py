@@ -0,0 +1,44 @@
+# Check that scatter-gather search over document shards returns exactly the unsharded results
+import os
+import random
+import tempfile
+import numpy as np
+from query_processor import ranked_query
+from segment import write_segment, open_segment
+from sharding import split_index, open_sharded_index
+from test_ranked_query import build_random_index
+
+
+def assert_same_results(sharded, index, rng, queries=200):
+    terms = sorted(index)
+    for _ in range(queries):
+        query = rng.sample(terms, rng.randint(1, 4)) + (["missing"] if rng.random() < 0.1 else [])
+        for conjunctive in (True, False):
+            expected = ranked_query(query, index, index.doc_lengths, index.pagerank_scores, 10, conjunctive)
+            results = sharded.ranked_query(query, 10, conjunctive)
+            assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected], query
+            assert np.allclose([score for _, score in results], [score for _, score in expected])
+
+
+def test_sharded_search_matches_unsharded():
+    inverted_index, doc_lengths, pagerank_scores = build_random_index(num_docs=900)
+    urls = [f"https://www.ics.uci.edu/page/{doc_id}" for doc_id in range(len(doc_lengths))]
+    with tempfile.TemporaryDirectory() as folder:
+        write_segment(os.path.join(folder, "segment"), inverted_index, urls, pagerank_scores, doc_lengths)
+        index = open_segment(os.path.join(folder, "segment"))
+
+        for num_shards, workers in [(1, 1), (4, 1), (3, 2)]:
+            shards_dir = os.path.join(folder, "shards")
+            split_index(index, shards_dir, num_shards)
+            sharded = open_sharded_index(shards_dir, workers=workers)
+            try:
+                assert sharded.num_shards == num_shards
+                assert sharded.url(899) == urls[899]
+                assert_same_results(sharded, index, random.Random(num_shards))
+            finally:
+                sharded.close()
+
+
+if __name__ == "__main__":
+    test_sharded_search_matches_unsharded()
+    print("Sharded search matches the unsharded index.")
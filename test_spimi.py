@@ -0,0 +1,52 @@
+# Check that the bounded-memory SPIMI builder produces the same segment as the in-memory builder
+import os
+import random
+import tempfile
+import numpy as np
+from build_index import build_inverted_index, save_index
+from link_graph import build_link_graph
+from scoring import compute_pagerank
+from segment import open_segment
+from spimi import build_index_spimi
+
+
+def random_documents(num_docs=300, seed=4):
+    rng = random.Random(seed)
+    vocabulary = [f"term{index}" for index in range(500)]
+    return [{
+        "url": f"https://www.ics.uci.edu/page{doc_id}",
+        "regular_terms": [(term, rng.randint(1, 5)) for term in rng.sample(vocabulary, rng.randint(1, 60))],
+        "important_terms": [(term, 1) for term in rng.sample(vocabulary, rng.randint(0, 5))],
+        "links": [f"https://www.ics.uci.edu/page{rng.randrange(num_docs)}" for _ in range(rng.randint(0, 4))],
+    } for doc_id in range(num_docs)]
+
+
+def test_spimi_matches_in_memory_build():
+    documents = random_documents()
+    inverted_index, document_lookup, summaries = build_inverted_index(documents)
+    indptr, indices = build_link_graph(documents)
+    pagerank_scores, _ = compute_pagerank(indptr, indices)
+
+    with tempfile.TemporaryDirectory() as folder:
+        save_index(inverted_index, document_lookup, summaries, pagerank_scores, len(documents),
+                   os.path.join(folder, "in_memory"))
+        # A tiny budget forces a flush every few documents, exercising the k-way merge
+        num_docs = build_index_spimi(iter(documents), os.path.join(folder, "spimi"), memory_budget_mb=0.02,
+                                     temp_dir=folder)
+        expected = open_segment(os.path.join(folder, "in_memory"))
+        segment = open_segment(os.path.join(folder, "spimi"))
+
+        assert num_docs == len(documents)
+        assert segment.header["spimi_runs"] > 10
+        assert list(segment) == list(expected)
+        for term in expected:
+            assert np.array_equal(segment[term]["documents"], expected[term]["documents"])
+            assert np.array_equal(segment[term]["frequency"], expected[term]["frequency"])
+        assert [segment.url(doc_id) for doc_id in range(num_docs)] == [doc["url"] for doc in documents]
+        assert np.allclose(segment.pagerank_scores, expected.pagerank_scores)
+        assert np.array_equal(segment.doc_lengths, expected.doc_lengths)
+
+
+if __name__ == "__main__":
+    test_spimi_matches_in_memory_build()
+    print("SPIMI build matches the in-memory build.")
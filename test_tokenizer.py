@@ -0,0 +1,61 @@
+# Check that the tokenizer keeps true term frequencies, that batch tokenization matches
+# tokenizing each text on its own, and that NLTK's Porter stemmer loads on first use
+import os
+import sys
+import json
+import subprocess
+from tokenizer import Tokenizer, tokenize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STEM_WORDS = ["running", "generalizations", "relational", "conditional", "ponies", "caresses", "hopping", "sky"]
+
+# Runs in a fresh interpreter, where nothing has imported nltk yet
+LOAD_STEMMER = """
+import sys, json
+from tokenizer import Tokenizer
+tokenizer = Tokenizer()
+imported = "nltk" in sys.modules
+stems = [tokenizer.stem(word) for word in {words!r}]
+from nltk.stem import PorterStemmer
+reference = [PorterStemmer().stem(word) for word in {words!r}]
+print(json.dumps({{"imported": imported, "stems": stems, "reference": reference,
+                  "stemmer": type(tokenizer.stemmer) is PorterStemmer}}))
+"""
+
+
+def test_term_frequencies():
+    tokenizer = Tokenizer()
+    text = "Running runs: the RUN ran; run! <div>div</div> Learning machines learn."
+    assert tokenizer.tokens(text) == ["run", "run", "the", "run", "ran", "run", "learn", "machin", "learn"]
+    assert tokenizer.term_counts(text) == [("run", 4), ("the", 1), ("ran", 1), ("learn", 2), ("machin", 1)]
+    assert tokenizer.term_positions(text)[0] == ("run", [0, 1, 3, 5])
+    assert tokenize(text) == ["run", "the", "ran", "learn", "machin"]  # Queries: distinct tokens
+    assert tokenizer.term_counts("") == tokenizer.term_counts(None) == []
+
+
+def test_tokenize_batch_matches_single_texts():
+    tokenizer = Tokenizer(stem_cache_size=4)  # Smaller than the vocabulary: stems get evicted and recomputed
+    texts = ["Information retrieval retrieves information.", "", "Search engines index the web; engines rank it.",
+             "The the THE the", "C++ and Java: b i u script"]
+    methods = {"counts": tokenizer.term_counts, "tokens": tokenizer.tokens, "positions": tokenizer.positions,
+               "term_positions": tokenizer.term_positions, "unique": tokenizer.unique_tokens}
+    for output, method in methods.items():
+        assert tokenizer.tokenize_batch(texts, output=output) == [method(text) for text in texts], output
+    counts = dict(tokenizer.tokenize_batch(texts)[3])
+    assert counts == {"the": 4}
+
+
+def test_porter_stemmer_loading():
+    code = LOAD_STEMMER.format(words=STEM_WORDS)
+    process = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout)
+    assert not result["imported"]  # Loaded by the first word, not by creating a Tokenizer
+    assert result["stemmer"] and result["stems"] == result["reference"]
+    assert result["stems"][:3] == ["run", "gener", "relat"]
+
+
+if __name__ == "__main__":
+    test_term_frequencies()
+    test_tokenize_batch_matches_single_texts()
+    test_porter_stemmer_loading()
+    print("Tokenizer checks passed.")
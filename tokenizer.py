@@ -1,30 +1,97 @@
 import re
-from nltk.stem import PorterStemmer
+from collections import Counter
+from functools import lru_cache
 
 HTML_WORDS = {"b", "c", "i", "u", "script", "alert", "noscript", "div", "span", "meta", "style", "href"}
 
-stemmer = PorterStemmer()
+HTML_WORDS_PATTERN = re.compile(r"\b(?:{})\b".format("|".join(sorted(HTML_WORDS))))
+NON_ALPHANUMERIC_PATTERN = re.compile(r"[^a-zA-Z0-9\s]")
 
-def tokenize(text: str) -> list[str]:
-    if not text or not isinstance(text, str):
-        return []
+DEFAULT_STEM_CACHE_SIZE = 200_000
+
+
+def load_porter_stemmer():
+    """
+    NLTK's PorterStemmer class. Importing NLTK takes about a second (it pulls in SciPy), so
+    it happens here, on the first word stemmed, not when this module is imported.
+    """
+    from nltk.stem import PorterStemmer
+    return PorterStemmer
+
+
+class Tokenizer:
+    """
+    Lowercases, drops leftover HTML words and punctuation, and Porter-stems text. Patterns
+    are compiled once, and stems are memoized in a bounded LRU cache: a corpus has a small
+    vocabulary, so nearly every word after the first few pages is a cache hit. The stemmer
+    is loaded on the first word, so importing this module is cheap.
+    """
+
+    def __init__(self, stem_cache_size=DEFAULT_STEM_CACHE_SIZE):
+        self.stemmer = None
+        self.stem = lru_cache(maxsize=stem_cache_size)(self._stem)
+
+    def _stem(self, word):
+        if self.stemmer is None:
+            self.stemmer = load_porter_stemmer()()
+        return self.stemmer.stem(word)
 
-    text = text.lower()
+    def words(self, text):
+        """Unstemmed words, in order."""
+        if not text or not isinstance(text, str):
+            return []
+        text = HTML_WORDS_PATTERN.sub("", text.lower())
+        return NON_ALPHANUMERIC_PATTERN.sub(" ", text).split()
 
-    text = re.sub(r"\b(?:{})\b".format("|".join(HTML_WORDS)), "", text)
+    def tokens(self, text):
+        """Every stemmed token, in order, duplicates included."""
+        stem = self.stem
+        return [stem(word) for word in self.words(text)]
 
-    text = re.sub(r"[^a-zA-Z0-9\s]", " ", text)
+    def positions(self, text):
+        """(term, position) for every token; positions count tokens from 0."""
+        return [(term, position) for position, term in enumerate(self.tokens(text))]
 
-    tokens = text.split()
+    def term_positions(self, text):
+        """(term, [positions]) pairs in order of first occurrence."""
+        positions = {}
+        for position, term in enumerate(self.tokens(text)):
+            positions.setdefault(term, []).append(position)
+        return list(positions.items())
 
-    stemmed_tokens = [stemmer.stem(word) for word in tokens]
+    def term_counts(self, text):
+        """(term, count) pairs in order of first occurrence."""
+        return list(Counter(self.tokens(text)).items())
 
-    unique_tokens = list(dict.fromkeys(stemmed_tokens))
+    def unique_tokens(self, text):
+        """Distinct stemmed tokens in order of first occurrence."""
+        return list(dict.fromkeys(self.tokens(text)))
+
+    def tokenize_batch(self, texts, output="counts"):
+        """
+        Tokenize many texts at once. `output` picks the per-text result: "counts" for
+        (term, count) pairs, "tokens" for the full token stream, "positions" for
+        (term, position) pairs, "term_positions" for (term, [positions]) pairs or
+        "unique" for distinct tokens.
+        """
+        method = {"counts": self.term_counts, "tokens": self.tokens, "positions": self.positions,
+                  "term_positions": self.term_positions, "unique": self.unique_tokens}[output]
+        return [method(text) for text in texts]
+
+    def cache_info(self):
+        return self.stem.cache_info()
+
+
+default_tokenizer = Tokenizer()
+
+
+def tokenize(text: str) -> list[str]:
+    """Distinct stemmed tokens of `text` (used for queries)."""
+    return default_tokenizer.unique_tokens(text)
 
-    return unique_tokens
 
 def compute_word_frequencies(tokens: list[str]) -> dict[str, int]:
     token_dict = {}
     for word in tokens:
         token_dict[word] = token_dict.get(word, 0) + 1
-    return token_dict
\ No newline at end of file
+    return token_dict